@@ -8,12 +8,24 @@
 Classify the novels using different feature sets, types of subgenre labels, and classifiers.
 """
 
+import sys
+import os
 import pandas as pd
 import numpy as np
 import glob
 import re
+import hashlib
+import zlib
+import sqlite3
+import time
 from os.path import join
+from os.path import isfile
 from os import rename
+from os import replace
+from os import makedirs
+from joblib import Parallel
+from joblib import delayed
+from scipy import sparse
 import plotly.graph_objects as go
 from sklearn import svm
 from sklearn import neighbors
@@ -22,17 +34,79 @@ from sklearn.preprocessing import MinMaxScaler
 from sklearn.model_selection import train_test_split
 from sklearn.model_selection import cross_val_score
 from sklearn.model_selection import cross_validate
+from sklearn.model_selection import StratifiedKFold
 from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv
+from sklearn.model_selection import HalvingGridSearchCV
 from sklearn.metrics import accuracy_score
 from sklearn.metrics import precision_score
 from sklearn.metrics import recall_score
 from sklearn.metrics import f1_score
 from sklearn.metrics import make_scorer
+from sklearn.metrics import pairwise_distances
 
+sys.path.append(os.path.abspath(join(os.path.dirname(__file__), "..", "features")))
+import feature_store
+import figure_renderer
+
+
+# hashes of the feature and metadata files of the classification jobs: (path, modification time, size) -> hash
+file_hashes = {}
 
 
 ############### FUNCTIONS ##################
 
+class ResultAccumulator:
+	"""
+	Collects rows and frames for a result table and creates the data frame once at the end,
+	instead of appending to a data frame inside a loop (which copies the whole frame on every call).
+	
+	Arguments:
+	columns (list): optional, the columns the result table starts with (further columns of added frames are appended)
+	"""
+	
+	def __init__(self, columns=None):
+		self.columns = columns
+		self.parts = []
+		self.rows = []
+		
+	def add_row(self, row):
+		"""
+		Add a row: a list of values in the order of the columns, a dict, or a Series (its name becomes the index label).
+		"""
+		self.rows.append(row)
+		
+	def add_frame(self, frame):
+		"""
+		Add the rows of a data frame.
+		"""
+		self.flush_rows()
+		self.parts.append(frame)
+		
+	def flush_rows(self):
+		"""
+		Turn the rows collected so far into one frame.
+		"""
+		if len(self.rows) > 0:
+			self.parts.append(pd.DataFrame(self.rows, columns=self.columns))
+			self.rows = []
+			
+	def to_frame(self, ignore_index=False):
+		"""
+		Create the result table.
+		
+		Argument:
+		ignore_index (bool): whether to number the rows from 0 instead of keeping the index labels of the parts
+		"""
+		self.flush_rows()
+		parts = self.parts
+		if self.columns is not None:
+			parts = [pd.DataFrame(columns=self.columns)] + parts
+		if len(parts) == 0:
+			return pd.DataFrame()
+		return pd.concat(parts, sort=False, ignore_index=ignore_index)
+		
+
 def plot_overview_literary_currents_primary(wdir, mdfile, outdir, outfile):
 	"""
 	creates a donut chart displaying the proportion of the different primary literary currents in the corpus
@@ -58,11 +132,12 @@ def plot_overview_literary_currents_primary(wdir, mdfile, outdir, outfile):
 	fig.update_traces(marker=dict(colors=colors))
 	fig.update_layout(autosize=False, width=500, height=400, title="Primary literary currents in the corpus")
 
-	fig.write_image(join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outdir, outfile + ".html"))
 
 	#fig.show()
 	
+	figure_renderer.wait_renderers()
 	print("done: overview primary literary currents")
 	
 	
@@ -95,11 +170,12 @@ def plot_overview_theme_primary(wdir, mdfile, outdir, outfile):
 	#fig.update_traces(marker=dict(colors=colors))
 	fig.update_layout(autosize=False, width=500, height=400, title="Primary thematic subgenres in the corpus", legend_font=dict(size=14))
 
-	fig.write_image(join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outdir, outfile + ".html"))
 
 	#fig.show()
 	
+	figure_renderer.wait_renderers()
 	print("done: overview primary thematic subgenres")
 
 
@@ -151,7 +227,7 @@ def select_data(wdir, mdfile, subgenre_type, subgenre1, subgenre2, features):
 		y = y.append(sub2[subgenre_type])
 		
 	# values
-	data = pd.read_csv(join(wdir, features), index_col=0)
+	data = feature_store.read_features(join(wdir, features), mmap=True)
 	X = data.loc[sub1.index].to_numpy()
 	
 	if subgenre2 is not None:
@@ -306,6 +382,100 @@ def select_metadata(wdir, md_file, subgenre_sets, outpath):
 	print("done")
 	
 
+def get_feature_path_mfw(wdir, feature_inpath, mfw, unit, no, cl):
+	"""
+	get the path to the mfw feature set to use for a classifier
+	
+	Arguments:
+	wdir (str): path to the working directory
+	feature_inpath (str): relative path to the directory containing the feature sets
+	mfw (int): number of mfw
+	unit (str): token unit ("word", "word 3gram", "char 3gram", etc.)
+	no (str): normalization mode ("tf", "tfidf", "zscore")
+	cl (str): the type of classifier: SVM, RF, KNN
+	"""
+	if unit == "word":
+		token_unit = ""
+	else:
+		token_unit = unit + "_"
+	
+	if cl == "SVM" and no != "zscore":
+		scale = "_MinMax"
+	else:
+		scale = ""
+	
+	#scale = ""
+	return join(wdir, feature_inpath, "bow_mfw" + str(mfw) + "_" + token_unit + no + scale + ".csv")
+	
+	
+def get_feature_path_topics(wdir, feature_inpath, num_topics, optimize_interval, topic_rep, cl):
+	"""
+	get the path to the topic feature set to use for a classifier
+	
+	Arguments:
+	wdir (str): path to the working directory
+	feature_inpath (str): relative path to the directory containing the feature sets
+	num_topics (int): number of topics
+	optimize_interval (str): optimize interval parameter value
+	topic_rep (int): number of the topic model repetition to use
+	cl (str): the type of classifier: SVM, RF, KNN
+	"""
+	if cl == "SVM":
+		scale = "_MinMax"
+	else:
+		scale = ""
+	folder_name = str(num_topics) + "tp-5000it-" + str(optimize_interval) + "in-" + str(topic_rep)
+	return join(wdir, feature_inpath, folder_name, "avgtopicscores_by-idno" + scale + ".csv")
+	
+	
+def get_distance_matrix(feature_path, metric):
+	"""
+	get the pairwise distances between all the novels of a feature set, e.g. for KNN with a precomputed metric
+	the distance matrix is computed once per feature file and metric and kept in the in-process cache of the feature store
+	returns a data frame with the idnos as index and columns
+	
+	Arguments:
+	feature_path (str): path to the feature set
+	metric (str): distance metric, e.g. "manhattan" or "euclidean"
+	"""
+	def load_distances(path):
+		data = feature_store.read_features(path)
+		dist = pairwise_distances(data.to_numpy(), metric=metric)
+		return pd.DataFrame(dist, index=data.index, columns=data.index)
+	
+	return feature_store.get_cached("distances-" + metric, feature_path, load_distances)
+	
+	
+def select_distances(feature_path, idnos, metric):
+	"""
+	select the pairwise distances between the novels of a data selection from the (cached) distance matrix of a feature set
+	returns a square nparray in the order of the idnos, to be used as X for KNN with metric="precomputed"
+	
+	Arguments:
+	feature_path (str): path to the feature set
+	idnos (list): identifiers of the selected novels
+	metric (str): distance metric, e.g. "manhattan" or "euclidean"
+	"""
+	dist = get_distance_matrix(feature_path, metric)
+	return dist.loc[idnos, idnos].to_numpy()
+	
+
+def get_metadata_path(wdir, md_inpath, sb_set, rep):
+	"""
+	get the path to the selected metadata file of a subgenre constellation and data selection repetition
+	
+	Arguments:
+	wdir (str): path to the working directory
+	md_inpath (str): relative path to the directory containing selected metadata for subgenre constellations
+	sb_set (dict): dictionary describing the subgenre constellation, e.g. {"level": "subgenre-current", "class 1": "novela romántica", "class 2": "other"}
+	rep (int): number of the data selection repetition
+	"""
+	level = sb_set["level"]
+	class1 = re.sub(r"\s", r"_", sb_set["class 1"])
+	class2 = re.sub(r"\s", r"_", sb_set["class 2"])
+	return join(wdir, md_inpath, "metadata_" + level + "_" + class1 + "_" + class2 + "_" + str(rep) + ".csv")
+	
+
 def select_data_mfw(wdir, md_inpath, feature_inpath, sb_set, mfw, unit, no, rep, cl):
 	"""
 	prepare data for classifier as X (np data array), y (labels)
@@ -325,32 +495,18 @@ def select_data_mfw(wdir, md_inpath, feature_inpath, sb_set, mfw, unit, no, rep,
 	"""	
 	# which type of subgenre is analyzed?
 	level = sb_set["level"]
-	class1 = re.sub(r"\s", r"_", sb_set["class 1"])
-	class2 = re.sub(r"\s", r"_", sb_set["class 2"])
 	
 	# load the metadata file corresponding to the selected subgenre constellation and feature set
-	md_path = join(wdir, md_inpath, "metadata_" + level + "_" + class1 + "_" + class2 + "_" + str(rep) + ".csv")
-	md = pd.read_csv(md_path, index_col=0)
+	md_path = get_metadata_path(wdir, md_inpath, sb_set, rep)
+	md = feature_store.read_csv_cached(md_path).copy()
 	
 	# prepare the data to return
 	# labels
 	y = md[level]
 		
 	# values
-	if unit == "word":
-		token_unit = ""
-	else:
-		token_unit = unit + "_"
-	
-	if cl == "SVM" and no != "zscore":
-		scale = "_MinMax"
-	else:
-		scale = ""
-	
-	
-	#scale = ""
-	feature_path = join(wdir, feature_inpath, "bow_mfw" + str(mfw) + "_" + token_unit + no + scale + ".csv")
-	data = pd.read_csv(join(wdir, feature_path), index_col=0)
+	feature_path = get_feature_path_mfw(wdir, feature_inpath, mfw, unit, no, cl)
+	data = feature_store.read_features_cached(join(wdir, feature_path))
 	X = data.loc[md.index].to_numpy()
 	
 	idnos = md.index
@@ -378,25 +534,18 @@ def select_data_topics(wdir, md_inpath, feature_inpath, sb_set, num_topics, opti
 	"""	
 	# which type of subgenre is analyzed?
 	level = sb_set["level"]
-	class1 = re.sub(r"\s", r"_", sb_set["class 1"])
-	class2 = re.sub(r"\s", r"_", sb_set["class 2"])
 	
 	# load the metadata file corresponding to the selected subgenre constellation and feature set
-	md_path = join(wdir, md_inpath, "metadata_" + level + "_" + class1 + "_" + class2 + "_" + str(md_rep) + ".csv")
-	md = pd.read_csv(md_path, index_col=0)
+	md_path = get_metadata_path(wdir, md_inpath, sb_set, md_rep)
+	md = feature_store.read_csv_cached(md_path).copy()
 	
 	# prepare the data to return
 	# labels
 	y = md[level].to_numpy()
 		
 	# values
-	if cl == "SVM":
-		scale = "_MinMax"
-	else:
-		scale = ""
-	folder_name = str(num_topics) + "tp-5000it-" + str(optimize_interval) + "in-" + str(topic_rep)
-	feature_path = join(wdir, feature_inpath, folder_name, "avgtopicscores_by-idno" + scale + ".csv")
-	data = pd.read_csv(join(wdir, feature_path), index_col=0)
+	feature_path = get_feature_path_topics(wdir, feature_inpath, num_topics, optimize_interval, topic_rep, cl)
+	data = feature_store.read_features_cached(join(wdir, feature_path))
 	X = data.loc[md.index].to_numpy()
 		
 	idnos = md.index
@@ -405,17 +554,24 @@ def select_data_topics(wdir, md_inpath, feature_inpath, sb_set, num_topics, opti
 	
 	
 
-def parameter_study(wdir):
+def parameter_study(wdir, **kwargs):
 	"""
 	test different subgenre constellations and selected feature sets
 	do grid searches for the three types of classifiers (SVM, KNN, RF) to see which parameters work best
 	
-	Argument:
+	Arguments:
 	wdir (str): path to the working directory
+	
+	optional:
+	search (str): search strategy, "grid" (exhaustive grid search, default) or "halving" (successive halving), see do_grid_searches
+	n_jobs (int): number of folds and candidates to evaluate in parallel, default: -1 (all cores)
 	"""
 	
 	print("running parameter study...")
 	
+	search = kwargs.get("search", "grid")
+	n_jobs = kwargs.get("n_jobs", -1)
+	
 	# chosen subgenre constellations
 	subgenre_sets = [{"level": "subgenre-current", "class 1": "novela romántica", "class 2": "other"},
 	{"level": "subgenre-current", "class 1": "novela realista", "class 2": "novela naturalista"},
@@ -440,10 +596,8 @@ def parameter_study(wdir):
 	
 	# classifiers
 	classifiers = ["SVM", "KNN", "RF"]
-	# data frames for results
-	fr_svm = pd.DataFrame()
-	fr_knn = pd.DataFrame()
-	fr_rf = pd.DataFrame()
+	# collections of results
+	results_cl = {"SVM": ResultAccumulator(), "KNN": ResultAccumulator(), "RF": ResultAccumulator()}
 
 	for sb_set in subgenre_sets:
 		# mfw
@@ -457,7 +611,7 @@ def parameter_study(wdir):
 						for cl in classifiers:
 							X, y, idnos = select_data_mfw(wdir, "data-nh/analysis/classification/data_selection/preliminary/", "data-nh/analysis/features/mfw/", sb_set, mfw, unit, no, rep, cl)
 						
-							results = do_grid_searches(X,y,cl)
+							results = do_grid_searches(X,y,cl, search=search, n_jobs=n_jobs)
 							
 							results["subgenre_level"] = sb_set["level"]
 							results["class1"] = sb_set["class 1"]
@@ -467,12 +621,7 @@ def parameter_study(wdir):
 							results["normalization"] = no
 							results["repetition"] = rep
 							
-							if cl == "SVM":
-								fr_svm = fr_svm.append(results, sort=False)
-							elif cl == "KNN":
-								fr_knn = fr_knn.append(results, sort=False)
-							elif cl == "RF":
-								fr_rf = fr_rf.append(results, sort=False)
+							results_cl[cl].add_frame(results)
 		# topics
 		for t in num_topics:
 			for oi in optimize_intervals:
@@ -483,7 +632,7 @@ def parameter_study(wdir):
 						for cl in classifiers:
 							X, y, idnos = select_data_topics(wdir, "data-nh/analysis/classification/data_selection/preliminary/", "data-nh/analysis/features/topics/4_aggregates/", sb_set, t, oi, rep, topic_rep, cl)
 					
-							results = do_grid_searches(X,y,cl)
+							results = do_grid_searches(X,y,cl, search=search, n_jobs=n_jobs)
 							
 							results["subgenre_level"] = sb_set["level"]
 							results["class1"] = sb_set["class 1"]
@@ -493,35 +642,45 @@ def parameter_study(wdir):
 							results["repetition"] = rep
 							results["topic_repetition"] = topic_rep
 							
-							if cl == "SVM":
-								fr_svm = fr_svm.append(results, sort=False)
-							elif cl == "KNN":
-								fr_knn = fr_knn.append(results, sort=False)
-							elif cl == "RF":
-								fr_rf = fr_rf.append(results, sort=False)
+							results_cl[cl].add_frame(results)
 	# store results
 	outpath = "data-nh/analysis/classification/parameter_study"
 		
-	fr_svm.to_csv(join(wdir, outpath, "grid-searches-SVM.csv"))
-	fr_knn.to_csv(join(wdir, outpath, "grid-searches-KNN.csv"))
-	fr_rf.to_csv(join(wdir, outpath, "grid-searches-RF.csv"))
+	for cl in classifiers:
+		results_cl[cl].to_frame().to_csv(join(wdir, outpath, "grid-searches-" + cl + ".csv"))
 	
 
 	print("done")
 
 
-def do_grid_searches(X,y,cl):
+def do_grid_searches(X,y,cl, **kwargs):
 	"""
 	Do grid searches for different classifiers and parameter settings.
+	Returns the cv_results_ of the search as a data frame.
+	
+	For the linear SVM, the linear kernel (the Gram matrix of the data) is computed once and shared by all the values of C
+	and all the folds (SVC with a precomputed kernel, which is the same model as SVC(kernel="linear")).
+	libsvm cannot be warm-started, so this is how the regularization path over C reuses work.
 	
 	Arguments:
 	X (nparray): data to use
 	y (list): labels to use
 	cl (str): the classifier to use: SVM, KNN, or RF
+	
+	optional:
+	search (str): "grid" for an exhaustive grid search (default), "halving" for successive halving, 
+	where bad parameter combinations are dropped after being evaluated on a subsample of the data 
+	(only the candidates of the last iteration, which are evaluated on the most data, are returned and ranked;
+	the cv_results_ then have the additional columns "iter" and "n_resources")
+	n_jobs (int): number of folds and candidates to evaluate in parallel, default: None (1)
 	"""
+	search = kwargs.get("search", "grid")
+	n_jobs = kwargs.get("n_jobs", None)
+	
 	if cl == "SVM":
-		clf = svm.SVC(kernel="linear")
+		clf = svm.SVC(kernel="precomputed")
 		param_grid = [{"C": [1,10,100,1000]}]
+		X = np.dot(X, X.T)
 	elif cl == "KNN":
 		clf = neighbors.KNeighborsClassifier()
 		param_grid = [{"n_neighbors": [3,5,7], "weights": ["uniform", "distance"], "metric": ["euclidean", "manhattan"]}]
@@ -529,10 +688,17 @@ def do_grid_searches(X,y,cl):
 		clf = ensemble.RandomForestClassifier(random_state=0)
 		param_grid = [{"max_features": ["sqrt", "log2"]}]
 	
-	grid_search = GridSearchCV(clf, param_grid=param_grid, cv=10)
+	if search == "grid":
+		grid_search = GridSearchCV(clf, param_grid=param_grid, cv=10, n_jobs=n_jobs)
+	elif search == "halving":
+		grid_search = HalvingGridSearchCV(clf, param_grid=param_grid, cv=10, factor=3, random_state=0, n_jobs=n_jobs)
 	grid_search.fit(X,y)
 	results = grid_search.cv_results_
 	results = pd.DataFrame.from_dict(results)
+	if search == "halving":
+		# rank the candidates of the last iteration among themselves, like GridSearchCV does
+		results = results.loc[results["iter"] == results["iter"].max()].reset_index(drop=True)
+		results["rank_test_score"] = results["mean_test_score"].rank(method="min", ascending=False, na_option="bottom").astype(np.int32)
 	return results
 	
 	
@@ -637,30 +803,46 @@ def evaluate_parameter_study(wdir, outdir, clf, param):
 	fig.update_xaxes(title=xtitle,tickfont=dict(size=14))
 	fig.update_yaxes(title="frequency of rank 1")
 
-	fig.write_image(join(wdir, outdir, "ranks1_" + clf + "_" + param + ".png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outdir, "ranks1_" + clf + "_" + param + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outdir, "ranks1_" + clf + "_" + param + ".png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outdir, "ranks1_" + clf + "_" + param + ".html"))
 
+	figure_renderer.wait_renderers()
 	print("done")
 	
 	
-def get_estimator(cl, feature_type):
+def get_estimator(cl, feature_type, **kwargs):
 	"""
 	Get an instance of the chosen classifier, setting the parameters that were determined in the preliminary parameter study.
 	
 	Arguments:
 	cl (str): name of the classifier: KNN, SVC, RF
 	feature_type (str): main feature type, mfw or topics
+	
+	optional:
+	precomputed (bool): for KNN, whether the data is a precomputed (manhattan) distance matrix, default: False
+	svm_backend (str): for SVM, "libsvm" for SVC with a linear kernel or "liblinear" for LinearSVC (primal linear solver,
+	faster for many features and sparse data, e.g. 5000 char n-grams, but only approximately the same model), default: "libsvm"
 	"""
+	precomputed = kwargs.get("precomputed", False)
+	svm_backend = kwargs.get("svm_backend", "libsvm")
+	
 	if feature_type == "mfw":
 		C = 100
 	elif feature_type == "topics":
 		C = 1
 	
 	if cl == "KNN":
-		clf = neighbors.KNeighborsClassifier(n_neighbors=7, weights="distance", metric="manhattan")
+		if precomputed:
+			clf = neighbors.KNeighborsClassifier(n_neighbors=7, weights="distance", metric="precomputed")
+		else:
+			clf = neighbors.KNeighborsClassifier(n_neighbors=7, weights="distance", metric="manhattan")
 		
 	elif cl == "SVM":
-		clf = svm.SVC(kernel="linear", C=C)
+		if svm_backend == "liblinear":
+			# hinge loss as in SVC (LinearSVC also regularizes the intercept)
+			clf = svm.LinearSVC(C=C, loss="hinge", dual=True, max_iter=10000, random_state=0)
+		else:
+			clf = svm.SVC(kernel="linear", C=C)
 		
 	elif cl == "RF":
 		clf = ensemble.RandomForestClassifier(random_state=0, max_features="sqrt")
@@ -678,7 +860,7 @@ def get_scores(estimator, X, y, class1, cv):
 	X (nparray): data
 	y (list): labels
 	class1 (str): label of the positive class
-	cv (int): number of cross validation folds to use
+	cv (int or list): number of cross validation folds to use, or the (train, test) indices of the folds
 	"""
 					
 	scoring = {"accuracy": make_scorer(accuracy_score), 
@@ -718,23 +900,26 @@ def store_features(cl, scores, cv, feature_names):
 	"""
 	columns = ["cv_call", "class1_cl", "class2_cl"] + feature_names
 	
-	feature_frame = pd.DataFrame(columns=columns)
+	feature_frame = ResultAccumulator(columns)
 	
 	for run in range(cv):
 		if cl == "SVM":
-			coef = scores["estimator"][run].coef_.tolist()[0]
+			coef = scores["estimator"][run].coef_
+			# SVC returns sparse coefficients if it was fitted on sparse data
+			if sparse.issparse(coef):
+				coef = coef.toarray()
+			coef = coef.tolist()[0]
 		elif cl == "RF":
 			coef = scores["estimator"][run].feature_importances_.tolist()
 		classes = scores["estimator"][run].classes_
 		data = [run, classes[0], classes[1]] + coef
-		coef = pd.Series(index=columns, data=data)
 		
-		feature_frame = feature_frame.append(coef, ignore_index=True)
+		feature_frame.add_row(data)
 	
-	return feature_frame
+	return feature_frame.to_frame(ignore_index=True)
 
 
-def store_labels(scores, cv, X, y, idnos):
+def store_labels(scores, cv, X, y, idnos, **kwargs):
 	"""
 	Store true labels and predicted labels for each cv run
 	and return a data frame containing all of them.
@@ -745,14 +930,22 @@ def store_labels(scores, cv, X, y, idnos):
 	X (nparray): data
 	y (nparray): true labels
 	idnos (nparray): identifiers of the data
+	
+	optional:
+	splits (list): the (train, test) indices of the cv runs, needed if X is a precomputed distance matrix
+	(the estimators then predict from the distances to the training samples of their run)
 	"""		
-			
+	splits = kwargs.get("splits", None)
+	
 	label_frame = pd.DataFrame()
 	label_frame["idno"] = idnos
 	label_frame["y_true"] = list(y)
 	
 	for run in range(cv):
-		predicted_labels = scores["estimator"][run].predict(X)
+		if splits is not None:
+			predicted_labels = scores["estimator"][run].predict(X[:, splits[run][0]])
+		else:
+			predicted_labels = scores["estimator"][run].predict(X)
 		label_frame["y_" + str(run)] = predicted_labels
 	
 	return label_frame
@@ -774,7 +967,7 @@ def get_feature_names_mfw(wdir, feature_dir, mfw, unit, no):
 	else:
 		unit = "_" + unit
 	
-	features = pd.read_csv(join(wdir, feature_dir, "bow_mfw" + str(mfw) + unit + "_" + no + ".csv"), index_col=0)
+	features = feature_store.read_features(join(wdir, feature_dir, "bow_mfw" + str(mfw) + unit + "_" + no + ".csv"), mmap=True)
 	feature_names = features.columns
 	return feature_names
 	
@@ -831,229 +1024,778 @@ def set_frame_metadata_topics(frame, level, class1, class2, num_topics, optimize
 	return frame
 	
 	
-def get_results_subgenres_mfw(wdir, data_dir, cl, mfw, norm, unit, subgenre_1, subgenre_2):
+def get_experiment_jobs(level, subgenre_sets, classifiers, repetitions, **kwargs):
 	"""
-	Get the top and mean results for a certain subgenre constellation (e.g. "novela histórica" vs. "other",
-	given the classifier (e.g. "SVM"), the number of mfw, normalization technique and token unit.
-	Returns the following numbers: top accuracy, mean accuracy, standard deviation accuracy,
-	top F1, mean F1, std.dev. F1
+	Expand the grid of classification experiments into independent jobs.
+	Each job is one cross validation for a feature setting, classifier, subgenre constellation and data repetition.
+	The jobs are returned in the order in which their results are collected in the output files.
 	
 	Arguments:
-	wdir (str): path to the working directory
-	data_dir (str): relative path to the directory containing the classification results files
-	clf (str): the classifier used, e.g. "SVM"
-	mfw (int): the number of mfw
-	norm (str): type of normalization, "tf", "tfidf", "zscore"
-	subgenre_1 (str): the positive class
-	subgenre_2 (str): the negative class 
-	"""
-	print("get results subgenres mfw...")
+	level (str): subgenre level that is analyzed, e.g. "themes"
+	subgenre_sets (list): list of dicts describing the subgenre constellations, e.g. [{"level": "subgenre-current", "class 1": "novela romántica", "class 2": "other"}]
+	classifiers (list): list of classifiers, e.g. ["KNN", "SVM", "RF"]
+	repetitions (int): number of data selection repetitions
+	
+	optional:
+	mfws (list): numbers of mfw
+	token_units (list): token units, e.g. ["word", "3gram_chars"]
+	norms (list): normalization modes, e.g. ["tf", "tfidf", "zscore"]
+	num_topics (list): numbers of topics
+	optimize_intervals (list): optimize interval parameter values
+	topic_repetitions (int): number of topic modeling repetitions
+	"""
+	mfws = kwargs.get("mfws", [])
+	token_units = kwargs.get("token_units", [])
+	norms = kwargs.get("norms", [])
+	num_topics = kwargs.get("num_topics", [])
+	optimize_intervals = kwargs.get("optimize_intervals", [])
+	topic_repetitions = kwargs.get("topic_repetitions", 0)
+	
+	jobs = []
 	
-	accuracy_collected = []
-	f1_collected = []
+	for mfw in mfws:
+		for unit in token_units:
+			for no in norms:
+				for cl in classifiers:
+					for sb_set in subgenre_sets:
+						for data_rep in range(repetitions):
+							jobs.append({"level": level, "feature_type": "mfw", "mfw": mfw, "unit": unit, "no": no, "cl": cl, "sb_set": sb_set, "data_rep": data_rep})
+	
+	for t in num_topics:
+		for oi in optimize_intervals:
+			for cl in classifiers:
+				for topic_rep in range(topic_repetitions):
+					for sb_set in subgenre_sets:
+						for data_rep in range(repetitions):
+							jobs.append({"level": level, "feature_type": "topics", "num_topics": t, "oi": oi, "topic_rep": topic_rep, "cl": cl, "sb_set": sb_set, "data_rep": data_rep})
 	
-	# name of results file e.g. results-SVM-mfw100_4gram_chars_word_tf.csv
-	result_file = "results-" + cl + "-mfw" + str(mfw) + "_" + unit + "_" + norm + ".csv"
-	results = pd.read_csv(join(wdir, data_dir, result_file), index_col=0)
+	return jobs
 	
-	# select only the results for the subgenre constellation
-	results_sub = results.loc[(results["class1"]==subgenre_1)  & (results["class2"]==subgenre_2)]
+
+def get_job_key(job):
+	"""
+	Get a string identifying a classification job.
 	
-	acc = results_sub["test_accuracy"].tolist()
-	for acc_value in acc:
-		accuracy_collected.append(acc_value)
+	Arguments:
+	job (dict): the job, see get_experiment_jobs
+	"""
+	if job["feature_type"] == "mfw":
+		feature_params = [job["mfw"], job["unit"], job["no"]]
+	elif job["feature_type"] == "topics":
+		feature_params = [job["num_topics"], job["oi"], job["topic_rep"]]
 		
-	f1 = results_sub["test_f1"].tolist()
-	for f1_value in f1:
-		if f1_value != 0:
-			f1_collected.append(f1_value)
-			
-	top_acc = max(accuracy_collected)
-	mean_acc = np.mean(accuracy_collected)
-	std_acc = np.std(accuracy_collected)
+	key_parts = [job["level"], job["feature_type"]] + feature_params + [job["cl"], job["sb_set"]["level"], job["sb_set"]["class 1"], job["sb_set"]["class 2"], job["data_rep"]]
 	
-	top_f1 = max(f1_collected)
-	mean_f1 = np.mean(f1_collected)
-	std_f1 = np.std(f1_collected)
+	return "|".join([str(p) for p in key_parts])
 	
-	return len(accuracy_collected), top_acc, mean_acc, std_acc, top_f1, mean_f1, std_f1
 	
-	print("done")
+def get_file_hash(path):
+	"""
+	Get the sha1 hash of the contents of a file (kept for the modification time and size of the file,
+	so that files shared by many jobs are read only once). Returns "missing" if the file does not exist.
 	
+	Argument:
+	path (str): path to the file
+	"""
+	if not isfile(path):
+		return "missing"
+	stat = os.stat(path)
+	key = (path, stat.st_mtime, stat.st_size)
+	if key not in file_hashes:
+		sha1 = hashlib.sha1()
+		with open(path, "rb") as infile:
+			for block in iter(lambda: infile.read(1024 * 1024), b""):
+				sha1.update(block)
+		file_hashes[key] = sha1.hexdigest()
+	return file_hashes[key]
 	
-def get_results_subgenres_topics(wdir, data_dir, clf, num_topics, oi, subgenre_1, subgenre_2):
+
+def get_job_config(wdir, job, md_dir, feature_dir, repetitions, cv, **kwargs):
 	"""
-	Get the top and mean results for a certain subgenre constellation (e.g. "novela histórica" vs. "other",
-	given the classifier (e.g. "SVM"), the number of topics, and the optimize interval.
-	Returns the following numbers: top accuracy, mean accuracy, standard deviation accuracy,
-	top F1, mean F1, std.dev. F1
+	Get a hash of the configuration a classification job is run with: the number of cv folds and data repetitions,
+	the classifier options (knn_mode for KNN, svm_backend for SVM) and the contents of the metadata and feature files
+	of the job (the binary store of the feature file if it is the one that is read, see feature_store.read_features).
+	A completed job is only skipped on a re-run if its configuration has not changed.
 	
 	Arguments:
 	wdir (str): path to the working directory
-	data_dir (str): relative path to the directory containing the classification results files
-	clf (str): the classifier used, e.g. "SVM"
-	num_topics (int): the number of topics
-	oi (int): the optimize interval parameter
-	subgenre_1 (str): the positive class
-	subgenre_2 (str): the negative class 
-	"""
-	print("get results subgenres topics...")
-	#print("subgenre 1: " + subgenre_1)
-	#print("subgenre 2: " + subgenre_2)
-	
-	accuracy_collected = []
-	f1_collected = []
-	
-	result_file = "results-" + clf + "-topics" + str(num_topics) + "_" + str(oi) + "in.csv"
-	results = pd.read_csv(join(wdir, data_dir, result_file), index_col=0)
-	
-	# select only the results for the subgenre constellation
-	results_sub = results.loc[results["class1"]==subgenre_1]
-	results_sub = results_sub.loc[results["class2"]==subgenre_2]
+	job (dict): the job, see get_experiment_jobs
+	md_dir (str): relative path to the directory containing selected metadata for subgenre constellations
+	feature_dir (str): relative path to the directory containing the feature sets
+	repetitions (int): number of data selection repetitions
+	cv (int): number of cross validation folds
+	
+	optional:
+	knn_mode (str): see run_experiment_job, default: "precomputed"
+	svm_backend (str): see get_estimator, default: "libsvm"
+	"""
+	cl = job["cl"]
+	config_parts = ["cv", cv, "repetitions", repetitions]
+	if cl == "KNN":
+		config_parts += ["knn_mode", kwargs.get("knn_mode", "precomputed")]
+	elif cl == "SVM":
+		config_parts += ["svm_backend", kwargs.get("svm_backend", "libsvm")]
+	
+	if job["feature_type"] == "mfw":
+		feature_path = get_feature_path_mfw(wdir, feature_dir, job["mfw"], job["unit"], job["no"], cl)
+	elif job["feature_type"] == "topics":
+		feature_path = get_feature_path_topics(wdir, feature_dir, job["num_topics"], job["oi"], job["topic_rep"], cl)
+	if feature_store.has_store(feature_path):
+		feature_files = feature_store.get_store_paths(feature_path)
+	else:
+		feature_files = [feature_path]
 	
-	acc = results_sub["test_accuracy"].tolist()
-	for acc_value in acc:
-		accuracy_collected.append(acc_value)
-		
-	f1 = results_sub["test_f1"].tolist()
-	for f1_value in f1:
-		if f1_value != 0:
-			f1_collected.append(f1_value)
-			
-	top_acc = max(accuracy_collected)
-	mean_acc = np.mean(accuracy_collected)
-	std_acc = np.std(accuracy_collected)
+	config_parts += ["metadata", get_file_hash(get_metadata_path(wdir, md_dir, job["sb_set"], job["data_rep"]))]
+	config_parts += ["features"] + [get_file_hash(path) for path in feature_files]
 	
-	top_f1 = max(f1_collected)
-	mean_f1 = np.mean(f1_collected)
-	std_f1 = np.std(f1_collected)
+	return hashlib.sha1("|".join([str(p) for p in config_parts]).encode("utf-8")).hexdigest()
 	
-	return len(accuracy_collected), top_acc, mean_acc, std_acc, top_f1, mean_f1, std_f1
-		
-	'''
-	print("num values: " + str(len(accuracy_collected)))	
-		
-	print("top acc: " + str(top_acc))
-	print("mean acc: " + str(mean_acc))
-	print("std acc: " + str(std_acc))
 	
-	print("top f1: " + str(top_f1))
-	print("mean f1: " + str(mean_f1))
-	print("std f1: " + str(std_f1))
+def get_job_outputs(job):
+	"""
+	Get the names of the output files that the results of a classification job belong to.
+	Returns a list of tuples (kind of result, filename), the kinds being "results", "labels" and "features".
 	
-	print("done")
-	'''
+	Arguments:
+	job (dict): the job, see get_experiment_jobs
+	"""
+	cl = job["cl"]
 	
+	if job["feature_type"] == "mfw":
+		feature_params = str(job["mfw"]) + "_" + job["unit"] + "_" + job["no"]
+		outputs = [("results", "results-" + cl + "-mfw" + feature_params + ".csv"), ("labels", "labels_" + cl + "-mfw" + feature_params + ".csv")]
+		if cl == "SVM" or cl == "RF":
+			outputs.append(("features", "features-" + cl + "-mfw" + feature_params + ".csv"))
+			
+	elif job["feature_type"] == "topics":
+		feature_params = str(job["num_topics"]) + "_" + str(job["oi"]) + "in"
+		topic_rep = str(job["topic_rep"])
+		outputs = [("results", "results-" + cl + "-topics" + feature_params + ".csv"), ("labels", "labels-" + cl + "-topics" + feature_params + "-topic-rep_" + topic_rep + ".csv")]
+		if cl == "SVM" or cl == "RF":
+			outputs.append(("features", "features-" + cl + "-topics" + feature_params + "-topic-rep_" + topic_rep + ".csv"))
+			
+	return outputs
 
-def get_results_classifier(wdir, data_dir, classifier, feature_type):
+
+def get_shard_path(wdir, shard_dir, job):
 	"""
-	Get the top and mean results for a certain classifier and on a determined subgenre level (through the data_dir).
-	Returns the following numbers: top accuracy, mean accuracy, standard deviation accuracy,
-	top F1, mean F1, std.dev. F1
+	Get the path of the result shard of a classification job.
 	
 	Arguments:
 	wdir (str): path to the working directory
-	data_dir (str): relative path to the directory containing the classification results files
-	classifier (str): shortcut for the classifier (KNN, SVM, RF)
-	feature_type (str): which feature type to consider, e.g. "MFW" (MFW with word unit), "MFW word n-grams", "MFW character n-grams", "topics"
+	shard_dir (str): relative path to the directory for the result shards
+	job (dict): the job, see get_experiment_jobs
 	"""
-	print("get classifier results for " + classifier + "...")
-	
-	# general set of feature parameters
-	mfws = [100, 200, 300, 400, 500, 1000, 2000, 3000, 4000, 5000]
-	units_word_ngrams = ["2gram_words", "3gram_words", "4gram_words"]
-	units_char_ngrams = ["3gram_chars", "4gram_chars", "5gram_chars", 
-	"3gram_chars_word", "4gram_chars_word", "5gram_chars_word", "3gram_chars_affix-punct", "4gram_chars_affix-punct", "5gram_chars_affix-punct"]
-	norms = ["tf", "tfidf", "zscore"]
+	shard_name = hashlib.sha1(get_job_key(job).encode("utf-8")).hexdigest() + ".pkl"
+	return join(wdir, shard_dir, shard_name)
 
-	num_topics = [50, 60, 70, 80, 90, 100]
-	optimize_intervals = [50, 100, 250, 500, 1000, 2500, 5000, None]
-	topic_repetitions = 5
-	
-	accuracy_collected = []
-	f1_collected = []
-	
-	if feature_type == "topics":
-		# collect all relevant results
-		# results file name e.g.: results-SVM-topics100_250in.csv
-		for t in num_topics:
-			for oi in optimize_intervals:
-				result_file = "results-" + classifier + "-topics" + str(t) + "_" + str(oi) + "in.csv"
-				collect_results(wdir, data_dir, result_file, accuracy_collected, f1_collected)
-				
-	else:
-		# results file name e.g.: results-KNN-mfw2000_3gram_chars_tfidf.csv
-		for mfw in mfws:
-			for n in norms:
-				if feature_type == "MFW":
-					result_file = "results-" + classifier + "-mfw" + str(mfw) + "_word_" + n + ".csv"
-					collect_results(wdir, data_dir, result_file, accuracy_collected, f1_collected)
-				elif feature_type == "MFW word n-grams":
-					for unit in units_word_ngrams:
-						result_file = "results-" + classifier + "-mfw" + str(mfw) + "_" + unit + "_" + n + ".csv"
-						collect_results(wdir, data_dir, result_file, accuracy_collected, f1_collected)
-				elif feature_type == "MFW character n-grams":
-					for unit in units_char_ngrams:
-						result_file = "results-" + classifier + "-mfw" + str(mfw) + "_" + unit + "_" + n + ".csv"
-						collect_results(wdir, data_dir, result_file, accuracy_collected, f1_collected)
-				
-	top_acc = max(accuracy_collected)
-	mean_acc = np.mean(accuracy_collected)
-	std_acc = np.std(accuracy_collected)
+
+def open_journal(journal_path):
+	"""
+	Open the checkpoint journal of the classification experiments (an SQLite database),
+	creating it if it does not exist yet. Returns the connection.
 	
-	top_f1 = max(f1_collected)
-	mean_f1 = np.mean(f1_collected)
-	std_f1 = np.std(f1_collected)
+	Argument:
+	journal_path (str): path to the journal file
+	"""
+	journal = sqlite3.connect(journal_path, timeout=60)
+	journal.execute("PRAGMA journal_mode=WAL")
+	journal.execute("CREATE TABLE IF NOT EXISTS units (job_key TEXT PRIMARY KEY, level TEXT, feature_type TEXT, classifier TEXT, subgenre_set TEXT, data_repetition INTEGER, shard TEXT, finished TEXT, config TEXT)")
+	# journals written before the configuration was recorded: their jobs do not match any configuration and are run again
+	columns = [row[1] for row in journal.execute("PRAGMA table_info(units)")]
+	if "config" not in columns:
+		journal.execute("ALTER TABLE units ADD COLUMN config TEXT")
+	journal.commit()
+	return journal
 	
-	return len(accuracy_collected), top_acc, mean_acc, std_acc, top_f1, mean_f1, std_f1
 	
-	'''
-	print("num values: " + str(len(accuracy_collected)))	
-		
-	print("top acc: " + str(top_acc))
-	print("mean acc: " + str(mean_acc))
-	print("std acc: " + str(std_acc))
+def record_job(journal_path, job, shard_path, config):
+	"""
+	Record a completed classification job in the checkpoint journal.
 	
-	print("top f1: " + str(top_f1))
-	print("mean f1: " + str(mean_f1))
-	print("std f1: " + str(std_f1))
+	Arguments:
+	journal_path (str): path to the journal file
+	job (dict): the job, see get_experiment_jobs
+	shard_path (str): path to the result shard of the job
+	config (str): hash of the configuration the job was run with, see get_job_config
+	"""
+	subgenre_set = job["sb_set"]["class 1"] + " vs. " + job["sb_set"]["class 2"]
 	
-	print("done")
-	'''
+	journal = open_journal(journal_path)
+	with journal:
+		journal.execute("INSERT OR REPLACE INTO units (job_key, level, feature_type, classifier, subgenre_set, data_repetition, shard, finished, config) VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), ?)", 
+		(get_job_key(job), job["level"], job["feature_type"], job["cl"], subgenre_set, job["data_rep"], shard_path, config))
+	journal.close()
 
-def collect_results(wdir, data_dir, result_file, accuracy_collected, f1_collected):
+
+def get_completed_jobs(journal_path):
 	"""
-	Add classification results (accuracy and f1) from frame to list.
+	Get the classification jobs that are recorded as completed in the checkpoint journal
+	and whose result shards still exist. Returns a dict: job key -> configuration hash (see get_job_config).
 	
-	Arguments:
-	wdir (str): path to the working directory
-	data_dir (str): relative path to the data directory
-	result_file (str): path to the result file
-	accuracy_collected (list): list for accuracy results
-	f1_collected (list): list for f1 results
+	Argument:
+	journal_path (str): path to the journal file
 	"""
-				
-	results = pd.read_csv(join(wdir, data_dir, result_file), index_col=0)
+	journal = open_journal(journal_path)
+	rows = journal.execute("SELECT job_key, shard, config FROM units").fetchall()
+	journal.close()
 	
-	acc = results["test_accuracy"].tolist()
-	for acc_value in acc:
-		accuracy_collected.append(acc_value)
-		
-	f1 = results["test_f1"].tolist()
-	for f1_value in f1:
-		if f1_value != 0:
-			f1_collected.append(f1_value)
-		
+	return {job_key: config for job_key, shard_path, config in rows if isfile(shard_path)}
 
-def plot_mfw_results(wdir, data_dir, clf):
+
+def run_experiment_job(wdir, job, md_dir, feature_dir, shard_dir, repetitions, cv, journal_path, config, **kwargs):
 	"""
-	Create a scatter plot showing the mean accuracy for the different numbers of mfw and normalization techniques.
-	The classifier is chosen beforehand for the subgenre level in question.
+	Run the cross validation of one classification job and store its result shard
+	(the score frame, the true and predicted labels and the feature importances).
+	The random number generator is seeded from the job key, so the results do not depend on
+	the order in which the jobs are run or on the number of workers.
+	As soon as the shard is written, the job is recorded as completed in the checkpoint journal.
 	
 	Arguments:
 	wdir (str): path to the working directory
-	data_dir (str): relative path to the directory containing the classification results
-	clf (str): which classifier to use (KNN, SVM, RF)
+	job (dict): the job, see get_experiment_jobs
+	md_dir (str): relative path to the directory containing selected metadata for subgenre constellations
+	feature_dir (str): relative path to the directory containing the feature sets
+	shard_dir (str): relative path to the directory for the result shards
+	repetitions (int): number of data selection repetitions
+	cv (int): number of cross validation folds
+	journal_path (str): path to the checkpoint journal
+	config (str): hash of the configuration the job is run with, recorded in the journal (see get_job_config)
+	
+	optional:
+	knn_mode (str): "precomputed" to run KNN on slices of the manhattan distance matrix of the feature set,
+	which is computed once per feature file and process, or "fit" to compute the distances in each fold, default: "precomputed"
+	svm_backend (str): "libsvm" or "liblinear" (LinearSVC on sparse data), see get_estimator, default: "libsvm"
+	"""
+	knn_mode = kwargs.get("knn_mode", "precomputed")
+	svm_backend = kwargs.get("svm_backend", "libsvm")
+	
+	np.random.seed(zlib.crc32(get_job_key(job).encode("utf-8")))
+	
+	cl = job["cl"]
+	sb_set = job["sb_set"]
+	data_rep = job["data_rep"]
+	precomputed = cl == "KNN" and knn_mode == "precomputed"
+	liblinear = cl == "SVM" and svm_backend == "liblinear"
+	
+	if job["feature_type"] == "mfw":
+		mfw, unit, no = job["mfw"], job["unit"], job["no"]
+		
+		X,y,idnos = select_data_mfw(wdir, md_dir, feature_dir, sb_set, mfw, unit, no, data_rep, cl)
+		feature_path = get_feature_path_mfw(wdir, feature_dir, mfw, unit, no, cl)
+		estimator = get_estimator(cl, "mfw", precomputed=precomputed, svm_backend=svm_backend)
+		
+		set_frame_metadata = lambda frame: set_frame_metadata_mfw(frame, sb_set["level"], sb_set["class 1"], sb_set["class 2"], mfw, unit, no, data_rep)
+		metadata_columns = ["subgenre_level", "class1", "class2", "mfw", "token_unit", "normalization", "data_repetition"]
+		if cl == "SVM" or cl == "RF":
+			feature_names = list(get_feature_names_mfw(wdir, feature_dir, mfw, unit, no))
+		
+	elif job["feature_type"] == "topics":
+		t, oi, topic_rep = job["num_topics"], job["oi"], job["topic_rep"]
+		
+		X,y,idnos = select_data_topics(wdir, md_dir, feature_dir, sb_set, t, oi, data_rep, topic_rep, cl)
+		feature_path = get_feature_path_topics(wdir, feature_dir, t, oi, topic_rep, cl)
+		estimator = get_estimator(cl, "topics", precomputed=precomputed, svm_backend=svm_backend)
+		
+		set_frame_metadata = lambda frame: set_frame_metadata_topics(frame, sb_set["level"], sb_set["class 1"], sb_set["class 2"], t, oi, data_rep, topic_rep)
+		metadata_columns = ["subgenre_level", "class1", "class2", "num_topics", "optimize_interval", "data_repetition", "topic_repetition"]
+		feature_names = list(range(t))
+	
+	shard = {}
+	
+	# for precomputed KNN, the data are the distances between the selected novels
+	# and the folds are fixed beforehand (the same ones cross_validate uses for cv=int), so that the
+	# predictions for all the novels can be made from the distances to the training novels of each fold
+	splits = None
+	if precomputed:
+		X = select_distances(feature_path, idnos, "manhattan")
+		splits = list(StratifiedKFold(n_splits=cv).split(X, y))
+	
+	# liblinear works on the sparse data directly
+	if liblinear:
+		X = sparse.csr_matrix(X)
+	
+	# run cross validation and collect results
+	scores = get_scores(estimator, X, y, sb_set["class 1"], cv if splits is None else splits)
+	score_frame = get_score_frame(scores)
+	score_frame = set_frame_metadata(score_frame)
+	shard["results"] = score_frame.drop("estimator", axis=1)
+	
+	# collect true labels and predicted labels for each cv run
+	label_columns = metadata_columns + ["idno", "y_true"] + ["y_" + str(label_rep) for label_rep in range(repetitions)]
+	label_frame_cv = store_labels(scores, cv, X, y, idnos, splits=splits)
+	shard["labels"] = (label_columns, set_frame_metadata(label_frame_cv))
+	
+	# collect feature importances
+	if cl == "SVM" or cl == "RF":
+		feature_columns = metadata_columns + ["cv_call", "class1_cl", "class2_cl"] + feature_names
+		feature_frame_cv = store_features(cl, scores, cv, feature_names)
+		shard["features"] = (feature_columns, set_frame_metadata(feature_frame_cv))
+	
+	# write the shard under a temporary name first, so that an interrupted run does not leave a partial shard
+	shard_path = get_shard_path(wdir, shard_dir, job)
+	pd.to_pickle(shard, shard_path + ".tmp", compression=None)
+	replace(shard_path + ".tmp", shard_path)
+	
+	record_job(journal_path, job, shard_path, config)
+	
+	return shard_path
+	
+
+def merge_experiment_shards(wdir, jobs, shard_dir, outpath):
+	"""
+	Merge the result shards of classification jobs into the results-*.csv, labels*.csv and features-*.csv files.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	jobs (list): the jobs, in the order of get_experiment_jobs
+	shard_dir (str): relative path to the directory containing the result shards
+	outpath (str): relative path to the output directory
+	"""
+	# which shards belong to which output file?
+	outputs = {}
+	for job in jobs:
+		for kind, filename in get_job_outputs(job):
+			outputs.setdefault(filename, (kind, []))[1].append(get_shard_path(wdir, shard_dir, job))
+	
+	for filename, (kind, shard_paths) in outputs.items():
+		print("merging " + filename + "...")
+		
+		frame = None
+		for shard_path in shard_paths:
+			part = pd.read_pickle(shard_path)[kind]
+			if kind == "results":
+				if frame is None:
+					frame = ResultAccumulator()
+				frame.add_frame(part)
+			else:
+				# label and feature files start with a fixed column order
+				columns, part = part
+				if frame is None:
+					frame = ResultAccumulator(columns)
+				frame.add_frame(part)
+			
+		frame.to_frame(ignore_index=True).to_csv(join(wdir, outpath, filename))
+	
+
+def run_experiments(wdir, level, subgenre_sets, classifiers, repetitions, cv, **kwargs):
+	"""
+	Run the classification experiments for a subgenre level on a process pool.
+	The grid of feature settings, classifiers, subgenre constellations and data repetitions is expanded into
+	independent jobs (see get_experiment_jobs), each job writes its own result shard, and the shards are merged
+	into the same results-*.csv, labels*.csv and features-*.csv files as produced by the sequential loops.
+	
+	Completed jobs are recorded in a checkpoint journal (journal.sqlite in the shard directory), together with
+	the configuration they were run with (see get_job_config). When the experiments are run again, e.g. after a crash,
+	the completed jobs are skipped, unless the configuration or the feature and metadata files have changed.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	level (str): subgenre level that is analyzed, e.g. "themes"
+	subgenre_sets (list): list of dicts describing the subgenre constellations
+	classifiers (list): list of classifiers, e.g. ["KNN", "SVM", "RF"]
+	repetitions (int): number of data selection repetitions
+	cv (int): number of cross validation folds
+	
+	optional:
+	mfws, token_units, norms, num_topics, optimize_intervals, topic_repetitions: feature parameters, see get_experiment_jobs
+	md_dir (str): relative path to the directory containing selected metadata for subgenre constellations
+	feature_dir_mfw (str): relative path to the directory containing the mfw feature sets
+	feature_dir_topics (str): relative path to the directory containing the topic feature sets
+	outpath (str): relative path to the output directory, default: data-nh/analysis/classification/[level]/results_data
+	n_jobs (int): number of parallel jobs, default: -1 (all cores)
+	resume (bool): whether to skip the jobs that are recorded as completed in the journal with the same configuration, default: True
+	knn_mode (str): "precomputed" (distance matrix computed once per feature file) or "fit", see run_experiment_job
+	svm_backend (str): "libsvm" or "liblinear", see get_estimator and report_svm_backends
+	"""
+	md_dir = kwargs.get("md_dir", "data-nh/analysis/classification/data_selection/main/")
+	feature_dir_mfw = kwargs.get("feature_dir_mfw", "data-nh/analysis/features/mfw/")
+	feature_dir_topics = kwargs.get("feature_dir_topics", "data-nh/analysis/features/topics/4_aggregates/")
+	outpath = kwargs.get("outpath", join("data-nh/analysis/classification/", level, "results_data"))
+	n_jobs = kwargs.get("n_jobs", -1)
+	resume = kwargs.get("resume", True)
+	knn_mode = kwargs.get("knn_mode", "precomputed")
+	svm_backend = kwargs.get("svm_backend", "libsvm")
+	
+	shard_dir = join(outpath, "shards")
+	makedirs(join(wdir, shard_dir), exist_ok=True)
+	journal_path = join(wdir, shard_dir, "journal.sqlite")
+	
+	jobs = get_experiment_jobs(level, subgenre_sets, classifiers, repetitions, **kwargs)
+	
+	feature_dirs = {"mfw": feature_dir_mfw, "topics": feature_dir_topics}
+	configs = [get_job_config(wdir, job, md_dir, feature_dirs[job["feature_type"]], repetitions, cv, knn_mode=knn_mode, svm_backend=svm_backend) for job in jobs]
+	
+	# skip the jobs that were completed in an earlier run with the same configuration
+	if resume:
+		completed = get_completed_jobs(journal_path)
+		todo = [(job, config) for job, config in zip(jobs, configs) if completed.get(get_job_key(job)) != config]
+	else:
+		todo = list(zip(jobs, configs))
+	print("doing level " + level + ": " + str(len(todo)) + " jobs (" + str(len(jobs) - len(todo)) + " already completed)...")
+	
+	Parallel(n_jobs=n_jobs, backend="loky", verbose=5)(delayed(run_experiment_job)(wdir, job, md_dir, feature_dirs[job["feature_type"]], shard_dir, repetitions, cv, journal_path, config, knn_mode=knn_mode, svm_backend=svm_backend) for job, config in todo)
+	
+	merge_experiment_shards(wdir, jobs, shard_dir, outpath)
+	
+	print("done")
+	
+	
+def get_results_db_path(wdir, data_dir):
+	"""
+	Get the path of the results warehouse of a subgenre level (an SQLite database in the results directory).
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	"""
+	return join(wdir, data_dir, "results.sqlite")
+	
+	
+def parse_result_filename(result_file):
+	"""
+	Get the classifier and feature parameters from the name of a results file,
+	e.g. results-SVM-mfw100_4gram_chars_word_tf.csv or results-SVM-topics100_250in.csv.
+	Returns a dict, or None if the name does not match.
+	
+	Argument:
+	result_file (str): name of the results file
+	"""
+	match_mfw = re.match(r"^results-(\w+)-mfw(\d+)_(.+)_(tf|tfidf|zscore)\.csv$", result_file)
+	if match_mfw:
+		return {"cl": match_mfw.group(1), "feature_type": "mfw", "mfw": int(match_mfw.group(2)), "unit": match_mfw.group(3), "norm": match_mfw.group(4), "num_topics": None, "oi": None}
+	match_topics = re.match(r"^results-(\w+)-topics(\d+)_(\w+)in\.csv$", result_file)
+	if match_topics:
+		return {"cl": match_topics.group(1), "feature_type": "topics", "mfw": None, "unit": None, "norm": None, "num_topics": int(match_topics.group(2)), "oi": match_topics.group(3)}
+	return None
+	
+	
+def get_expected_result_files(**kwargs):
+	"""
+	Get the names of the results files that a selection of results is taken from, if the selection names them completely
+	(by result_file, or by the classifiers and all the feature parameters of a feature type). Returns a list, or None.
+	
+	optional (columns to select results by, see query_results):
+	result_file, cl, feature_type, mfw, unit, norm, num_topics, oi
+	"""
+	def get_values(col):
+		return kwargs[col] if isinstance(kwargs[col], list) else [kwargs[col]]
+	
+	if "result_file" in kwargs:
+		return get_values("result_file")
+	if "cl" not in kwargs or "feature_type" not in kwargs:
+		return None
+	
+	result_files = []
+	for feature_type in get_values("feature_type"):
+		if feature_type == "mfw" and all(col in kwargs for col in ["mfw", "unit", "norm"]):
+			for cl in get_values("cl"):
+				for mfw in get_values("mfw"):
+					for unit in get_values("unit"):
+						for norm in get_values("norm"):
+							result_files.append("results-" + cl + "-mfw" + str(mfw) + "_" + unit + "_" + norm + ".csv")
+		elif feature_type == "topics" and all(col in kwargs for col in ["num_topics", "oi"]):
+			for cl in get_values("cl"):
+				for t in get_values("num_topics"):
+					for oi in get_values("oi"):
+						result_files.append("results-" + cl + "-topics" + str(t) + "_" + str(oi) + "in.csv")
+		else:
+			return None
+	return result_files
+	
+
+def ingest_results(wdir, data_dir):
+	"""
+	Load all the results-*.csv files of a subgenre level into one indexed table of the results warehouse,
+	with the classifier and feature parameters (taken from the file names) as columns.
+	Files that were ingested before and have not changed since are skipped, changed files are loaded again,
+	and the results of files that have been removed are deleted.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	"""
+	param_columns = ["cl", "feature_type", "mfw", "unit", "norm", "num_topics", "oi"]
+	score_columns = ["class1", "class2", "data_repetition", "topic_repetition", "test_accuracy", "test_precision", "test_recall", "test_f1"]
+	
+	db = sqlite3.connect(get_results_db_path(wdir, data_dir), timeout=60)
+	db.execute("CREATE TABLE IF NOT EXISTS result_files (result_file TEXT PRIMARY KEY, mtime REAL)")
+	db.execute("CREATE TABLE IF NOT EXISTS results (result_file TEXT, cl TEXT, feature_type TEXT, mfw INTEGER, unit TEXT, norm TEXT, num_topics INTEGER, oi TEXT, "
+	"class1 TEXT, class2 TEXT, data_repetition INTEGER, topic_repetition INTEGER, test_accuracy REAL, test_precision REAL, test_recall REAL, test_f1 REAL)")
+	db.execute("CREATE INDEX IF NOT EXISTS results_mfw ON results (cl, feature_type, mfw, unit, norm, class1, class2)")
+	db.execute("CREATE INDEX IF NOT EXISTS results_topics ON results (cl, feature_type, num_topics, oi, class1, class2)")
+	db.execute("CREATE INDEX IF NOT EXISTS results_file ON results (result_file)")
+	
+	ingested = dict(db.execute("SELECT result_file, mtime FROM result_files").fetchall())
+	
+	result_paths = sorted(glob.glob(join(wdir, data_dir, "results-*.csv")))
+	removed = set(ingested) - set([os.path.basename(result_path) for result_path in result_paths])
+	with db:
+		for result_file in removed:
+			db.execute("DELETE FROM results WHERE result_file = ?", (result_file,))
+			db.execute("DELETE FROM result_files WHERE result_file = ?", (result_file,))
+	
+	num_ingested = 0
+	for result_path in result_paths:
+		result_file = os.path.basename(result_path)
+		params = parse_result_filename(result_file)
+		mtime = os.path.getmtime(result_path)
+		if params is None or ingested.get(result_file) == mtime:
+			continue
+		
+		results = pd.read_csv(result_path, index_col=0)
+		rows = pd.DataFrame(index=results.index)
+		rows["result_file"] = result_file
+		for col in param_columns:
+			rows[col] = params[col]
+		for col in score_columns:
+			rows[col] = results[col] if col in results.columns else None
+		
+		with db:
+			db.execute("DELETE FROM results WHERE result_file = ?", (result_file,))
+			rows.to_sql("results", db, if_exists="append", index=False)
+			db.execute("INSERT OR REPLACE INTO result_files VALUES (?, ?)", (result_file, mtime))
+		num_ingested += 1
+	
+	db.close()
+	
+	if num_ingested > 0:
+		print("ingested " + str(num_ingested) + " results files into " + get_results_db_path(wdir, data_dir))
+	
+	
+def query_results(wdir, data_dir, **kwargs):
+	"""
+	Get classification results from the results warehouse of a subgenre level (ingesting new or changed results files first).
+	Returns a data frame with one row for each cv run, in the order of the results files.
+	Raises a FileNotFoundError if the selection names results files that do not exist (see get_expected_result_files).
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	
+	optional (columns to select results by, each with a single value or a list of values):
+	result_file, cl, feature_type, mfw, unit, norm, num_topics, oi, class1, class2
+	"""
+	expected = get_expected_result_files(**kwargs)
+	if expected is not None:
+		missing = [result_file for result_file in expected if not isfile(join(wdir, data_dir, result_file))]
+		if len(missing) > 0:
+			raise FileNotFoundError(str(len(missing)) + " results file(s) missing in " + join(wdir, data_dir) + ": " + ", ".join(missing[:10]) + (" ..." if len(missing) > 10 else ""))
+	
+	ingest_results(wdir, data_dir)
+	
+	conditions = []
+	values = []
+	for col in ["result_file", "cl", "feature_type", "mfw", "unit", "norm", "num_topics", "oi", "class1", "class2"]:
+		if col not in kwargs:
+			continue
+		selected = kwargs[col] if isinstance(kwargs[col], list) else [kwargs[col]]
+		# optimize intervals are stored as strings, as in the file names (e.g. "None")
+		if col == "oi":
+			selected = [str(val) for val in selected]
+		conditions.append(col + " IN (" + ", ".join(["?"] * len(selected)) + ")")
+		values.extend(selected)
+	
+	query = "SELECT * FROM results"
+	if len(conditions) > 0:
+		query += " WHERE " + " AND ".join(conditions)
+	query += " ORDER BY rowid"
+	
+	db = sqlite3.connect(get_results_db_path(wdir, data_dir), timeout=60)
+	results = pd.read_sql_query(query, db, params=values)
+	db.close()
+	
+	return results
+	
+	
+def get_score_summary(results):
+	"""
+	Get the number of runs, top accuracy, mean accuracy, standard deviation accuracy,
+	top F1, mean F1 and std.dev. F1 of a selection of classification results
+	(F1 scores of 0 are not counted).
+	
+	Argument:
+	results (DataFrame): classification results, see query_results
+	"""
+	accuracy_collected = results["test_accuracy"].tolist()
+	f1_collected = [f1_value for f1_value in results["test_f1"].tolist() if f1_value != 0]
+	
+	top_acc = max(accuracy_collected)
+	mean_acc = np.mean(accuracy_collected)
+	std_acc = np.std(accuracy_collected)
+	
+	top_f1 = max(f1_collected)
+	mean_f1 = np.mean(f1_collected)
+	std_f1 = np.std(f1_collected)
+	
+	return len(accuracy_collected), top_acc, mean_acc, std_acc, top_f1, mean_f1, std_f1
+	
+	
+def get_score_summaries(results, keys):
+	"""
+	Get the score summaries (see get_score_summary) for groups of classification results, e.g. for all subgenre constellations.
+	Returns a dict: group key -> summary.
+	
+	Arguments:
+	results (DataFrame): classification results, see query_results
+	keys (list): columns to group the results by, e.g. ["class1", "class2"]
+	"""
+	return {key: get_score_summary(group) for key, group in results.groupby(keys, sort=False)}
+	
+
+def get_results_subgenres_mfw(wdir, data_dir, cl, mfw, norm, unit, subgenre_1, subgenre_2):
+	"""
+	Get the top and mean results for a certain subgenre constellation (e.g. "novela histórica" vs. "other",
+	given the classifier (e.g. "SVM"), the number of mfw, normalization technique and token unit.
+	Returns the following numbers: top accuracy, mean accuracy, standard deviation accuracy,
+	top F1, mean F1, std.dev. F1
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	clf (str): the classifier used, e.g. "SVM"
+	mfw (int): the number of mfw
+	norm (str): type of normalization, "tf", "tfidf", "zscore"
+	subgenre_1 (str): the positive class
+	subgenre_2 (str): the negative class 
+	"""
+	print("get results subgenres mfw...")
+	
+	# results from e.g. results-SVM-mfw100_4gram_chars_word_tf.csv, only for the subgenre constellation
+	results_sub = query_results(wdir, data_dir, cl=cl, feature_type="mfw", mfw=mfw, unit=unit, norm=norm, class1=subgenre_1, class2=subgenre_2)
+	
+	return get_score_summary(results_sub)
+	
+	
+def get_results_subgenres_topics(wdir, data_dir, clf, num_topics, oi, subgenre_1, subgenre_2):
+	"""
+	Get the top and mean results for a certain subgenre constellation (e.g. "novela histórica" vs. "other",
+	given the classifier (e.g. "SVM"), the number of topics, and the optimize interval.
+	Returns the following numbers: top accuracy, mean accuracy, standard deviation accuracy,
+	top F1, mean F1, std.dev. F1
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	clf (str): the classifier used, e.g. "SVM"
+	num_topics (int): the number of topics
+	oi (int): the optimize interval parameter
+	subgenre_1 (str): the positive class
+	subgenre_2 (str): the negative class 
+	"""
+	print("get results subgenres topics...")
+	#print("subgenre 1: " + subgenre_1)
+	#print("subgenre 2: " + subgenre_2)
+	
+	# results from e.g. results-SVM-topics100_250in.csv, only for the subgenre constellation
+	results_sub = query_results(wdir, data_dir, cl=clf, feature_type="topics", num_topics=num_topics, oi=oi, class1=subgenre_1, class2=subgenre_2)
+	
+	return get_score_summary(results_sub)
+		
+	
+def get_classifier_results_selection(feature_type):
+	"""
+	Get the feature parameters of the results that are considered for a classifier and feature type,
+	as keyword arguments for query_results.
+	
+	Argument:
+	feature_type (str): which feature type to consider, e.g. "MFW" (MFW with word unit), "MFW word n-grams", "MFW character n-grams", "topics"
+	"""
+	# general set of feature parameters
+	mfws = [100, 200, 300, 400, 500, 1000, 2000, 3000, 4000, 5000]
+	units_word_ngrams = ["2gram_words", "3gram_words", "4gram_words"]
+	units_char_ngrams = ["3gram_chars", "4gram_chars", "5gram_chars", 
+	"3gram_chars_word", "4gram_chars_word", "5gram_chars_word", "3gram_chars_affix-punct", "4gram_chars_affix-punct", "5gram_chars_affix-punct"]
+	norms = ["tf", "tfidf", "zscore"]
+
+	num_topics = [50, 60, 70, 80, 90, 100]
+	optimize_intervals = [50, 100, 250, 500, 1000, 2500, 5000, None]
+	
+	if feature_type == "topics":
+		# results file name e.g.: results-SVM-topics100_250in.csv
+		return {"feature_type": "topics", "num_topics": num_topics, "oi": [str(oi) for oi in optimize_intervals]}
+	
+	# results file name e.g.: results-KNN-mfw2000_3gram_chars_tfidf.csv
+	if feature_type == "MFW":
+		units = ["word"]
+	elif feature_type == "MFW word n-grams":
+		units = units_word_ngrams
+	elif feature_type == "MFW character n-grams":
+		units = units_char_ngrams
+	return {"feature_type": "mfw", "mfw": mfws, "unit": units, "norm": norms}
+	
+	
+def get_classifier_results(wdir, data_dir, classifiers, feature_type):
+	"""
+	Get all the results that are considered for classifiers and a feature type from the results warehouse,
+	in the order in which the results files were formerly collected one by one
+	(by number of mfw, normalization and token unit, or by number of topics and optimize interval).
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	classifiers (list): shortcuts for the classifiers (KNN, SVM, RF)
+	feature_type (str): which feature type to consider, e.g. "MFW" (MFW with word unit), "MFW word n-grams", "MFW character n-grams", "topics"
+	"""
+	selection = get_classifier_results_selection(feature_type)
+	results = query_results(wdir, data_dir, cl=classifiers, **selection)
+	
+	if feature_type == "topics":
+		order_columns = ["num_topics", "oi"]
+	else:
+		order_columns = ["mfw", "norm", "unit"]
+	# positions of the parameter values in the selection lists, the first column being the primary sort key (the sort is stable)
+	positions = [results[col].map({val: pos for pos, val in enumerate(selection[col])}).to_numpy() for col in order_columns]
+	
+	return results.iloc[np.lexsort(positions[::-1])]
+	
+
+def get_results_classifier(wdir, data_dir, classifier, feature_type):
+	"""
+	Get the top and mean results for a certain classifier and on a determined subgenre level (through the data_dir).
+	Returns the following numbers: top accuracy, mean accuracy, standard deviation accuracy,
+	top F1, mean F1, std.dev. F1
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results files
+	classifier (str): shortcut for the classifier (KNN, SVM, RF)
+	feature_type (str): which feature type to consider, e.g. "MFW" (MFW with word unit), "MFW word n-grams", "MFW character n-grams", "topics"
+	"""
+	print("get classifier results for " + classifier + "...")
+	
+	# collect all relevant results
+	results = get_classifier_results(wdir, data_dir, [classifier], feature_type)
+	
+	return get_score_summary(results)
+	
+
+def collect_results(wdir, data_dir, result_file, accuracy_collected, f1_collected):
+	"""
+	Add classification results (accuracy and f1) from frame to list.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the data directory
+	result_file (str): path to the result file
+	accuracy_collected (list): list for accuracy results
+	f1_collected (list): list for f1 results
+	"""
+	results = query_results(wdir, data_dir, result_file=result_file)
+	
+	accuracy_collected.extend(results["test_accuracy"].tolist())
+	f1_collected.extend([f1_value for f1_value in results["test_f1"].tolist() if f1_value != 0])
+		
+
+def plot_mfw_results(wdir, data_dir, clf):
+	"""
+	Create a scatter plot showing the mean accuracy for the different numbers of mfw and normalization techniques.
+	The classifier is chosen beforehand for the subgenre level in question.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing the classification results
+	clf (str): which classifier to use (KNN, SVM, RF)
 	"""
 	print("plot mfw results...")
 	
@@ -1098,9 +1840,10 @@ def plot_mfw_results(wdir, data_dir, clf):
 	fig.update_yaxes(title="mean accuracy")
 
 	outfile = "plot_scatter_" + clf + "_MFW"
-	fig.write_image(join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, data_dir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, data_dir, outdir, outfile + ".html"))
 	
+	figure_renderer.wait_renderers()
 	print("done")
 
 	
@@ -1165,8 +1908,8 @@ def plot_mfw_ngram_results(wdir, data_dir, clf, unit):
 		fig.update_yaxes(title="mean accuracy")
 
 		outfile = "plot_scatter_" + clf + "_MFW_ngrams_" + unit
-		fig.write_image(join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-		fig.write_html(join(wdir, data_dir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+		figure_renderer.write_image(fig, join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+		figure_renderer.write_html(fig, join(wdir, data_dir, outdir, outfile + ".html"))
 		
 	if unit == "chars":
 	# create three different charts for the different types of char ngrams (standard, word-group, affix-punct-group)
@@ -1207,8 +1950,9 @@ def plot_mfw_ngram_results(wdir, data_dir, clf, unit):
 			fig.update_yaxes(title="mean accuracy")
 
 			outfile = "plot_scatter_" + clf + "_MFW_ngrams_" + unit + "_" + str(i)
-			fig.write_image(join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-			fig.write_html(join(wdir, data_dir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+			figure_renderer.write_image(fig, join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+			figure_renderer.write_html(fig, join(wdir, data_dir, outdir, outfile + ".html"))
+	figure_renderer.wait_renderers()
 	print("done")	
 
 
@@ -1268,9 +2012,10 @@ def plot_topic_results(wdir, data_dir, clf):
 	fig.update_yaxes(title="mean accuracy")
 
 	outfile = "plot_scatter_" + clf + "_topics"
-	fig.write_image(join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, data_dir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, data_dir, outdir, outfile + ".html"))
 	
+	figure_renderer.wait_renderers()
 	print("done")
 	
 	
@@ -1293,51 +2038,75 @@ def get_result_table_classifier(wdir, data_dir, feature_type):
 	feature_sets_mfw = ["MFW", "MFW word n-grams", "MFW character n-grams"]
 	
 	columns = ["classifier", "feature_type", "num_runs", "top_acc", "mean_acc", "sd_acc", "top_f1", "mean_f1", "sd_f1"]
-	summary_fr = pd.DataFrame(columns=columns)
+	summary_fr = ResultAccumulator(columns)
+	
+	if feature_type == "mfw":
+		feature_sets = feature_sets_mfw
+	elif feature_type == "topics":
+		feature_sets = [feature_type]
+	
+	# one query per feature set for all the classifiers, grouped by classifier
+	summaries = {}
+	for feature_set in feature_sets:
+		results = get_classifier_results(wdir, data_dir, clfs, feature_set)
+		for cl, summary in get_score_summaries(results, "cl").items():
+			summaries[(cl, feature_set)] = summary
 	
 	for cl in clfs:
+		# rows for the feature sets, to calculate average scores for the three mfw feature sets
+		avg_rows = []
+		for feature_set in feature_sets:
+			data = [cl, feature_set] + list(summaries[(cl, feature_set)])
+			summary_fr.add_row(data)
+			avg_rows.append(data)
+		
 		if feature_type == "mfw":
-			# prepare a frame to calculate average scores for the three feature sets later
-			avg_fr = pd.DataFrame(index=columns)
-			
-			for feature_set in feature_sets_mfw:
-				# fetch the results
-				res = get_results_classifier(wdir, data_dir, cl, feature_set)
-				
-				data = [cl, feature_set] + list(res)
-				res_ser = pd.Series(index=columns, data=data)
-				# append to overall summary
-				summary_fr = summary_fr.append(res_ser, ignore_index = True)
-				# append to avg frame
-				avg_fr = avg_fr.append(res_ser, ignore_index = True)
-			
+			avg_fr = pd.DataFrame(avg_rows, columns=columns)
 			runs_sum = avg_fr["num_runs"].sum()
-			avg_scores = []
 			score_cols = ["top_acc", "mean_acc", "sd_acc", "top_f1", "mean_f1", "sd_f1"]
+			avg_scores = [avg_fr[score].mean(axis=0) for score in score_cols]
 			
-			for score in score_cols:
-				avg_sc = avg_fr[score].mean(axis=0)
-				avg_scores.append(avg_sc)
-			
-			avg_data = [cl, "all", runs_sum] + avg_scores
-			avg_ser = pd.Series(index=columns, data=avg_data)
-			# append avg to overall summary
-			summary_fr = summary_fr.append(avg_ser, ignore_index = True)
-		
-		elif feature_type == "topics":
-			# fetch the results
-			res = get_results_classifier(wdir, data_dir, cl, feature_type)
-			data = [cl, feature_type] + list(res)
-			res_ser = pd.Series(index=columns, data=data)
-			# append to overall summary
-			summary_fr = summary_fr.append(res_ser, ignore_index = True)
+			# add avg to overall summary
+			summary_fr.add_row([cl, "all", runs_sum] + avg_scores)
 	
 	# save result summary
+	summary_fr = summary_fr.to_frame(ignore_index=True)
 	summary_fr.to_csv(join(wdir, data_dir, outdir, "results_classifier_" + feature_type + ".csv"))
 	
 	print("done")
 	
 
+def get_result_table_subgenres(subgenre_level, settings, results):
+	"""
+	Collect the score summaries for all subgenre constellations on a subgenre level from a selection of classification results.
+	Returns a list of rows, one per constellation.
+	
+	Arguments:
+	subgenre_level (str): type of subgenres, "themes", "currents", or "novela"
+	settings (list): values of the first columns of each row (classifier, feature type and parameters)
+	results (DataFrame): the classification results, see query_results
+	"""
+	# get results for each subgenre constellation
+	if subgenre_level == "themes":
+		subgenre_sets = subgenre_sets_theme
+	elif subgenre_level == "currents":
+		subgenre_sets = subgenre_sets_currents
+	elif subgenre_level == "novela":
+		subgenre_sets = subgenre_sets_novela
+	
+	summaries = get_score_summaries(results, ["class1", "class2"])
+	
+	rows = []
+	for const in subgenre_sets:
+		class1 = const["class 1"]
+		class2 = const["class 2"]
+		print(class1 + " vs. " + class2)
+		
+		rows.append(settings + [subgenre_level, class1, class2] + list(summaries[(class1, class2)]))
+	
+	return rows
+	
+
 def get_result_table_subgenres_mfw(wdir, data_dir, subgenre_level, cl, mfw, norm, unit):
 	"""
 	Create an overview of the classification results for mfw features 
@@ -1361,26 +2130,10 @@ def get_result_table_subgenres_mfw(wdir, data_dir, subgenre_level, cl, mfw, norm
 	
 	# prepare the data frame, feature_type = unit
 	columns = ["classifier", "feature_type", "mfw", "norm", "subgenre_level", "class_1", "class_2", "num_runs", "top_acc", "mean_acc", "sd_acc", "top_f1", "mean_f1", "sd_f1"]
-	summary_fr = pd.DataFrame(columns=columns)
 	
-	# get results for each subgenre constellation
-	if subgenre_level == "themes":
-		subgenre_sets = subgenre_sets_theme
-	elif subgenre_level == "currents":
-		subgenre_sets = subgenre_sets_currents
-	elif subgenre_level == "novela":
-		subgenre_sets = subgenre_sets_novela
-		
-	for const in subgenre_sets:
-		class1 = const["class 1"]
-		class2 = const["class 2"]
-		print(class1 + " vs. " + class2)
-		
-		res = get_results_subgenres_mfw(wdir, data_dir, cl, mfw, norm, unit, class1, class2)
-		data = [cl, unit, mfw, norm, subgenre_level, class1, class2] + list(res)
-		res_ser = pd.Series(index=columns, data=data)
-		# append to overall summary
-		summary_fr = summary_fr.append(res_ser, ignore_index = True)
+	results = query_results(wdir, data_dir, cl=cl, feature_type="mfw", mfw=mfw, unit=unit, norm=norm)
+	rows = get_result_table_subgenres(subgenre_level, [cl, unit, mfw, norm], results)
+	summary_fr = pd.DataFrame(rows, columns=columns)
 	
 	# save result summary
 	summary_fr.to_csv(join(wdir, data_dir, outdir, "results_subgenres_mfw_" + cl + "_" + str(mfw) + "mfw_" + norm + "_" + unit + ".csv"))
@@ -1413,26 +2166,10 @@ def get_result_table_subgenres_topics(wdir, data_dir, subgenre_level, cl, num_to
 	
 	# prepare the data frame
 	columns = ["classifier", "feature_type", "num_topics", "oi", "subgenre_level", "class_1", "class_2", "num_runs", "top_acc", "mean_acc", "sd_acc", "top_f1", "mean_f1", "sd_f1"]
-	summary_fr = pd.DataFrame(columns=columns)
-	
-	# get results for each subgenre constellation
-	if subgenre_level == "themes":
-		subgenre_sets = subgenre_sets_theme
-	elif subgenre_level == "currents":
-		subgenre_sets = subgenre_sets_currents
-	elif subgenre_level == "novela":
-		subgenre_sets = subgenre_sets_novela
-		
-	for const in subgenre_sets:
-		class1 = const["class 1"]
-		class2 = const["class 2"]
-		print(class1 + " vs. " + class2)
 	
-		res = get_results_subgenres_topics(wdir, data_dir, cl, num_topics, oi, class1, class2)
-		data = [cl, "topics", num_topics, oi, subgenre_level, class1, class2] + list(res)
-		res_ser = pd.Series(index=columns, data=data)
-		# append to overall summary
-		summary_fr = summary_fr.append(res_ser, ignore_index = True)
+	results = query_results(wdir, data_dir, cl=cl, feature_type="topics", num_topics=num_topics, oi=oi)
+	rows = get_result_table_subgenres(subgenre_level, [cl, "topics", num_topics, oi], results)
+	summary_fr = pd.DataFrame(rows, columns=columns)
 	
 	# save result summary
 	summary_fr.to_csv(join(wdir, data_dir, outdir, "results_subgenres_topics_" + cl + "_" + str(num_topics) + "t_" + str(oi) + "oi.csv"))
@@ -1535,9 +2272,10 @@ def plot_feature_importances_mfw(wdir, data_dir, subgenre_level, cl, mfw, norm,
 		
 		outfile = "feat_imp_" + cl + "_" + str(mfw) + "mfw_" + norm + "_" + unit + "_" + re.sub(r"\s",r"_",class1) + "_" + re.sub(r"\s",r"_",class2)
 
-		fig.write_image(join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-		fig.write_html(join(wdir, data_dir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+		figure_renderer.write_image(fig, join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+		figure_renderer.write_html(fig, join(wdir, data_dir, outdir, outfile + ".html"))
 
+	figure_renderer.wait_renderers()
 	print("done")
 
 
@@ -1661,35 +2399,83 @@ def plot_feature_importances_topics(wdir, data_dir, subgenre_level, cl, num_topi
 		
 		outfile = "feat_imp_" + cl + "_" + str(num_topics) + "t_" + str(oi) + "oi_topic-rep_" + str(topic_rep) + "_" + re.sub(r"\s",r"_",class1) + "_" + re.sub(r"\s",r"_",class2)
 
-		fig.write_image(join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-		fig.write_html(join(wdir, data_dir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+		figure_renderer.write_image(fig, join(wdir, data_dir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+		figure_renderer.write_html(fig, join(wdir, data_dir, outdir, outfile + ".html"))
 	
 			
+	figure_renderer.wait_renderers()
 	print("done")
 	
 
-def plot_histogram_misclassifications_mfw(wdir, data_dir, subgenre_level, cl, mfw, norm, unit):
+def get_misclassification_summary(label_file, cv, num_novels):
 	"""
-	For each subgenre constellation on a subgenre level: plot a histogram showing in how many cases (in percent) the novels
-	were classified correctly.
-	Also: produce a table collecting the absolute sums and relative numbers of correct and false classifications for each novel in the corpus.
-	The classifier and parameters for it are fixed beforehand.
+	Count how often each novel of the corpus was classified correctly and falsely, for all the subgenre constellations
+	of a label file at once (the predictions of all the data repetitions and cv runs are counted).
+	Returns a data frame with a (class1, class2, idno) index and the columns
+	y_true (true label of the novel), true_abs, true_rel, false_abs and false_rel (classified correctly/falsely how often,
+	in absolute numbers and relative to the number of predictions).
+	
+	Arguments:
+	label_file (DataFrame): true and predicted labels, as stored by run_experiments
+	cv (int): number of cv runs (columns y_0, y_1, ...)
+	num_novels (int): number of novels in the corpus (idnos nh0001, nh0002, ...)
+	"""
+	keys = ["class1", "class2", "idno"]
+	pred_columns = ["y_" + str(cv_idx) for cv_idx in range(cv)]
+	corpus_idnos = ["nh" + '%04d' % (novel_idx + 1) for novel_idx in range(num_novels)]
+	
+	rows = label_file.loc[label_file["idno"].isin(corpus_idnos), keys + ["y_true"] + pred_columns].copy()
+	# the true label of a novel is taken from its first row
+	rows["y_true"] = rows.groupby(keys, sort=False)["y_true"].transform("first")
+	
+	# one row for each prediction
+	predictions = rows.melt(id_vars=keys + ["y_true"], value_vars=pred_columns, value_name="y_pred")
+	predictions["true_abs"] = predictions["y_pred"] == predictions["y_true"]
+	
+	summary = predictions.groupby(keys, sort=True).agg(y_true=("y_true", "first"), true_abs=("true_abs", "sum"), pred_sum=("y_pred", "size"))
+	summary["true_abs"] = summary["true_abs"].astype(int)
+	summary["true_rel"] = summary["true_abs"] / summary["pred_sum"]
+	summary["false_abs"] = summary["pred_sum"] - summary["true_abs"]
+	summary["false_rel"] = summary["false_abs"] / summary["pred_sum"]
+	
+	return summary[["y_true", "true_abs", "true_rel", "false_abs", "false_rel"]]
+	
+	
+def get_misclassification_settings_name(setting):
+	"""
+	Get the file name parts of a classifier and feature setting for misclassification summaries:
+	the name of the label file and the start of the names of the misclassification files.
+	
+	Arguments:
+	setting (dict): classifier and feature setting, either {"cl": "SVM", "mfw": 1000, "norm": "tfidf", "unit": "word"}
+	or {"cl": "SVM", "num_topics": 90, "oi": 250, "topic_rep": 0}
+	"""
+	cl = setting["cl"]
+	if "mfw" in setting:
+		label_filename = "labels_" + cl + "-mfw" + str(setting["mfw"]) + "_" + setting["unit"] + "_" + setting["norm"] + ".csv"
+		outfile_start = "misclassifications_" + cl + "_" + str(setting["mfw"]) + "mfw-" + setting["norm"] + "_" + setting["unit"]
+	else:
+		label_filename = "labels-" + cl + "-topics" + str(setting["num_topics"]) + "_" + str(setting["oi"]) + "in-topic-rep_" + str(setting["topic_rep"]) + ".csv"
+		outfile_start = "misclassifications_" + cl + "_" + str(setting["num_topics"]) + "t-" + str(setting["oi"]) + "oi-topic_rep_" + str(setting["topic_rep"])
+	return label_filename, outfile_start
+	
+
+def summarize_misclassifications(wdir, data_dir, subgenre_level, settings):
+	"""
+	For each classifier and feature setting and each subgenre constellation on a subgenre level:
+	produce a table collecting the absolute sums and relative numbers of correct and false classifications for each novel in the corpus
+	(misclassifications_*.csv in the results_summaries directory).
+	Each label file is read and aggregated once for all the constellations.
+	Returns a list of (constellation, name of the misclassification file, summary frame) tuples.
 	
 	Arguments:
 	wdir (str): path to the working directory
 	data_dir (str): relative path to the directory containing all the classification results
 	subgenre_level (str): the kind of subgenre level to analyze ("themes", "currents", "novelas")
-	cl (str): the classifier to use
-	mfw (int): the number of mfw
-	norm (str): normalization technique, "tf", "tfidf", "zscore"
-	unit (str): token unit, e.g. "word", "2gram_words", "3gram_chars"
+	settings (list): classifier and feature settings, see get_misclassification_settings_name
 	"""
-	
-	print("plot histogram misclassifications mfw...")
-	
-	# relative path to the output directory where the plots should be stored (relative to data_dir)
+	# relative path to the output directory where the summaries should be stored (relative to data_dir)
 	outdir_summaries = "../results_summaries"
-	outdir_visuals = "../visuals"
 	
 	# get results for each subgenre constellation
 	if subgenre_level == "themes":
@@ -1699,63 +2485,64 @@ def plot_histogram_misclassifications_mfw(wdir, data_dir, subgenre_level, cl, mf
 	elif subgenre_level == "novela":
 		subgenre_sets = subgenre_sets_novela
 	
-	# get label file, e.g. labels_SVM-mfw200_2gram_words_tf.csv
-	label_filename = "labels_" + cl + "-mfw" + str(mfw) + "_" + unit + "_" + norm + ".csv"
-	label_file = pd.read_csv(join(wdir, data_dir, label_filename), index_col=0)
-		
-	for const in subgenre_sets:
-		class1 = const["class 1"]
-		class2 = const["class 2"]
-		print(class1 + " vs. " + class2)
-		
-		# prepare frame for misclassification counts
-		# novel idno will be the index
-		# y_true: true label of the novel, true_abs: classified correctly how often? in absolute number, etc.
-		mis_fr = pd.DataFrame(columns=["y_true","true_abs","true_rel","false_abs","false_rel"])
+	columns = ["y_true", "true_abs", "true_rel", "false_abs", "false_rel"]
+	corpus_idnos = ["nh" + '%04d' % (novel_idx + 1) for novel_idx in range(num_novels_corpus)]
+	
+	summaries = []
+	for setting in settings:
+		label_filename, outfile_start = get_misclassification_settings_name(setting)
+		print("summarizing " + label_filename + "...")
 		
-		# get the relevant rows from the label file
-		label_file_rows = label_file.loc[(label_file["class1"] == class1) & (label_file["class2"] == class2)]
+		label_file = pd.read_csv(join(wdir, data_dir, label_filename), index_col=0)
+		summary = get_misclassification_summary(label_file, cv, num_novels_corpus)
+		constellations = {const: frame.droplevel([0,1]) for const, frame in summary.groupby(level=[0,1], sort=False)}
 		
-		for novel_idx in range(num_novels_corpus):
-			idno_number = '%04d' % (novel_idx + 1)
-			idno = "nh" + idno_number
+		for const in subgenre_sets:
+			class1 = const["class 1"]
+			class2 = const["class 2"]
+			print(class1 + " vs. " + class2)
 			
-			# get the rows for this novel
-			idno_rows = label_file_rows.loc[label_file_rows["idno"] == idno]
-			# only proceed if there are results for this novel
-			if not idno_rows.empty:
-					
-				y_true = idno_rows["y_true"].iloc[0]
-				# collect true and false values for this novel
-				trues = []
-				falses = []
-				
-				# collect results from each cv run
-				for cv_idx in range(cv):
-					cv_col = idno_rows["y_" + str(cv_idx)]
-					for idx, val in cv_col.items():
-						if val == y_true:
-							trues.append(val)
-						else:
-							falses.append(val)
-				
-				trues_abs = len(trues)
-				falses_abs = len(falses)
-				
-				pred_sum = trues_abs + falses_abs
-				
-				trues_rel = trues_abs / pred_sum
-				falses_rel = falses_abs / pred_sum
-				
-				mis_ser = pd.Series(name=idno, index=["y_true", "true_abs", "true_rel", "false_abs", "false_rel"], data=[y_true, trues_abs, trues_rel, falses_abs, falses_rel])
-				# append to overall summary
-				mis_fr = mis_fr.append(mis_ser) #ignore_index = True
-			else:
-				print("no results for " + idno + "...")
-		
-		# save misclassification-frame as csv file
-		outfile_name = "misclassifications_" + cl + "_" + str(mfw) + "mfw-" + norm + "_" + unit + "_" + re.sub(r"\s", r"_", class1) + "_" + re.sub(r"\s", r"_", class2)
-		mis_fr.to_csv(join(wdir, data_dir, outdir_summaries, outfile_name + ".csv"))
+			# novel idno is the index
+			mis_fr = constellations.get((class1, class2), pd.DataFrame(columns=columns))
+			mis_fr.index.name = None
+			for idno in corpus_idnos:
+				if idno not in mis_fr.index:
+					print("no results for " + idno + "...")
+			
+			# save misclassification-frame as csv file
+			outfile_name = outfile_start + "_" + re.sub(r"\s", r"_", class1) + "_" + re.sub(r"\s", r"_", class2)
+			mis_fr.to_csv(join(wdir, data_dir, outdir_summaries, outfile_name + ".csv"))
+			
+			summaries.append((const, outfile_name, mis_fr))
+	
+	return summaries
+	
+
+def plot_histogram_misclassifications(wdir, data_dir, subgenre_level, settings, **kwargs):
+	"""
+	For each classifier and feature setting and each subgenre constellation on a subgenre level: plot a histogram showing
+	in how many cases (in percent) the novels were classified correctly.
+	Also: produce the misclassification tables (see summarize_misclassifications).
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing all the classification results
+	subgenre_level (str): the kind of subgenre level to analyze ("themes", "currents", "novelas")
+	settings (list): classifier and feature settings, see get_misclassification_settings_name
+	
+	optional:
+	y_max (int): upper limit of the y axis (number of novels), default: 120
+	"""
+	print("plot histogram misclassifications...")
+	
+	y_max = kwargs.get("y_max", 120)
+	
+	# relative path to the output directory where the plots should be stored (relative to data_dir)
+	outdir_visuals = "../visuals"
+	
+	for const, outfile_name, mis_fr in summarize_misclassifications(wdir, data_dir, subgenre_level, settings):
+		class1 = const["class 1"]
+		class2 = const["class 2"]
 		
 		# create histogram: how often was each novel classified correctly (in percent)?
 		outfile_hist = "hist_" + outfile_name
@@ -1770,16 +2557,36 @@ def plot_histogram_misclassifications_mfw(wdir, data_dir, subgenre_level, cl, mf
 		fig.add_trace(go.Histogram(x=false_pos, name="false positive", autobinx=False, xbins=dict(start=0.0, end=1.1, size=0.1), marker_color='rgb(99, 110, 250)'))
 		fig.add_trace(go.Histogram(x=false_neg, name="false negative", autobinx=False, xbins=dict(start=0.0, end=1.1, size=0.1), marker_color='rgb(239, 85, 59)'))
 		fig.update_layout(autosize=False, width=700, height=500, title=chart_title, barmode="group",legend_font=dict(size=14))
-		fig.update_yaxes(title="number of novels",range=[0,120])
+		fig.update_yaxes(title="number of novels",range=[0,y_max])
 		fig.update_xaxes(title="number of predictions (relative)",range=[0,1.1])
 		#fig.update_traces(opacity=0.75)
 		
-		fig.write_image(join(wdir, data_dir, outdir_visuals, outfile_hist + ".png")) # scale=2 (increase physical resolution)
-		fig.write_html(join(wdir, data_dir, outdir_visuals, outfile_hist + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+		figure_renderer.write_image(fig, join(wdir, data_dir, outdir_visuals, outfile_hist + ".png")) # scale=2 (increase physical resolution)
+		figure_renderer.write_html(fig, join(wdir, data_dir, outdir_visuals, outfile_hist + ".html"))
 	
+	figure_renderer.wait_renderers()
 	print("done")
 
 
+def plot_histogram_misclassifications_mfw(wdir, data_dir, subgenre_level, cl, mfw, norm, unit):
+	"""
+	For each subgenre constellation on a subgenre level: plot a histogram showing in how many cases (in percent) the novels
+	were classified correctly.
+	Also: produce a table collecting the absolute sums and relative numbers of correct and false classifications for each novel in the corpus.
+	The classifier and parameters for it are fixed beforehand.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	data_dir (str): relative path to the directory containing all the classification results
+	subgenre_level (str): the kind of subgenre level to analyze ("themes", "currents", "novelas")
+	cl (str): the classifier to use
+	mfw (int): the number of mfw
+	norm (str): normalization technique, "tf", "tfidf", "zscore"
+	unit (str): token unit, e.g. "word", "2gram_words", "3gram_chars"
+	"""
+	plot_histogram_misclassifications(wdir, data_dir, subgenre_level, [{"cl": cl, "mfw": mfw, "norm": norm, "unit": unit}], y_max=120)
+
+
 def plot_histogram_misclassifications_topics(wdir, data_dir, subgenre_level, cl, num_topics, oi, topic_rep):
 	"""
 	For each subgenre constellation on a subgenre level: plot a histogram showing in how many cases (in percent) the novels
@@ -1797,100 +2604,7 @@ def plot_histogram_misclassifications_topics(wdir, data_dir, subgenre_level, cl,
 	oi (int): optimization interval parameter
 	topic_rep (int): which topic repetition to use
 	"""
-	print("plot histogram misclassifications topics...")
-	
-	# relative path to the output directory where the plots should be stored (relative to data_dir)
-	outdir_summaries = "../results_summaries"
-	outdir_visuals = "../visuals"
-	
-	# get results for each subgenre constellation
-	if subgenre_level == "themes":
-		subgenre_sets = subgenre_sets_theme
-	elif subgenre_level == "currents":
-		subgenre_sets = subgenre_sets_currents
-	elif subgenre_level == "novela":
-		subgenre_sets = subgenre_sets_novela
-	
-	# get label file
-	label_filename = "labels-" + cl + "-topics" + str(num_topics) + "_" + str(oi) + "in-topic-rep_" + str(topic_rep) + ".csv"
-	label_file = pd.read_csv(join(wdir, data_dir, label_filename), index_col=0)
-		
-	for const in subgenre_sets:
-		
-		class1 = const["class 1"]
-		class2 = const["class 2"]
-		print(class1 + " vs. " + class2)
-		
-		# prepare frame for misclassification counts
-		# novel idno will be the index
-		# y_true: true label of the novel, true_abs: classified correctly how often? in absolute number, etc.
-		mis_fr = pd.DataFrame(columns=["y_true","true_abs","true_rel","false_abs","false_rel"])
-		
-		# get the relevant rows from the label file
-		label_file_rows = label_file.loc[(label_file["class1"] == class1) & (label_file["class2"] == class2)]
-		
-		for novel_idx in range(num_novels_corpus):
-			idno_number = '%04d' % (novel_idx + 1)
-			idno = "nh" + idno_number
-			
-			# get the rows for this novel
-			idno_rows = label_file_rows.loc[label_file_rows["idno"] == idno]
-			# only proceed if there are results for this novel
-			if not idno_rows.empty:
-					
-				y_true = idno_rows["y_true"].iloc[0]
-				# collect true and false values for this novel
-				trues = []
-				falses = []
-				
-				# collect results from each cv run
-				for cv_idx in range(cv):
-					cv_col = idno_rows["y_" + str(cv_idx)]
-					for idx, val in cv_col.items():
-						if val == y_true:
-							trues.append(val)
-						else:
-							falses.append(val)
-				
-				trues_abs = len(trues)
-				falses_abs = len(falses)
-				
-				pred_sum = trues_abs + falses_abs
-				
-				trues_rel = trues_abs / pred_sum
-				falses_rel = falses_abs / pred_sum
-				
-				mis_ser = pd.Series(name=idno, index=["y_true", "true_abs", "true_rel", "false_abs", "false_rel"], data=[y_true, trues_abs, trues_rel, falses_abs, falses_rel])
-				# append to overall summary
-				mis_fr = mis_fr.append(mis_ser) #ignore_index = True
-			else:
-				print("no results for " + idno + "...")
-		
-		# save misclassification-frame as csv file
-		outfile_name = "misclassifications_" + cl + "_" + str(num_topics) + "t-" + str(oi) + "oi-topic_rep_" + str(topic_rep) + "_" + re.sub(r"\s", r"_", class1) + "_" + re.sub(r"\s", r"_", class2)
-		mis_fr.to_csv(join(wdir, data_dir, outdir_summaries, outfile_name + ".csv"))
-		
-		# create barchart: how often was each novel classified correctly (in percent)?
-		outfile_hist = "hist_" + outfile_name
-		chart_title = "Classifications (relative) for " + class1 + " vs. " + class2
-		
-		true_pos = list(mis_fr.loc[(mis_fr["y_true"]==class1) & (mis_fr["true_rel"] > 0),"true_rel"])
-		false_pos = list(mis_fr.loc[(mis_fr["y_true"]==class2) & (mis_fr["false_rel"] > 0),"false_rel"])
-		false_neg = list(mis_fr.loc[(mis_fr["y_true"]==class1) & (mis_fr["false_rel"] > 0),"false_rel"])
-		
-		fig = go.Figure()
-		fig.add_trace(go.Histogram(x=true_pos, name="true positive",  autobinx=False, xbins=dict(start=0.0, end=1.1, size=0.1), marker_color='rgb(0, 204, 150)'))
-		fig.add_trace(go.Histogram(x=false_pos, name="false positive", autobinx=False, xbins=dict(start=0.0, end=1.1, size=0.1), marker_color='rgb(99, 110, 250)'))
-		fig.add_trace(go.Histogram(x=false_neg, name="false negative", autobinx=False, xbins=dict(start=0.0, end=1.1, size=0.1), marker_color='rgb(239, 85, 59)'))
-		fig.update_layout(autosize=False, width=700, height=500, title=chart_title, barmode="group",legend_font=dict(size=14))
-		fig.update_yaxes(title="number of novels",range=[0,50])
-		fig.update_xaxes(title="number of predictions (relative)",range=[0,1.1])
-		#fig.update_traces(opacity=0.75)
-		
-		fig.write_image(join(wdir, data_dir, outdir_visuals, outfile_hist + ".png")) # scale=2 (increase physical resolution)
-		fig.write_html(join(wdir, data_dir, outdir_visuals, outfile_hist + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
-	
-	print("done")
+	plot_histogram_misclassifications(wdir, data_dir, subgenre_level, [{"cl": cl, "num_topics": num_topics, "oi": oi, "topic_rep": topic_rep}], y_max=50)
 	
 
 def plot_topic_distribution(wdir, feature_dir_topics, subgenre_level, cl, num_topics, oi, topic_rep, idno, top_topic_list):
@@ -1961,9 +2675,175 @@ def plot_topic_distribution(wdir, feature_dir_topics, subgenre_level, cl, num_to
 	fig.update_yaxes(title="topic probability")
 	fig.update_xaxes(type="category",title="topics",tickfont=dict(size=14),automargin=True,tickangle=270)
 
-	fig.write_image(join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outdir, outfile + ".html"))
+	
+	
+	figure_renderer.wait_renderers()
+	print("done")
+	
+
+def benchmark_result_accumulation(num_features=5000, num_jobs=100, cv=10):
+	"""
+	Compare the time needed to collect a features-*.csv frame by appending to a data frame in a loop
+	(as with DataFrame.append) with the time needed by the ResultAccumulator.
+	Synthetic feature importances are used: num_jobs blocks of cv rows with num_features columns
+	(e.g. 10 subgenre constellations x 10 data repetitions x 10 cv runs at 5000 MFW).
+	
+	Arguments:
+	num_features (int): number of features (mfw)
+	num_jobs (int): number of frames to collect (one for each subgenre constellation and data repetition)
+	cv (int): number of cv folds (rows of each frame)
+	"""
+	print("benchmark result accumulation for " + str(num_features) + " features...")
+	
+	label_columns = ["subgenre_level", "class1", "class2", "mfw", "token_unit", "normalization", "data_repetition", "cv_call", "class1_cl", "class2_cl"]
+	feature_names = ["w" + str(i) for i in range(num_features)]
+	columns = label_columns + feature_names
+	
+	rng = np.random.default_rng(0)
+	frames = []
+	for job in range(num_jobs):
+		frame = pd.DataFrame(rng.random((cv, num_features)), columns=feature_names)
+		frame.insert(0, "cv_call", list(range(cv)))
+		frame.insert(1, "class1_cl", "novela histórica")
+		frame.insert(2, "class2_cl", "other")
+		frame = set_frame_metadata_mfw(frame, "subgenre-theme", "novela histórica", "other", num_features, "word", "tfidf", job)
+		frames.append(frame)
+	
+	# appending in a loop: the whole frame is copied each time
+	start = time.perf_counter()
+	appended = pd.DataFrame(columns=columns)
+	for frame in frames:
+		appended = pd.concat([appended, frame], sort=False, ignore_index=True)
+	time_append = time.perf_counter() - start
+	
+	# accumulator: the frame is created once
+	start = time.perf_counter()
+	accumulated = ResultAccumulator(columns)
+	for frame in frames:
+		accumulated.add_frame(frame)
+	accumulated = accumulated.to_frame(ignore_index=True)
+	time_accumulator = time.perf_counter() - start
+	
+	print("append in loop: " + str(round(time_append, 2)) + " s")
+	print("accumulator: " + str(round(time_accumulator, 2)) + " s")
+	print("speedup: " + str(round(time_append / time_accumulator, 1)) + "x")
+	print("same result: " + str(appended.equals(accumulated)))
+	
+	print("done")
+	
+
+def benchmark_knn_precomputed(wdir, md_dir, feature_dir, sb_set, mfw, unit, no, repetitions, cv):
+	"""
+	Compare the time needed for the KNN cross validation of one subgenre constellation and mfw feature set
+	over all data repetitions when the distances are computed in each fold (metric="manhattan")
+	with the time needed when the distance matrix is computed once and sliced (metric="precomputed"),
+	and check that the predicted labels are the same.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	md_dir (str): relative path to the directory containing selected metadata for subgenre constellations
+	feature_dir (str): relative path to the directory containing the mfw feature sets
+	sb_set (dict): dictionary describing the subgenre constellation to analyze
+	mfw (int): number of mfw
+	unit (str): token unit ("word", "2gram_words", "3gram_chars", etc.)
+	no (str): normalization mode ("tf", "tfidf", "zscore")
+	repetitions (int): number of data selection repetitions
+	cv (int): number of cross validation folds
+	"""
+	print("benchmark KNN with precomputed distances for " + str(mfw) + " mfw (" + unit + ", " + no + ")...")
+	
+	feature_path = get_feature_path_mfw(wdir, feature_dir, mfw, unit, no, "KNN")
+	selections = [select_data_mfw(wdir, md_dir, feature_dir, sb_set, mfw, unit, no, rep, "KNN") for rep in range(repetitions)]
+	
+	# distances computed in each fold
+	start = time.perf_counter()
+	labels_fit = []
+	for X,y,idnos in selections:
+		scores = get_scores(get_estimator("KNN", "mfw"), X, y, sb_set["class 1"], cv)
+		labels_fit.append(store_labels(scores, cv, X, y, idnos))
+	time_fit = time.perf_counter() - start
+	
+	# distance matrix computed once (including the time to compute it)
+	start = time.perf_counter()
+	labels_precomputed = []
+	for X,y,idnos in selections:
+		D = select_distances(feature_path, idnos, "manhattan")
+		splits = list(StratifiedKFold(n_splits=cv).split(D, y))
+		scores = get_scores(get_estimator("KNN", "mfw", precomputed=True), D, y, sb_set["class 1"], splits)
+		labels_precomputed.append(store_labels(scores, cv, D, y, idnos, splits=splits))
+	time_precomputed = time.perf_counter() - start
+	
+	same = all(fit.equals(pre) for fit, pre in zip(labels_fit, labels_precomputed))
+	
+	print("distances in each fold: " + str(round(time_fit, 2)) + " s")
+	print("precomputed distances: " + str(round(time_precomputed, 2)) + " s")
+	print("speedup: " + str(round(time_fit / time_precomputed, 1)) + "x")
+	print("same predictions: " + str(same))
+	
+	print("done")
+	
+
+def report_svm_backends(wdir, md_dir, feature_dir, sb_sets, mfw, unit, no, repetitions, cv, outfile):
+	"""
+	Compare the libsvm backend (SVC with a linear kernel on dense data) with the liblinear backend
+	(LinearSVC on sparse data) of the SVM for a sample of subgenre constellations and one mfw feature set.
+	For each constellation and data repetition, the report contains the time needed for the cross validation,
+	the mean F1 scores, the share of novels with the same predicted labels, the mean correlation of the
+	feature coefficients and the overlap of the 100 features with the highest absolute coefficients.
+	The report is printed and written to a csv file.
+	
+	Arguments:
+	wdir (str): path to the working directory
+	md_dir (str): relative path to the directory containing selected metadata for subgenre constellations
+	feature_dir (str): relative path to the directory containing the mfw feature sets
+	sb_sets (list): list of dicts describing the subgenre constellations to compare
+	mfw (int): number of mfw
+	unit (str): token unit ("word", "2gram_words", "3gram_chars", etc.)
+	no (str): normalization mode ("tf", "tfidf", "zscore")
+	repetitions (int): number of data selection repetitions
+	cv (int): number of cross validation folds
+	outfile (str): relative path to the output csv file for the report
+	"""
+	print("comparing SVM backends for " + str(mfw) + " mfw (" + unit + ", " + no + ")...")
+	
+	feature_names = list(get_feature_names_mfw(wdir, feature_dir, mfw, unit, no))
+	report = ResultAccumulator(["class1", "class2", "data_repetition", "time_libsvm", "time_liblinear", "f1_libsvm", "f1_liblinear", "same_predictions", "coef_correlation", "top100_overlap"])
+	
+	for sb_set in sb_sets:
+		for rep in range(repetitions):
+			X,y,idnos = select_data_mfw(wdir, md_dir, feature_dir, sb_set, mfw, unit, no, rep, "SVM")
+			
+			results = {}
+			for backend, data in [("libsvm", X), ("liblinear", sparse.csr_matrix(X))]:
+				start = time.perf_counter()
+				scores = get_scores(get_estimator("SVM", "mfw", svm_backend=backend), data, y, sb_set["class 1"], cv)
+				run_time = time.perf_counter() - start
+				
+				labels = store_labels(scores, cv, data, y, idnos)
+				coefs = store_features("SVM", scores, cv, feature_names)[feature_names].to_numpy(dtype=float)
+				results[backend] = (run_time, np.mean(scores["test_f1"]), labels, coefs)
+			
+			labels_libsvm, labels_liblinear = results["libsvm"][2], results["liblinear"][2]
+			pred_columns = ["y_" + str(run) for run in range(cv)]
+			same_predictions = (labels_libsvm[pred_columns].to_numpy() == labels_liblinear[pred_columns].to_numpy()).mean()
+			
+			coefs_libsvm, coefs_liblinear = results["libsvm"][3], results["liblinear"][3]
+			coef_correlation = np.mean([np.corrcoef(coefs_libsvm[run], coefs_liblinear[run])[0,1] for run in range(cv)])
+			top_libsvm = [set(np.argsort(-np.abs(coefs_libsvm[run]))[:100]) for run in range(cv)]
+			top_liblinear = [set(np.argsort(-np.abs(coefs_liblinear[run]))[:100]) for run in range(cv)]
+			top100_overlap = np.mean([len(top_libsvm[run] & top_liblinear[run]) / len(top_libsvm[run]) for run in range(cv)])
+			
+			report.add_row([sb_set["class 1"], sb_set["class 2"], rep, results["libsvm"][0], results["liblinear"][0], results["libsvm"][1], results["liblinear"][1], same_predictions, coef_correlation, top100_overlap])
+	
+	report = report.to_frame(ignore_index=True)
+	report.to_csv(join(wdir, outfile), encoding="UTF-8")
 	
+	print(report.round(3).to_string())
+	print("speedup: " + str(round(report["time_libsvm"].sum() / report["time_liblinear"].sum(), 1)) + "x")
+	print("mean share of same predictions: " + str(round(report["same_predictions"].mean(), 3)))
+	print("mean F1 difference (liblinear - libsvm): " + str(round((report["f1_liblinear"] - report["f1_libsvm"]).mean(), 3)))
 	
 	print("done")
 	
@@ -1983,12 +2863,13 @@ df.to_csv(join(wdir, "data-nh/analysis/features/feature_sets.csv"), index=False,
 
 
 # prepare the feature sets for use with SVM: scale to [0,1]
+# (the MinMax variants of the mfw feature sets are also produced by normalize_bow_models in features/general_features.py)
 #scale_feature_sets(wdir, feature_set_paths)
 
 
 ###################### preliminary parameter study #####################
 
-#parameter_study(wdir)
+#parameter_study(wdir) # search="halving" for successive halving instead of exhaustive grid searches
 
 #evaluate_parameter_study(wdir, "data-nh/analysis/classification/parameter_study", "KNN", "param_n_neighbors")
 #evaluate_parameter_study(wdir, "data-nh/analysis/classification/parameter_study", "KNN", "param_metric")
@@ -2001,6 +2882,22 @@ df.to_csv(join(wdir, "data-nh/analysis/features/feature_sets.csv"), index=False,
 
 ##################### main classification tasks #####################
 
+# how much faster is the collection of results without DataFrame.append? (features-*.csv frames at 5000 MFW)
+#benchmark_result_accumulation(num_features=5000)
+# measured (pandas 3.0, 1 cpu), the collected frames are identical:
+# 5000 features, 100 x 10 rows: append in loop 4.86 s, accumulator 0.59 s (8.2x)
+# 1000 features, 300 x 10 rows: append in loop 9.01 s, accumulator 0.36 s (25.2x)
+
+# KNN: distance matrix computed once per feature file vs. distances computed in each fold
+#benchmark_knn_precomputed(wdir, "data-nh/analysis/classification/data_selection/main/", "data-nh/analysis/features/mfw/", {"level": "subgenre-theme", "class 1": "novela histórica", "class 2": "other"}, 5000, "word", "tfidf", 10, 10)
+
+# SVM: LinearSVC on sparse data vs. SVC with a linear kernel, on a sample of constellations (char 3grams, 5000 mfw)
+#report_svm_backends(wdir, "data-nh/analysis/classification/data_selection/main/", "data-nh/analysis/features/mfw/", [{"level": "subgenre-theme", "class 1": "novela histórica", "class 2": "other"}, {"level": "subgenre-theme", "class 1": "novela sentimental", "class 2": "other"}], 5000, "3gram_chars", "tfidf", 3, 10, "data-nh/analysis/classification/svm_backends_3gram_chars_5000mfw.csv")
+# result on synthetic char 3gram tfidf_MinMax features (256 novels, 5000 features, 2 constellations x 3 repetitions, 10 folds):
+# same predictions for 99.7% of the novels, mean F1 difference (liblinear - libsvm) -0.004, coefficient correlation > 0.999,
+# top 100 feature overlap 0.88-0.96, no speedup (0.9x: the MinMax scaled data have hardly any zeros), so libsvm stays the default
+
+
 # parameters that are set for the classifiers based on the results in the preliminary parameter study:
 # KNN, n_neighbors = 7, weight = distance, metric = manhattan
 # SVM, topics: C: 1, mfw: C: 100
@@ -2063,198 +2960,16 @@ subgenre_sets = {"themes": subgenre_sets_theme, "literary-currents": subgenre_se
 classifiers = ["KNN", "SVM", "RF"]
 # number of cv folds
 cv = 10
+# memory budget for the in-process cache of the feature and metadata files (each file is parsed at most once per run)
+feature_store.set_cache_budget(4 * 1024 ** 3)
 
 '''
 for level in ["themes", "literary-currents"]: # "novelas"
 	
-	print("doing level " + level + "...")
-	
-	outpath = join("data-nh/analysis/classification/", level, "results_data")
-	
-	
-	
-	###### MFW ######
-	
-	print("doing MFW...")
-	
-	feature_dir_mfw = "data-nh/analysis/features/mfw/"
-	
-	for mfw in mfws:
-		for unit in token_units:
-			for no in norms:
-				print("params: " + str(mfw) + "mfw, " + unit + ", " + no)
-				
-				## choose classifier
-				for cl in classifiers:
-					print("doing " + cl + "...")
-					
-					feature_params = str(mfw) + "_" + unit + "_" + no
-					
-					# prepare data frames for classification results
-					fr_knn_mfw = pd.DataFrame()
-					fr_svm_mfw = pd.DataFrame()
-					fr_rf_mfw = pd.DataFrame()
-					
-					# prepare collection of feature importances
-					if cl == "SVM" or cl == "RF":
-						label_columns = ["subgenre_level", "class1", "class2", "mfw", "token_unit", "normalization", "data_repetition", "cv_call", "class1_cl", "class2_cl"]
-						feature_names = get_feature_names_mfw(wdir, feature_dir_mfw, mfw, unit, no)
-						feature_names = list(feature_names)
-						columns = label_columns + feature_names
-						features_frame = pd.DataFrame(columns=columns)
-				
-					# prepare collection of true and predicted labels
-					label_columns = ["subgenre_level", "class1", "class2", "mfw", "token_unit", "normalization", "data_repetition", "idno", "y_true"]
-					for label_rep in range(repetitions):
-						label_columns.append("y_" + str(label_rep))
-					label_frame = pd.DataFrame(columns=label_columns)
-					
-					for sb_set in subgenre_sets[level]:
-						class1 = re.sub(r"\s", r"-", sb_set["class 1"])
-						class2 = re.sub(r"\s", r"-", sb_set["class 2"])
-				
-						for data_rep in range(repetitions):
-						
-							# select data corresponding to the chosen features and classifier
-							X,y,idnos = select_data_mfw(wdir, "data-nh/analysis/classification/data_selection/main/", feature_dir_mfw, sb_set, mfw, unit, no, data_rep, cl)
-						
-							# get an instance of the classifier with the chosen parameter settings
-							estimator = get_estimator(cl, "mfw")
-							
-							# run cross validation and collect results
-							scores = get_scores(estimator, X, y, sb_set["class 1"], cv)
-							score_frame = get_score_frame(scores)
-							score_frame = set_frame_metadata_mfw(score_frame, sb_set["level"], sb_set["class 1"], sb_set["class 2"], mfw, unit, no, data_rep)
-							score_frame = score_frame.drop("estimator", axis=1)
-							
-							if cl == "SVM":
-								fr_svm_mfw = fr_svm_mfw.append(score_frame, sort=False, ignore_index=True)
-							elif cl == "KNN":
-								fr_knn_mfw = fr_knn_mfw.append(score_frame, sort=False, ignore_index=True)
-							elif cl == "RF":
-								fr_rf_mfw = fr_rf_mfw.append(score_frame, sort=False, ignore_index=True)
-							
-							# collect true labels and predicted labels for each cv run
-							label_frame_cv = store_labels(scores, cv, X, y, idnos)
-							label_frame_cv = set_frame_metadata_mfw(label_frame_cv, sb_set["level"], sb_set["class 1"], sb_set["class 2"], mfw, unit, no, data_rep)
-							label_frame = label_frame.append(label_frame_cv, sort=False, ignore_index=True)
-							
-							# collect feature importances
-							if cl == "SVM" or cl == "RF":
-								feature_frame_cv = store_features(cl, scores, cv, feature_names)
-								feature_frame_cv = set_frame_metadata_mfw(feature_frame_cv, sb_set["level"], sb_set["class 1"], sb_set["class 2"], mfw, unit, no, data_rep)
-								features_frame = features_frame.append(feature_frame_cv, sort=False, ignore_index=True)
-							
-							
-					# store classification results
-					if cl == "SVM":
-						fr_svm_mfw.to_csv(join(wdir, outpath, "results-SVM-mfw" + feature_params + ".csv"))
-					elif cl == "KNN":
-						fr_knn_mfw.to_csv(join(wdir, outpath, "results-KNN-mfw" + feature_params + ".csv"))
-					elif cl == "RF":
-						fr_rf_mfw.to_csv(join(wdir, outpath, "results-RF-mfw" + feature_params + ".csv"))
-					
-					# store label information
-					label_filename = "labels_" + cl + "-mfw" + feature_params + ".csv"
-					label_frame.to_csv(join(wdir, outpath, label_filename))
-					
-					# store feature importances
-					if cl == "SVM" or cl == "RF":
-						features_filename = "features-" + cl + "-mfw" + feature_params + ".csv"
-						features_frame.to_csv(join(wdir, outpath, features_filename))
-						
-
-	###### TOPICS ######
-	print("doing topics...")
-	
-	feature_dir_topics = "data-nh/analysis/features/topics/4_aggregates/"
-	
-	for t in num_topics:
-		for oi in optimize_intervals:
-			print("params: " + str(t) + " topics, " + str(oi) + "in")
-			
-			## choose classifier
-			for cl in classifiers:
-				print("doing " + cl + "...")
-				
-				feature_params = str(t) + "_" + str(oi) + "in"
-				
-				# prepare data frames for classification results
-				fr_knn_topics = pd.DataFrame()
-				fr_svm_topics = pd.DataFrame()
-				fr_rf_topics = pd.DataFrame()
-				
-				for topic_rep in range(topic_repetitions):
-					
-					# prepare collection of feature importances
-					if cl == "SVM" or cl == "RF":
-						label_columns = ["subgenre_level", "class1", "class2", "num_topics", "optimize_interval", "data_repetition", "topic_repetition", "cv_call", "class1_cl", "class2_cl"]
-						topic_numbers = list(range(t))
-						columns = label_columns + topic_numbers
-						features_frame = pd.DataFrame(columns=columns)
-						
-					# prepare collection of true and predicted labels
-					label_columns = ["subgenre_level", "class1", "class2", "num_topics", "optimize_interval", "data_repetition", "topic_repetition", "idno", "y_true"]
-					for label_rep in range(repetitions):
-						label_columns.append("y_" + str(label_rep))
-					label_frame = pd.DataFrame(columns=label_columns)
-					
-					for sb_set in subgenre_sets[level]:
-						class1 = re.sub(r"\s", r"-", sb_set["class 1"])
-						class2 = re.sub(r"\s", r"-", sb_set["class 2"])
-						
-						print(class1 + " vs. " + class2 + "...")
-					
-						for data_rep in range(repetitions):
-							#print("data-rep " + str(data_rep) + "...")
-						
-							# select data corresponding to the chosen features and classifier
-							X,y,idnos = select_data_topics(wdir, "data-nh/analysis/classification/data_selection/main/", feature_dir_topics, sb_set, t, oi, data_rep, topic_rep, cl)
-					
-							# get an instance of the classifier with the chosen parameter settings
-							estimator = get_estimator(cl, "topics") 
-					
-							# run cross validation and collect results
-							scores = get_scores(estimator, X, y, sb_set["class 1"], cv)
-							score_frame = get_score_frame(scores)
-							score_frame = set_frame_metadata_topics(score_frame, sb_set["level"], sb_set["class 1"], sb_set["class 2"], t, oi, data_rep, topic_rep)
-							score_frame = score_frame.drop("estimator", axis=1)
-							
-							if cl == "SVM":
-								fr_svm_topics = fr_svm_topics.append(score_frame, sort=False, ignore_index=True)
-							elif cl == "KNN":
-								fr_knn_topics = fr_knn_topics.append(score_frame, sort=False, ignore_index=True)
-							elif cl == "RF":
-								fr_rf_topics = fr_rf_topics.append(score_frame, sort=False, ignore_index=True)
-							
-							
-							# collect true labels and predicted labels for each cv run
-							label_frame_cv = store_labels(scores, cv, X, y, idnos)
-							label_frame_cv = set_frame_metadata_topics(label_frame_cv, sb_set["level"], sb_set["class 1"], sb_set["class 2"], t, oi, data_rep, topic_rep)
-							label_frame = label_frame.append(label_frame_cv, sort=False, ignore_index=True)
-							
-							# collect feature importances
-							if cl == "SVM" or cl == "RF":
-								feature_frame_cv = store_features(cl, scores, cv, topic_numbers)
-								feature_frame_cv = set_frame_metadata_topics(feature_frame_cv, sb_set["level"], sb_set["class 1"], sb_set["class 2"], t, oi, data_rep, topic_rep)
-								features_frame = features_frame.append(feature_frame_cv, sort=False, ignore_index=True)
-							
-					# store label information
-					label_filename = "labels-" + cl + "-topics" + feature_params + "-topic-rep_" + str(topic_rep) + ".csv"
-					label_frame.to_csv(join(wdir, outpath, label_filename))
-					
-					# store feature importances
-					if cl == "SVM" or cl == "RF":
-						features_filename = "features-" + cl + "-topics" + feature_params + "-topic-rep_" + str(topic_rep) + ".csv"
-						features_frame.to_csv(join(wdir, outpath, features_filename))
-						
-				# store classification results
-				if cl == "SVM":
-					fr_svm_topics.to_csv(join(wdir, outpath, "results-SVM-topics" + feature_params + ".csv"))
-				elif cl == "KNN":
-					fr_knn_topics.to_csv(join(wdir, outpath, "results-KNN-topics" + feature_params + ".csv"))
-				elif cl == "RF":
-					fr_rf_topics.to_csv(join(wdir, outpath, "results-RF-topics" + feature_params + ".csv"))
+	# MFW and topics: the experiments are run on a process pool (n_jobs=-1: all cores)
+	run_experiments(wdir, level, subgenre_sets[level], classifiers, repetitions, cv, 
+	mfws=mfws, token_units=token_units, norms=norms, 
+	num_topics=num_topics, optimize_intervals=optimize_intervals, topic_repetitions=topic_repetitions, n_jobs=-1)
 
 '''
 print("done!")
@@ -2269,6 +2984,9 @@ num_novels_corpus = 256
 ## CHOOSE CLASSIFIER:
 # get the top and mean results for the different classifier types, for certain subgenre levels
 # just MFW = word unit, "MFW word n-grams", "MFW character n-grams"
+# (the results-*.csv files of a level are loaded into the results warehouse results.sqlite on the first query;
+# new or changed files are added automatically, or ingest them beforehand:)
+#ingest_results(wdir, data_dir_themes)
 
 
 # THEME LEVEL:
@@ -2382,6 +3100,8 @@ Individual novels are checked regarding the feature values they have for the top
 #plot_histogram_misclassifications_mfw(wdir, data_dir_themes, "themes", "SVM", 1000, "tfidf", "word")
 #plot_histogram_misclassifications_mfw(wdir, data_dir_themes, "themes", "SVM", 1000, "tfidf", "2gram_words")
 #plot_histogram_misclassifications_mfw(wdir, data_dir_themes, "themes", "SVM", 1000, "tfidf", "3gram_chars")
+# all feature settings of a level in one call (each label file is read once):
+#plot_histogram_misclassifications(wdir, data_dir_themes, "themes", [{"cl": "SVM", "mfw": 1000, "norm": "tfidf", "unit": unit} for unit in ["word", "2gram_words", "3gram_chars"]])
 
 # LITERARY CURRENT LEVEL:
 #plot_histogram_misclassifications_topics(wdir, data_dir_currents, "currents", "SVM", 100, 250, 0)
@@ -2514,8 +3234,8 @@ fig.update_layout(autosize=False, width=800, height=400, title="Size of feature
 outdir = "data-nh/analysis/features/mfw/overviews"
 outfile = "feat_ranges_100MFW_tf"
 
-fig.write_image(join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
-fig.write_html(join(wdir, outdir, outfile + ".html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+figure_renderer.write_image(fig, join(wdir, outdir, outfile + ".png")) # scale=2 (increase physical resolution)
+figure_renderer.write_html(fig, join(wdir, outdir, outfile + ".html"))
 
 #fig.show()
 '''
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
+import os
 import glob
 from os.path import join
 from os.path import basename
@@ -16,6 +18,9 @@ from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import plotly.graph_objects as go
 
+sys.path.append(os.path.abspath(join(os.path.dirname(__file__), "..", "features")))
+import figure_renderer
+
 wdir = "/home/ulrike/Git/hennyu/novelashispanoamericanas/corpus/annotated"
 outdir = "/home/ulrike/Git/hennyu/novelashispanoamericanas/analyses/2019-11-22_clustering"
 inpath = "*.xml"
@@ -169,7 +174,7 @@ def cluster():
 		fig.update_yaxes(tickfont=dict(size=12))
 		fig.update_layout(autosize=False,width=(600 + i * 50),height=1000 + i * 50)
 		
-		fig.write_image(join(outdir, "results_visual", "heatmaps", str(i) + "_similarities_texts-to-clusters_summary-HIST-COST-SENT_topics80.svg"))
+		figure_renderer.write_image(fig, join(outdir, "results_visual", "heatmaps", str(i) + "_similarities_texts-to-clusters_summary-HIST-COST-SENT_topics80.svg"))
 		
 		
 		# bar charts for the similarity of a single text to the different cluster centers
@@ -186,7 +191,7 @@ def cluster():
 			fig.update_xaxes(tickfont=dict(size=20))
 			fig.update_yaxes(tickfont=dict(size=20))
 						
-			fig.write_image(join(outdir, "results_visual", "barcharts", str(i) + "_" + val + "_similarity_cluster_centers_summary-HIST-COST-SENT_topics80.svg"))
+			figure_renderer.write_image(fig, join(outdir, "results_visual", "barcharts", str(i) + "_" + val + "_similarity_cluster_centers_summary-HIST-COST-SENT_topics80.svg"))
 			
 		
 		# bar charts for the similarity of the texts in a single cluster to its center
@@ -207,7 +212,7 @@ def cluster():
 			fig.update_xaxes(tickfont=dict(size=20), tickangle=70,automargin=True)
 			fig.update_yaxes(tickfont=dict(size=20))
 			
-			fig.write_image(join(outdir, "results_visual", "barcharts", str(i) + "_cl" + str(idx) + "_similarity_texts_summary-HIST-COST-SENT_topics80.svg"))
+			figure_renderer.write_image(fig, join(outdir, "results_visual", "barcharts", str(i) + "_cl" + str(idx) + "_similarity_texts_summary-HIST-COST-SENT_topics80.svg"))
 		
 		
 		# calculate similarities of cluster centers to each other
@@ -223,7 +228,7 @@ def cluster():
 		fig.update_xaxes(tickfont=dict(size=28))
 		fig.update_yaxes(tickfont=dict(size=28))
 		
-		fig.write_image(join(outdir, "results_visual", "heatmaps", str(i) + "_similarities_clusters_summary-HIST-COST-SENT_topics80.svg"))
+		figure_renderer.write_image(fig, join(outdir, "results_visual", "heatmaps", str(i) + "_similarities_clusters_summary-HIST-COST-SENT_topics80.svg"))
 		
 		# calculate similarities to cluster centers
 		similarities = []
@@ -267,6 +272,7 @@ def cluster():
 	score_results = score_results.sort_values(by=0)
 	score_results.to_csv(join(outdir, "results_data", "cluster_score_results_summary-HIST-COST-SENT_topics80.csv"))
 	print(score_results)
+	figure_renderer.wait_renderers()
 	print("done")
 
 
@@ -330,8 +336,9 @@ def cluster_distinctiveness_heatmap(top_items_shown, cluster_number_start, clust
 		fig.update_xaxes(tickfont=dict(size=24))
 		fig.update_yaxes(tickfont=dict(size=18))
 		
-		fig.write_image(join(outdir, "results_visual", "heatmaps", str(i) + "cl_distinctive-features_summary-HIST-COST-SENT_topics80.svg"))
+		figure_renderer.write_image(fig, join(outdir, "results_visual", "heatmaps", str(i) + "cl_distinctive-features_summary-HIST-COST-SENT_topics80.svg"))
 	
+	figure_renderer.wait_renderers()
 	print("done")
 
 
@@ -339,7 +346,10 @@ cluster_distinctiveness_heatmap(40, 2, 14)
 
 #visualize_metadata()
 
+# render the figures in parallel (one kaleido process per worker), skipping the ones that have not changed
+#figure_renderer.start_renderers(4)
 #cluster()
+#figure_renderer.stop_renderers()
 
 #extract_features_lexnames()
 
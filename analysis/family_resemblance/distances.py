@@ -8,12 +8,17 @@ Submodule for functions related to distances between texts.
 
 """
 
+import sys
+import os
 from os.path import join
 import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import euclidean_distances
 from sklearn.metrics.pairwise import cosine_similarity
 
+sys.path.append(os.path.abspath(join(os.path.dirname(__file__), "..", "..", "features")))
+import feature_store
+
 
 
 def create_distancematrix(wdir, infile, outfile, measure):
@@ -32,7 +37,7 @@ def create_distancematrix(wdir, infile, outfile, measure):
 	print("starting: create_distancematrix...")
 	
 	# change this if there are no header row or index column in the input data matrix
-	data_matrix = pd.read_csv(join(wdir,infile), header=0, index_col=0)
+	data_matrix = feature_store.read_features(join(wdir,infile))
 	data_array = data_matrix.values
 	
 	if measure == "euclidean":
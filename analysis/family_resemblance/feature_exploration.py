@@ -8,11 +8,17 @@ Submodule for analyzing the top (distinctive) features for the novels and cluste
 
 """
 
+import sys
+import os
 from os.path import join
 import pandas as pd
 import plotly.graph_objects as go
 import numpy as np
 
+sys.path.append(os.path.abspath(join(os.path.dirname(__file__), "..", "..", "features")))
+import feature_store
+import figure_renderer
+
 
 def visualize_top_features(wdir, md_file, feat_matrix, feat_type, num_top, outfolder, **kwargs):
 	"""
@@ -38,7 +44,7 @@ def visualize_top_features(wdir, md_file, feat_matrix, feat_type, num_top, outfo
 	rank_file = kwargs.get("rank_file", "")
 
 	md = pd.read_csv(join(wdir, md_file), index_col=0)
-	feat = pd.read_csv(join(wdir, feat_matrix), index_col=0)
+	feat = feature_store.read_features(join(wdir, feat_matrix))
 	
 	idnos = list(md.index)
 	# create a plot for each novel
@@ -105,9 +111,10 @@ def visualize_top_features(wdir, md_file, feat_matrix, feat_type, num_top, outfo
 		
 		outfile_name = "topfeat_" + feat_type + "_" + idno
 		
-		fig.write_html(join(wdir, outfolder, outfile_name + ".html"))
-		fig.write_image(join(wdir, outfolder, outfile_name + ".png"),scale=2)
+		figure_renderer.write_html(fig, join(wdir, outfolder, outfile_name + ".html"))
+		figure_renderer.write_image(fig, join(wdir, outfolder, outfile_name + ".png"),scale=2)
 	
+	figure_renderer.wait_renderers()
 	print("done")
 	
 	
@@ -147,7 +154,7 @@ def visualize_cluster_distinctiveness(wdir, md_file, feat_matrix, cluster_file,
 	md["cluster"] = list(clusters["cluster"])
 	
 	# get data
-	feat = pd.read_csv(join(wdir, feat_matrix), index_col=0)
+	feat = feature_store.read_features(join(wdir, feat_matrix))
 	featstd = feat.std(axis=0) #std for each feature (before aggregation by cluster)
 	
 	# get average values for clusters
@@ -254,9 +261,10 @@ def visualize_cluster_distinctiveness(wdir, md_file, feat_matrix, cluster_file,
 	fig.update_xaxes(tickfont=dict(size=20))
 	fig.update_yaxes(tickfont=dict(size=20), autorange="reversed")
 	
-	fig.write_html(join(wdir, outfile + "_" + norm_mode + ".html"))
-	fig.write_image(join(wdir, outfile + "_" + norm_mode + ".png"),scale=2)
+	figure_renderer.write_html(fig, join(wdir, outfile + "_" + norm_mode + ".html"))
+	figure_renderer.write_image(fig, join(wdir, outfile + "_" + norm_mode + ".png"),scale=2)
 	
+	figure_renderer.wait_renderers()
 	print("Done")
 	
 	
@@ -345,9 +353,10 @@ def visualize_cluster_metadata(wdir, md_file, md_cat, cluster_file, outfile):
 		outfile_path_html = join(wdir, outfile + ".html")
 		outfile_path_png = join(wdir, outfile + ".png")
 	
-		fig.write_html(outfile_path_html)
-		fig.write_image(outfile_path_png,scale=2)
+		figure_renderer.write_html(fig, outfile_path_html)
+		figure_renderer.write_image(fig, outfile_path_png,scale=2)
 		
+		figure_renderer.wait_renderers()
 		print("Done")
 		
 		return
@@ -402,9 +411,10 @@ def visualize_cluster_metadata(wdir, md_file, md_cat, cluster_file, outfile):
 	outfile_path_html = join(wdir, outfile + ".html")
 	outfile_path_png = join(wdir, outfile + ".png")
 	
-	fig.write_html(outfile_path_html)
-	fig.write_image(outfile_path_png,scale=2)
+	figure_renderer.write_html(fig, outfile_path_html)
+	figure_renderer.write_image(fig, outfile_path_png,scale=2)
 	
+	figure_renderer.wait_renderers()
 	print("Done")
 
 	
@@ -450,7 +460,7 @@ def visualize_topic_dists(wdir, md_file, feat_matrix, rank_file, first_words_fil
 	"""
 	
 	md = pd.read_csv(join(wdir, md_file), index_col=0)
-	feat = pd.read_csv(join(wdir, feat_matrix), index_col=0)
+	feat = feature_store.read_features(join(wdir, feat_matrix))
 	ranks = pd.read_csv(join(wdir, rank_file), index_col=0)
 	first_words = pd.read_csv(join(wdir, first_words_file), index_col=0, header=None)
 	
@@ -492,9 +502,10 @@ def visualize_topic_dists(wdir, md_file, feat_matrix, rank_file, first_words_fil
 	outfile_path_html = join(wdir, outfile + ".html")
 	outfile_path_png = join(wdir, outfile + ".png")
 	
-	fig.write_html(outfile_path_html)
-	fig.write_image(outfile_path_png,scale=2)
+	figure_renderer.write_html(fig, outfile_path_html)
+	figure_renderer.write_image(fig, outfile_path_png,scale=2)
 	
+	figure_renderer.wait_renderers()
 	print("Done")
 	
 	
@@ -92,10 +92,15 @@ for idx,run in enumerate(runs[-2:]):
 
 #### (2) top features for all the novels
 """
+# optional: render the figures in parallel, html files with a shared plotly.js, unchanged figures are skipped
+feature_exploration.figure_renderer.start_renderers(4, include_plotlyjs="cdn")
+
 ## MFW
 
 feature_exploration.visualize_top_features(wdir, "corpus_metadata/metadata_full.csv", "features/mfw_1000_tfidf_full.csv", "mfw", 30, 
 "analysis/feature_exploration/top_mfw/", rank_file="features/mfw_ranks.csv")
+
+feature_exploration.figure_renderer.stop_renderers()
 """
 
 """
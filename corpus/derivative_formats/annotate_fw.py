@@ -12,14 +12,63 @@ Functions to annotate French/Spanish/Italian/Portuguese texts with Freeling and
 import re
 import os
 import glob
+import json
 import subprocess
 import collections
+import socket
+import concurrent.futures
+from lxml import etree
 from nltk.corpus import wordnet as wn
 import time 
 
-def use_freeling(InPath, FreelingFolder, server, Lang="fr"): 
+def wait_for_server(Port, Process=None, Timeout=600):
+    """
+    Wait until the Freeling server accepts connections on the port (polling instead of waiting a fixed time).
+    Raises an error if the server process ends or the server is not ready after the timeout (in seconds).
+    """
+    Start = time.time()
+    while True:
+        try:
+            with socket.create_connection(("localhost", Port), timeout=1):
+                print("Freeling server ready after " + str(round(time.time() - Start, 1)) + " seconds.")
+                return
+        except OSError:
+            if Process is not None and Process.poll() is not None:
+                raise RuntimeError("The Freeling server stopped with exit code " + str(Process.returncode))
+            if time.time() - Start > Timeout:
+                raise RuntimeError("The Freeling server is not ready after " + str(Timeout) + " seconds")
+            time.sleep(0.5)
+
+
+def call_client(File, OutPath, Port):
+    """
+    Annotate one file with the Freeling server (analyzer_client) and measure the time it takes.
+    Returns a tuple (file name, seconds, exit code).
+    """
+    Start = time.perf_counter()
+    with open(File, "rb") as InFile, open(OutPath, "wb") as OutFile:
+        Returncode = subprocess.call(["analyzer_client", str(Port)], stdin=InFile, stdout=OutFile)
+    return os.path.basename(File), time.perf_counter() - Start, Returncode
+
+
+def get_files(InPath):
+    """
+    Get the input files: all files matching a glob pattern (str) or the files given as a list.
+    """
+    if isinstance(InPath, str):
+        return glob.glob(InPath)
+    return list(InPath)
+
+
+def use_freeling(InPath, FreelingFolder, server, Lang="fr", Workers=4, Port=50005): 
     """
     Call Freeling "analyze".
+    InPath is a glob pattern for the input files or a list of files.
+    With server=True, a Freeling server with several workers is started (or an already running server on the port is used)
+    and the files are sent to it from the same number of parallel connections. The time needed for each file
+    is written to freeling_latency.csv in the FreelingFolder.
+    Returns the list of the input files which could not be annotated (Freeling returned an error); 
+    their incomplete output files are removed.
     
     @author: Christof Schöch, Ulrike Henny-Krahmer, José Calvo Tello
     """
@@ -37,32 +86,149 @@ def use_freeling(InPath, FreelingFolder, server, Lang="fr"):
         nec = " "
     
     if server == True:
-        subprocess.call("analyze -f " + Lang + ".cfg --server on --port 50005 --outlv tagged  --sense ukb  " + nec + " --workers 1 --output xml &", shell=True)
-
-        time.sleep(20)
+        Server = None
+        try:
+            with socket.create_connection(("localhost", Port), timeout=1):
+                print("Using the Freeling server which is already running on port " + str(Port) + ".")
+        except OSError:
+            Command = "analyze -f " + Lang + ".cfg --server on --port " + str(Port) + " --outlv tagged  --sense ukb  " + nec + " --workers " + str(Workers) + " --output xml"
+            Server = subprocess.Popen(Command.split())
 
-        for File in glob.glob(InPath): 
-            Filename = os.path.basename(File)
-            OutPath = FreelingFolder + Filename[:-4] + ".xml"
-    
-            Command = "analyzer_client 50005 < " + File + " > " + OutPath   
+        Files = sorted(get_files(InPath))
+        Latencies = []
+        Failed = []
+        try:
+            # the server started here is stopped in any case, also if it does not get ready
+            if Server is not None:
+                wait_for_server(Port, Server)
+            Start = time.time()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=Workers) as Executor:
+                Futures = {Executor.submit(call_client, File, FreelingFolder + os.path.basename(File)[:-4] + ".xml", Port): File for File in Files}
+                for Future in concurrent.futures.as_completed(Futures):
+                    Filename, Seconds, Returncode = Future.result()
+                    if Returncode != 0:
+                        print("Error: analyzer_client returned " + str(Returncode) + " for " + Filename)
+                        Failed.append(Futures[Future])
+                    Latencies.append((Filename, Seconds, Returncode))
+        finally:
+            if Server is not None:
+                Server.terminate()
+                Server.wait()
 
-            subprocess.call(Command, shell=True)
+        Latencies.sort()
+        with open(os.path.join(FreelingFolder, "freeling_latency.csv"), "w", encoding="utf-8") as OutFile:
+            OutFile.write("file,seconds,exit_code\n")
+            for Filename, Seconds, Returncode in Latencies:
+                OutFile.write(Filename + "," + str(round(Seconds, 3)) + "," + str(Returncode) + "\n")
+        
+        if len(Latencies) > 0:
+            Seconds = [Latency[1] for Latency in Latencies]
+            print(str(len(Latencies)) + " files in " + str(round(time.time() - Start, 1)) + " seconds with " + str(Workers) + " workers (per file: mean " + str(round(sum(Seconds) / len(Seconds), 2)) + ", max " + str(round(max(Seconds), 2)) + " seconds)")
     else:
-        for File in glob.glob(InPath): 
+        Failed = []
+        for File in get_files(InPath): 
             Filename = os.path.basename(File)
             OutPath = FreelingFolder + Filename[:-4] + ".xml"
     
             Command = "analyze -f " + Lang + ".cfg --outlv tagged  --sense ukb " + nec + "--output xml < " + File + " > " + OutPath   
 
-            subprocess.call(Command, shell=True) 
+            Returncode = subprocess.call(Command, shell=True) 
+            if Returncode != 0:
+                print("Error: analyze returned " + str(Returncode) + " for " + Filename)
+                Failed.append(File)
+
+    for File in Failed:
+        OutPath = FreelingFolder + os.path.basename(File)[:-4] + ".xml"
+        if os.path.isfile(OutPath):
+            os.remove(OutPath)
+    if len(Failed) > 0:
+        print("Error: " + str(len(Failed)) + " file(s) could not be annotated")
 
     print("Done.")
+    return sorted(Failed)
+
+
+# table of WordNet lexnames ("02084071-n" -> "noun.animal"), built once from NLTK WordNet and stored next to this module
+# the lexname table is stored in the user cache folder, not in the source tree
+LexnameFile = os.path.join(os.path.expanduser("~"), ".cache", "wordnet_lexnames.json")
+Lexnames = {}
 
 
-def use_wordnet(FreelingFolder, WordnetFolder):
+def get_lexnames(Path=None):
+    """
+    Get the table of WordNet lexnames by synset offset and part of speech (e.g. "02084071-n" -> "noun.animal").
+    The table is built from NLTK WordNet the first time and stored in a json file (default: LexnameFile); 
+    it is built again if the WordNet version has changed. It is loaded once per process.
+    """
+    if len(Lexnames) > 0:
+        return Lexnames
+    if Path is None:
+        Path = LexnameFile
+    
+    Version = wn.get_version()
+    if os.path.isfile(Path):
+        with open(Path, "r", encoding="utf-8") as InFile:
+            Table = json.load(InFile)
+        if Table["version"] == Version:
+            Lexnames.update(Table["lexnames"])
+            return Lexnames
+    
+    print("building the WordNet lexname table...")
+    if os.path.dirname(Path) and not os.path.exists(os.path.dirname(Path)):
+        os.makedirs(os.path.dirname(Path))
+    for Synset in wn.all_synsets():
+        # FreeLing uses "a" for all adjectives, including satellites ("s" in NLTK)
+        POS = "a" if Synset.pos() == "s" else Synset.pos()
+        Lexnames["%08d-%s" % (Synset.offset(), POS)] = Synset.lexname()
+    
+    with open(Path, "w", encoding="utf-8") as OutFile:
+        json.dump({"version": Version, "lexnames": Lexnames}, OutFile)
+    return Lexnames
+
+
+def get_lexname(SynsetID, Lexnames):
+    """
+    Get the lexname of a synset given by FreeLing (e.g. "02084071-n"), or None if it is not in WordNet.
+    """
+    try:
+        Offset, POS = SynsetID.rsplit("-", 1)
+        return Lexnames.get("%08d-%s" % (int(Offset), "a" if POS == "s" else POS))
+    except ValueError:
+        return None
+
+
+def read_sentences(File):
+    """
+    Read the sentences of a FreeLing XML file one by one (the file has no root element, so it is read in chunks
+    and parsed incrementally). Yields each sentence element, which is cleared after use.
+    """
+    Parser = etree.XMLPullParser(events=("end",), tag="sentence")
+    Parser.feed(b"<wrapper>")
+    with open(File, "rb") as InFile:
+        Chunk = re.sub(rb"^\s*<\?xml[^>]*\?>", b"", InFile.read(65536))
+        while True:
+            # the wrapper is closed at the end of the file (also when the file is empty)
+            Parser.feed(Chunk if Chunk else b"</wrapper>")
+            for Event, Sentence in Parser.read_events():
+                yield Sentence
+                # remove the sentences which have been treated
+                Sentence.clear()
+                while Sentence.getprevious() is not None:
+                    del Sentence.getparent()[0]
+            if not Chunk:
+                break
+            Chunk = InFile.read(65536)
+    Parser.close()
+
+
+def use_wordnet(FreelingFolder, WordnetFolder, Files=None, LexnamePath=None):
     """
     Call Wordnet using NLTK to get the lexnames.
+    The FreeLing files are read and the results written sentence by sentence.
+    Each token becomes a w element with the FreeLing attributes (without id), the synset as wnsyn and the lexname as wnlex 
+    ("xxx" if there is none) and the form as text. The lexnames are looked up in a table (see get_lexnames).
+    Files is an optional list of the FreeLing files to treat (default: all the xml files in the FreelingFolder).
+    LexnamePath is an optional path of the json file of the lexname table (default: LexnameFile).
     
     @author: Christof Schöch, Ulrike Henny-Krahmer
     """
@@ -71,79 +237,52 @@ def use_wordnet(FreelingFolder, WordnetFolder):
     if not os.path.exists(WordnetFolder):
         os.makedirs(WordnetFolder)
 
+    Lexnames = get_lexnames(LexnamePath)
 
-    InPath = FreelingFolder+"*.xml"
-    for File in glob.glob(InPath): 
+    if Files is None:
+        Files = glob.glob(FreelingFolder+"*.xml")
+    for File in Files: 
 		
         LexErrCounter = collections.Counter()
-		
-        with open(File, "r") as InFile: 
-            Filename = os.path.basename(File)
-            Text = InFile.read()
-            Text = re.split(r"\n\s*?</token>", Text)
-            NewText = ["<?xml version=\"1.0\" encoding=\"UTF-8\" ?>\n<wrapper>"]
-            for Line in Text[0:-1]:
-                Line = re.sub("token", "w", Line)
-                Line = re.sub("sentence", "s", Line)
-                # Ids löschen
-                Line = re.sub(r'\sid=".*?"', "", Line)
-                Line = Line + "</w>"
-                #print(Line)
-                Word = re.findall("form=\"(.*?)\" ", Line)[0]
-                #print(Word)
-                Line = re.sub("</w>", Word+"</w>", Line)
-                #print(Line) 
-                if "wn=" in Line: 
-                    #print(Line)
-                    SynsetID = re.findall("wn=.*\"", Line)[0]
-                    SynsetNumber = int(SynsetID[4:-3])
-                    SynsetPOS = SynsetID[-2:-1]
-                    #print(SynsetID, SynsetPOS, SynsetNumber)
-                    SynsetAbbID = ""
-                    try:
-                        SynsetAbbID = wn._synset_from_pos_and_offset(SynsetPOS, SynsetNumber)
-                    except:
-                        ""
-                        #print("Error when trying to get synset name.")
-                    SynsetAbbID = str(SynsetAbbID)
-                    SynsetAbbID = SynsetAbbID[8:-2]
-                    #print(SynsetAbbID)
-                    Lexname = ""
-                    try:
-                        Lexname = wn.synset(SynsetAbbID).lexname()
-                    except:
-                        #print("Error when trying to get lexname.")
-                        LexErrCounter.update({"LexNameError":1})
-                        Lexname = "xxx"
-                    #print(Lexname)
-                    Line = re.sub("wn=(.*) >", "wnsyn=\\1 wnlex=\""+Lexname+"\">", Line)
-                    #print(Line)
-                    NewText.append(Line)
-                elif "wn=" not in Line and "<s" not in Line:
-                    #print(Line)
-                    Line = re.sub(" >", " wnsyn=\"xxx\" wnlex=\"xxx\">", Line)
-                    #print(Line)
-                    NewText.append(Line)
-                elif "<s" in Line:
-                    #print(Line)
-                    Line = re.sub(" >", " wnsyn=\"xxx\" wnlex=\"xxx\" >", Line)
-                    #print(Line)
-                    NewText.append(Line)
-                
+        Filename = os.path.basename(File)
+        
+        with etree.xmlfile(WordnetFolder+Filename[:-4]+".xml", encoding="UTF-8") as OutFile:
+            OutFile.write_declaration()
+            with OutFile.element("wrapper"):
+                for Sentence in read_sentences(File):
+                    S = etree.Element("s")
+                    S.text = "\n"
+                    for Token in Sentence.iter("token"):
+                        W = etree.SubElement(S, "w")
+                        for Name, Value in Token.attrib.items():
+                            if Name == "id":
+                                continue
+                            elif Name == "wn":
+                                Lexname = get_lexname(Value, Lexnames)
+                                if Lexname is None:
+                                    LexErrCounter.update({"LexNameError":1})
+                                    Lexname = "xxx"
+                                W.set("wnsyn", Value)
+                                W.set("wnlex", Lexname)
+                            else:
+                                W.set(Name, Value)
+                        if "wn" not in Token.attrib:
+                            W.set("wnsyn", "xxx")
+                            W.set("wnlex", "xxx")
+                        W.text = Token.get("form")
+                        W.tail = "\n"
+                    OutFile.write(S)
+                    OutFile.write("\n")
             
-            if LexErrCounter["LexNameError"] > 0:
-                print(str(LexErrCounter["LexNameError"]) + " lexname(s) could not be found in " + str(Filename))
-            NewText.append("</s>\n</wrapper>")                
-            NewText = ''.join(NewText)
-            with open(WordnetFolder+Filename[:-4]+".xml", "w") as OutFile: 
-                OutFile.write(NewText)
+        if LexErrCounter["LexNameError"] > 0:
+            print(str(LexErrCounter["LexNameError"]) + " lexname(s) could not be found in " + str(Filename))
                 
     print("Done.")
     
 
 
-def annotate_fw(InPath, FreelingFolder, WordnetFolder, Lang, server = True):
-    use_freeling(InPath, FreelingFolder, server, Lang)
+def annotate_fw(InPath, FreelingFolder, WordnetFolder, Lang, server = True, Workers = 4):
+    use_freeling(InPath, FreelingFolder, server, Lang, Workers)
     use_wordnet(FreelingFolder, WordnetFolder)
     
 
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Incremental builds of the derivative formats of the corpus (see workflow_teifw.py):
+TEI master files -> split (prepare_tei) -> FreeLing and WordNet annotation (annotate_fw) -> merge (prepare_tei)
+-> correction of verbs with enclitic pronouns (verbs_enclitics) -> cleaned annotated full texts (general_features.prepare_fulltexts)
+
+For each stage and novel, a manifest records a key made of the content hashes of the inputs, the parameters of the stage
+and the version (hash) of the script which implements it, together with the hashes of the outputs.
+A stage is only run again for a novel if the key has changed or if one of its outputs is missing or has been changed,
+so that e.g. the slow FreeLing annotation is only done for novels whose TEI file was edited.
+The manifest is stored as build_manifest.json in the output folder.
+
+Expects the TEI master files to be named by their cligs idno (e.g. nh0001.xml).
+
+@author: Ulrike Henny-Krahmer
+@filename: build_graph.py
+
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+
+import prepare_tei
+import annotate_fw
+import verbs_enclitics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "features")))
+import general_features
+
+
+# content hashes of files: (path, modification time, size) -> sha1
+file_hashes = {}
+
+
+def get_file_hash(path):
+	"""
+	Returns the sha1 hash of the content of a file (each file is read at most once per run unless it changes).
+
+	Arguments:
+	path (string): path to the file
+	"""
+	stat = os.stat(path)
+	key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+	if key not in file_hashes:
+		sha1 = hashlib.sha1()
+		with open(path, "rb") as infile:
+			for chunk in iter(lambda: infile.read(1024 * 1024), b""):
+				sha1.update(chunk)
+		file_hashes[key] = sha1.hexdigest()
+	return file_hashes[key]
+
+
+def get_script_version(module):
+	"""
+	Returns the version of a script: the hash of its source file.
+
+	Arguments:
+	module (module): the module implementing a stage
+	"""
+	return get_file_hash(module.__file__)
+
+
+def get_job_key(stage, inputs, params, modules):
+	"""
+	Returns the key of a job (a stage run for one novel): a hash of the content of the input files,
+	the parameters and the versions of the scripts.
+
+	Arguments:
+	stage (string): name of the stage
+	inputs (list): paths to the input files
+	params (dict): parameters of the stage (json serializable)
+	modules (list): the modules implementing the stage
+	"""
+	spec = {"stage": stage,
+		"inputs": [[os.path.basename(i), get_file_hash(i)] for i in sorted(inputs)],
+		"params": params,
+		"scripts": [get_script_version(m) for m in modules]}
+	return hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest(outfolder):
+	"""
+	Returns the build manifest of an output folder: stage -> idno -> {"key": job key, "outputs": {path: hash}}
+
+	Arguments:
+	outfolder (string): path to the output folder
+	"""
+	manifest_path = os.path.join(outfolder, "build_manifest.json")
+	if os.path.isfile(manifest_path):
+		with open(manifest_path, "r", encoding="UTF-8") as infile:
+			return json.load(infile)
+	return {}
+
+
+def save_manifest(outfolder, manifest):
+	"""
+	Writes the build manifest of an output folder (under a temporary name first, so that an interrupted run does not leave a broken manifest).
+
+	Arguments:
+	outfolder (string): path to the output folder
+	manifest (dict): the build manifest
+	"""
+	manifest_path = os.path.join(outfolder, "build_manifest.json")
+	with open(manifest_path + ".tmp", "w", encoding="UTF-8") as outfile:
+		json.dump(manifest, outfile, indent=1, sort_keys=True)
+	os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def is_up_to_date(entry, key):
+	"""
+	Checks whether a job is up to date: it has been run with the same key and its outputs are unchanged.
+
+	Arguments:
+	entry (dict): the manifest entry of the job, or None
+	key (string): the current key of the job
+	"""
+	if entry is None or entry["key"] != key:
+		return False
+	for path, output_hash in entry["outputs"].items():
+		if not os.path.isfile(path) or get_file_hash(path) != output_hash:
+			return False
+	return True
+
+
+def run_stage(manifest, outfolder, stage, jobs, params, modules, run):
+	"""
+	Runs a stage for the novels whose inputs, parameters or scripts have changed, and records the results in the manifest.
+	The outputs of the previous run of a job are removed before the job is run again.
+
+	Arguments:
+	manifest (dict): the build manifest
+	outfolder (string): path to the output folder (where the manifest is stored)
+	stage (string): name of the stage
+	jobs (dict): idno -> list of input files
+	params (dict): parameters of the stage
+	modules (list): the modules implementing the stage
+	run (function): function which runs the stage for a list of idnos and returns a dictionary idno -> list of output files;
+	the idnos for which the stage failed are left out of the dictionary, they are not recorded in the manifest and are run again next time
+
+	Returns the lists of the idnos that were run and skipped.
+	"""
+	entries = manifest.setdefault(stage, {})
+	keys = {idno: get_job_key(stage, inputs, params, modules) for idno, inputs in jobs.items()}
+	todo = sorted(idno for idno in jobs if not is_up_to_date(entries.get(idno), keys[idno]))
+	skipped = sorted(idno for idno in jobs if idno not in todo)
+
+	print(stage + ": " + str(len(todo)) + " to run, " + str(len(skipped)) + " up to date and skipped")
+	if len(todo) == 0:
+		return todo, skipped
+
+	for idno in todo:
+		if idno in entries:
+			for path in entries.pop(idno)["outputs"]:
+				if os.path.isfile(path):
+					os.remove(path)
+
+	outputs = run(todo)
+
+	failed = [idno for idno in todo if idno not in outputs]
+	todo = [idno for idno in todo if idno in outputs]
+	for idno in todo:
+		entries[idno] = {"key": keys[idno], "outputs": {path: get_file_hash(path) for path in sorted(outputs[idno])}}
+	save_manifest(outfolder, manifest)
+
+	if len(failed) > 0:
+		print("Error: " + stage + " failed for " + str(len(failed)) + " novel(s), which will be run again next time: " + ", ".join(failed))
+
+	return todo, skipped
+
+
+def get_outputs(paths, idnos):
+	"""
+	Groups output files by idno (the files are named [idno]_[...] or [idno].[...]).
+
+	Arguments:
+	paths (list): paths to the output files
+	idnos (list): the idnos
+	"""
+	outputs = {idno: [] for idno in idnos}
+	for path in paths:
+		idno = os.path.basename(path).split("_")[0].split(".")[0]
+		if idno in outputs:
+			outputs[idno].append(path)
+	return outputs
+
+
+def build_corpus(infolder, outfolder, lang, mode="split", processes=None, workers=4, **kwargs):
+	"""
+	Builds the annotated TEI files of the corpus incrementally: each stage is only run for the novels whose inputs have changed.
+	Prints for each stage how many novels were run and skipped, and returns this report.
+
+	Arguments, positional:
+	infolder (string): path to the folder with the TEI master files
+	outfolder (string): path to the folder for the annotation working files; the annotated TEI files are stored in its subfolder "annotated"
+	lang (string): language of the texts (fr, es, it, pt)
+
+	Arguments, keyword:
+	mode (string): "split" (chapterwise, default) or "split-p" (by paragraphs)
+	processes (int): number of worker processes for splitting and merging, default: number of cpus
+	workers (int): number of FreeLing server workers
+	enclitics (dict): optional, paths (relative to the wdir) for the correction of verbs with enclitic pronouns:
+	{"wdir": ..., "patterns": ..., "exceptions": ..., "accents": ..., "outfolder": path to the folder for the corrected files}
+	fulltexts (dict): optional, paths for the cleaning of the annotated full texts:
+	{"infolder": ..., "outfolder": ..., "stopwords_file": optional path to a stopword file}
+	"""
+	enclitics = kwargs.get("enclitics", None)
+	fulltexts = kwargs.get("fulltexts", None)
+
+	for folder in ["temp", "txt", "fl", "annotated_temp", "annotated"]:
+		if not os.path.exists(os.path.join(outfolder, folder)):
+			os.makedirs(os.path.join(outfolder, folder))
+
+	manifest = load_manifest(outfolder)
+	report = {}
+	suffix = "_p" if mode == "split-p" else "_d"
+	merge_mode = "fl-p" if mode == "split-p" else "fl"
+
+	tei_files = {os.path.basename(f)[:-4]: f for f in glob.glob(os.path.join(infolder, "*.xml"))}
+
+	# split the TEI files into txt files and templates
+	def run_split(idnos):
+		prepare_tei.run_files(prepare_tei.split_file, [(tei_files[idno], outfolder, mode, True) for idno in idnos], processes)
+		paths = [os.path.join(outfolder, "temp", idno + ".xml") for idno in idnos]
+		for idno in idnos:
+			paths.extend(glob.glob(os.path.join(outfolder, "txt", idno + suffix + "*.txt")))
+		return get_outputs(paths, idnos)
+
+	jobs = {idno: [f] for idno, f in tei_files.items()}
+	report["split"] = run_stage(manifest, outfolder, "split", jobs, {"mode": mode}, [prepare_tei], run_split)
+
+	# annotate the txt files with FreeLing and WordNet
+	def get_txt_files(idno):
+		return [p for p in manifest["split"][idno]["outputs"] if p.endswith(".txt")]
+
+	def run_annotate(idnos):
+		txt_files = [p for idno in idnos for p in get_txt_files(idno)]
+		fl_folder = os.path.join(outfolder, "fl", "")
+		wn_folder = os.path.join(outfolder, "annotated_temp", "")
+		failed = annotate_fw.use_freeling(txt_files, fl_folder, True, lang, workers)
+		# a novel is only annotated if all its files are
+		failed_idnos = set(idno for idno, paths in get_outputs(failed, idnos).items() if len(paths) > 0)
+		fl_files = [fl_folder + os.path.basename(p)[:-4] + ".xml" for idno in idnos if idno not in failed_idnos for p in get_txt_files(idno)]
+		annotate_fw.use_wordnet(fl_folder, wn_folder, fl_files)
+		outputs = get_outputs(fl_files + [wn_folder + os.path.basename(p) for p in fl_files], idnos)
+		return {idno: paths for idno, paths in outputs.items() if idno not in failed_idnos}
+
+	jobs = {idno: get_txt_files(idno) for idno in tei_files if idno in manifest["split"]}
+	report["annotate"] = run_stage(manifest, outfolder, "annotate", jobs, {"lang": lang}, [annotate_fw], run_annotate)
+
+	# merge the annotated snippets into TEI files
+	def run_merge(idnos):
+		prepare_tei.run_files(prepare_tei.merge_file, [(os.path.join(outfolder, "temp", idno + ".xml"), outfolder, os.path.join(outfolder, "annotated"), merge_mode) for idno in idnos], processes)
+		return get_outputs([os.path.join(outfolder, "annotated", idno + ".xml") for idno in idnos], idnos)
+
+	jobs = {idno: [os.path.join(outfolder, "temp", idno + ".xml")] + [p for p in manifest["annotate"][idno]["outputs"] if os.path.dirname(p) == os.path.join(outfolder, "annotated_temp")] for idno in tei_files if idno in manifest["annotate"]}
+	report["merge"] = run_stage(manifest, outfolder, "merge", jobs, {"mode": merge_mode}, [prepare_tei], run_merge)
+
+	# correct the annotation of verbs with enclitic pronouns
+	if enclitics is not None:
+		wdir = enclitics["wdir"]
+		resource_files = [os.path.join(wdir, enclitics[r]) for r in ["patterns", "exceptions", "accents"]]
+		corr_folder = enclitics["outfolder"]
+		if not os.path.exists(corr_folder):
+			os.makedirs(corr_folder)
+
+		def run_enclitics(idnos):
+			resources = verbs_enclitics.load_enclitics_resources(wdir, enclitics["patterns"], enclitics["exceptions"], enclitics["accents"])
+			for idno in idnos:
+				verbs_enclitics.correct_enclitics_file(os.path.join(outfolder, "annotated", idno + ".xml"), os.path.join(corr_folder, idno + ".xml"), resources)
+			return get_outputs([os.path.join(corr_folder, idno + ".xml") for idno in idnos], idnos)
+
+		jobs = {idno: [os.path.join(outfolder, "annotated", idno + ".xml")] + resource_files for idno in tei_files if idno in manifest["merge"]}
+		report["enclitics"] = run_stage(manifest, outfolder, "enclitics", jobs, {}, [verbs_enclitics], run_enclitics)
+
+	# clean the annotated full texts (which are extracted from the corrected files with get-plaintext-annotated.xsl)
+	if fulltexts is not None:
+		stopwords_file = fulltexts.get("stopwords_file", None)
+		if not os.path.exists(fulltexts["outfolder"]):
+			os.makedirs(fulltexts["outfolder"])
+
+		def run_fulltexts(idnos):
+			stopword_filter = None
+			if stopwords_file is not None:
+				stopword_filter = general_features.get_stopword_filter(stopwords_file)
+			for idno in idnos:
+				general_features.prepare_fulltext(os.path.join(fulltexts["infolder"], idno + ".txt"), os.path.join(fulltexts["outfolder"], idno + ".txt"), stopword_filter)
+			return get_outputs([os.path.join(fulltexts["outfolder"], idno + ".txt") for idno in idnos], idnos)
+
+		jobs = {}
+		for idno in tei_files:
+			if os.path.isfile(os.path.join(fulltexts["infolder"], idno + ".txt")):
+				jobs[idno] = [os.path.join(fulltexts["infolder"], idno + ".txt")] + ([stopwords_file] if stopwords_file is not None else [])
+		report["fulltexts"] = run_stage(manifest, outfolder, "fulltexts", jobs, {}, [general_features], run_fulltexts)
+
+	print("Done.")
+	for stage, (run, skipped) in report.items():
+		print(stage + ": run for " + str(len(run)) + ", skipped " + str(len(skipped)) + (" (" + ", ".join(run) + ")" if 0 < len(run) <= 10 else ""))
+	return report
+
+
+
+#build_corpus("/home/ulrike/Git/conha19/tei/", "/home/ulrike/Git/conha19/annotated/", "es", mode="split-p", workers=4, enclitics={"wdir": "/home/ulrike/Git", "patterns": "data-nh/corpus/derivative-formats/verb-form-patterns-es-detail.txt", "exceptions": "data-nh/corpus/derivative-formats/verbs-enclitics-exceptions.txt", "accents": "data-nh/corpus/derivative-formats/verb-form-endings-accents.txt", "outfolder": "/home/ulrike/Git/conha19/annotated_corr"})
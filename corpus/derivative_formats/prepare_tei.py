@@ -22,6 +22,7 @@ import sys
 import io
 from lxml import etree
 from pathlib import Path
+from multiprocessing import Pool
 
 
 class FileResolver(etree.Resolver):
@@ -310,19 +311,201 @@ xslt_joinPs = '''\
 	'''
 
 
-def prepare_anno(infolder, outfolder, mode="split"):
+# compiled XSLT transformations of this process (each stylesheet is compiled once per process)
+transforms = {}
+
+tei_ns = "{http://www.tei-c.org/ns/1.0}"
+
+
+def get_join_parser():
+	"""
+	Returns a parser that resolves the files loaded with document() in the join stylesheets.
+	"""
+	parser = etree.XMLParser(encoding="UTF-8")
+	parser.resolvers.add(FileResolver())
+	return parser
+
+
+def get_transform(name):
+	"""
+	Returns the compiled XSLT transformation for a stylesheet, compiling it at the first call in this process.
+	
+	Arguments:
+	name (string): "split", "split-1", "split-p" (the TEI wrappers), "extractDIVs", "extractPs" (the full text extraction),
+	"join", "join-p" (the merge of the annotated snippets)
+	"""
+	if name not in transforms:
+		if name == "split-1":
+			transforms[name] = etree.XSLT(xslt_TEIwrapper_1)
+		elif name == "split-p":
+			transforms[name] = etree.XSLT(xslt_TEIwrapper_p)
+		elif name == "split":
+			transforms[name] = etree.XSLT(xslt_TEIwrapper)
+		elif name == "extractDIVs":
+			transforms[name] = etree.XSLT(xslt_extractDIVs)
+		elif name == "extractPs":
+			transforms[name] = etree.XSLT(xslt_extractPs)
+		elif name == "join-p":
+			transforms[name] = etree.XSLT(etree.parse(io.StringIO(xslt_joinPs), get_join_parser()))
+		elif name == "join":
+			transforms[name] = etree.XSLT(etree.parse(io.StringIO(xslt_joinDIVs), get_join_parser()))
+		else:
+			raise ValueError("Unknown stylesheet: " + name)
+	return transforms[name]
+
+
+def normalize_space(text):
+	"""
+	Returns the text with whitespace normalized like the XPath function normalize-space().
+	"""
+	return " ".join(t for t in text.replace("\t", " ").replace("\r", " ").replace("\n", " ").split(" ") if t != "")
+
+
+def extract_texts(doc, results, mode="split"):
+	"""
+	Extracts the full text of several elements of a document in one pass through the document.
+	The result is the same as the one of the stylesheets xslt_extractDIVs (for chapters or the whole text) or 
+	xslt_extractPs (for paragraphs) applied to each element: the text is normalized, elements are surrounded by spaces,
+	the text of headings and notes is left out (not for paragraphs).
+	Returns a list with the text of each element.
+	
+	Arguments:
+	doc (ElementTree): the TEI document
+	results (list): the elements (in document order, they can be nested)
+	mode (string): "split", "split-1" or "split-p"
+	"""
+	skip_heads = mode != "split-p"
+	index = {r: i for i, r in enumerate(results)}
+	texts = [[] for r in results]
+	# the texts which are being extracted: [pieces, depth inside a heading or note (whose text is left out)]
+	open_texts = []
+	
+	def add_text(text):
+		if text is not None:
+			text = normalize_space(text)
+			for t in open_texts:
+				if t[1] == 0:
+					t[0].append(text)
+	
+	for event, elem in etree.iterwalk(doc, events=("start", "end", "comment", "pi")):
+		if event == "start":
+			if elem in index:
+				open_texts.append([texts[index[elem]], 0])
+			is_tei = elem.tag.startswith(tei_ns)
+			for t in open_texts:
+				if t[1] > 0:
+					t[1] += 1
+				elif skip_heads and elem.tag in (tei_ns + "head", tei_ns + "note"):
+					t[0].append(" ")
+					t[1] = 1
+				elif is_tei:
+					t[0].append(" ")
+			add_text(elem.text)
+		elif event == "end":
+			is_tei = elem.tag.startswith(tei_ns)
+			for t in open_texts:
+				if t[1] > 0:
+					t[1] -= 1
+				elif is_tei:
+					t[0].append(" ")
+			if elem in index:
+				open_texts.pop()
+			add_text(elem.tail)
+		else:
+			add_text(elem.tail)
+	
+	return ["".join(t) for t in texts]
+
+
+def split_file(filepath, outfolder, mode="split", streaming=True):
+	"""
+	Prepares one TEI file for annotation (see prepare_anno): writes the TEI wrapper and the full text files.
+	
+	Arguments:
+	filepath (string): path to the TEI file
+	outfolder (string): path to the output folder
+	mode (string): "split" (chapterwise), "split-1" (text as a whole) or "split-p" (split by paragraphs)
+	streaming (bool): whether to extract the full texts in one pass through the document (default) or with one XSLT run for each chapter or paragraph
+	"""
+	fn = os.path.basename(filepath)[:-4]
+	outfile_x = fn + ".xml"
+	
+	doc = etree.parse(filepath)
+	
+	transform = get_transform(mode if mode in ["split-1", "split-p"] else "split")
+	result_tree = transform(doc)
+	result = str(result_tree)
+	
+	# create TEI wrapper for future annotation results
+	with open(os.path.join(outfolder, "temp", outfile_x), "w") as output:
+		output.write(result)
+		
+	# create one full text file per chapter (or for the whole text, or for each paragraph)
+	tei = {'tei':'http://www.tei-c.org/ns/1.0'}
+	cligs_id = doc.xpath("//tei:idno[@type='cligs']/text()", namespaces=tei)
+	if mode == "split-1":
+		results = doc.xpath("//tei:text/tei:body", namespaces=tei)
+	elif mode == "split-p":
+		results = doc.xpath("//tei:p[ancestor::tei:body] | //tei:l[ancestor::tei:body] | //tei:head[ancestor::tei:body][not(parent::tei:div[@type='part' or @type='subpart' or @type='chapter' or @type='subchapter'])]", namespaces=tei)
+	else:
+		results = doc.xpath("//tei:div[ancestor::tei:body][not(descendant::tei:div[not(ancestor::tei:floatingText)])][not(ancestor::tei:floatingText)]", namespaces=tei)
+	
+	if isinstance(cligs_id, list):
+		cligs_id = cligs_id[0]
+	elif isinstance(cligs_id, str) == False:
+		raise ValueError("This type (" + str(type(cligs_id)) + ") is not supported for cligs_id. Must be list or string.")
+	
+	if streaming:
+		texts = extract_texts(doc, results, mode)
+	else:
+		transform = get_transform("extractPs" if mode == "split-p" else "extractDIVs")
+		texts = [str(transform(r)) for r in results]
+	
+	for i,result in enumerate(texts):
+		if mode == "split-p":
+			outfile = cligs_id + "_p" + str(i + 1) + ".txt"
+		else:
+			outfile = cligs_id + "_d" + str(i + 1) + ".txt"
+		
+		with open(os.path.join(outfolder, "txt", outfile), "w") as output:
+			output.write(result)
+	
+	return filepath
+
+
+def run_files(function, args, processes=None):
+	"""
+	Runs a function for each file, in a pool of worker processes (or in this process if processes is 1).
+	
+	Arguments:
+	function (function): the function, which returns the file path
+	args (list): the arguments for each file, as tuples
+	processes (int): number of worker processes, default: number of cpus
+	"""
+	if processes == 1:
+		for a in args:
+			print("done file " + function(*a))
+	else:
+		with Pool(processes) as pool:
+			for filepath in pool.starmap(function, args):
+				print("done file " + filepath)
+
+
+def prepare_anno(infolder, outfolder, mode="split", processes=None, streaming=True):
 	"""
 	Takes a collection of TEI files and prepares them for annotation.
+	The files are treated in parallel.
 	
 	Arguments:
 	infolder (string): path to the input folder (which should contain the input TEI files)
 	outfolder (string): path to the output folder (which is created if it does not exist)
 	mode (string): default is "split" (chapterwise), also possible is "split-1" (text as a whole), "split-p" (split by paragraphs)
+	processes (int): number of worker processes, default: number of cpus
+	streaming (bool): whether to extract the full texts in one pass through each document (default) or with one XSLT run for each chapter or paragraph
 	"""
 	print("Starting...")
 	
 	inpath = os.path.join(infolder, "*.xml")
-	filecounter = 0
 	
 	# check output folders
 	if not os.path.exists(outfolder):
@@ -336,74 +519,53 @@ def prepare_anno(infolder, outfolder, mode="split"):
 	if not os.path.exists(out_txt):
 		os.makedirs(out_txt)
 		
+	filepaths = glob.glob(inpath)
+	run_files(split_file, [(filepath, outfolder, mode, streaming) for filepath in filepaths], processes)
 	
-	for filepath in glob.glob(inpath):
-		filecounter+= 1
-		fn = os.path.basename(filepath)[:-4]
-		outfile_x = fn + ".xml"
-		
-		doc = etree.parse(filepath)
-		
-		if mode == "split-1":
-			transform = etree.XSLT(xslt_TEIwrapper_1)
-		elif mode == "split-p":
-			transform = etree.XSLT(xslt_TEIwrapper_p)
-		else:
-			transform = etree.XSLT(xslt_TEIwrapper)
-
-		result_tree = transform(doc)
-		result = str(result_tree)
-		
-		# create TEI wrapper for future annotation results
-		with open(os.path.join(outfolder, "temp", outfile_x), "w") as output:
-			output.write(result)
-			
-		# create one full text file per chapter (or for the whole text, or for each paragraph)
-		tei = {'tei':'http://www.tei-c.org/ns/1.0'}
-		cligs_id = doc.xpath("//tei:idno[@type='cligs']/text()", namespaces=tei)
-		if mode == "split-1":
-			results = doc.xpath("//tei:text/tei:body", namespaces=tei)
-		elif mode == "split-p":
-			results = doc.xpath("//tei:p[ancestor::tei:body] | //tei:l[ancestor::tei:body] | //tei:head[ancestor::tei:body][not(parent::tei:div[@type='part' or @type='subpart' or @type='chapter' or @type='subchapter'])]", namespaces=tei)
-		else:
-			results = doc.xpath("//tei:div[ancestor::tei:body][not(descendant::tei:div[not(ancestor::tei:floatingText)])][not(ancestor::tei:floatingText)]", namespaces=tei)
-		
-		if isinstance(cligs_id, list):
-			cligs_id = cligs_id[0]
-		elif isinstance(cligs_id, str) == False:
-			raise ValueError("This type (" + str(type(cligs_id)) + ") is not supported for cligs_id. Must be list or string.")
-		
-		for i,r in enumerate(results):
-			if mode == "split-p":
-				transform = etree.XSLT(xslt_extractPs)
-			else:
-				transform = etree.XSLT(xslt_extractDIVs)
-			result_tree = transform(r)
-			result = str(result_tree)
-			
-			if mode == "split-p":
-				outfile = cligs_id + "_p" + str(i + 1) + ".txt"
-			else:
-				outfile = cligs_id + "_d" + str(i + 1) + ".txt"
-			
-			with open(os.path.join(outfolder, "txt", outfile), "w") as output:
-				output.write(result)
+	print("Done. " + str(len(filepaths)) + " files treated.")
 	
-	print("Done. " + str(filecounter) + " files treated.")
 	
 	
+def merge_file(filepath, infolder, outfolder, mode="fl"):
+	"""
+	Creates the annotated TEI file for one TEI template file (see postpare_anno).
+	
+	Arguments:
+	filepath (string): path to the TEI template file
+	infolder (string): path to the input folder
+	outfolder (string): path to the output folder
+	mode (string): "fl", "ht" or "fl-p"
+	"""
+	fn = os.path.basename(filepath)
+	annofolder = os.path.join(Path(os.path.join(infolder, "annotated_temp")).as_uri(), "")
+	# which annotation mode are we in?
+	annomode = mode
+	
+	doc = etree.parse(filepath, get_join_parser())
+	transform = get_transform("join-p" if mode == "fl-p" else "join")
+	
+	result_tree = transform(doc, annofolder= "'" + annofolder + "'", mode= "'" + annomode + "'")
+	result = str(result_tree)
+	
+	# save the results
+	with open(os.path.join(outfolder, fn), "w") as output:
+		output.write(result)
+	
+	return filepath
 	
 
-def postpare_anno(infolder, outfolder, mode="fl"):
+def postpare_anno(infolder, outfolder, mode="fl", processes=None):
 	"""
 	Creates a TEI file from a collection of annotated full text files (one per chapter or for the whole text).
 	Needs an input folder with two subfolders: 'temp' with the TEI file templates and 'anno' with the annotated text in XML format.
 	Expects the annotated files to be named according to the following example/pattern: nh0006_d1.xml / [cligs_id]_d[division_id].xml
+	The files are treated in parallel.
 	
 	Arguments:
 	infolder (string): path to the input folder (which should contain a folder "temp" with the templates for the new TEI files and a folder "annotated_temp" with the annotations in XML format)
 	outfolder (string): path to the output folder (which is created if it does not exist)
 	mode (string): which kind of annotation to treat; default: "fl" (= FreeLing), alternative: "ht" (= HeidelTime), "fl-p" (= FreeLing, paragraph structure)
+	processes (int): number of worker processes, default: number of cpus
 	"""
 	print("Starting...")
 	
@@ -420,41 +582,16 @@ def postpare_anno(infolder, outfolder, mode="fl"):
 	if not os.path.exists(outfolder):
 		os.makedirs(outfolder)
 		
-	filecounter = 0	
-
 	# fetch annotated snippets for each TEI template file
-	for filepath in glob.glob(os.path.join(in_temp, "*.xml")):
-		print("doing file " + filepath)
-		filecounter+= 1
-		fn = os.path.basename(filepath)
-		annofolder = os.path.join(Path(os.path.join(infolder, "annotated_temp")).as_uri(), "")
-		# which annotation mode are we in?
-		annomode = mode
-		
-		parser = etree.XMLParser(encoding="UTF-8")
-		parser.resolvers.add(FileResolver())
-		
-		doc = etree.parse(filepath, parser)
-		if mode == "fl-p":
-			xslt_root = etree.parse(io.StringIO(xslt_joinPs), parser)
-		else:
-			xslt_root = etree.parse(io.StringIO(xslt_joinDIVs), parser)
-		
-		transform = etree.XSLT(xslt_root)
-		
-		result_tree = transform(doc, annofolder= "'" + annofolder + "'", mode= "'" + annomode + "'")
-		result = str(result_tree)
-		
-		# save the results
-		with open(os.path.join(outfolder, fn), "w") as output:
-			output.write(result)
+	filepaths = glob.glob(os.path.join(in_temp, "*.xml"))
+	run_files(merge_file, [(filepath, infolder, outfolder, mode) for filepath in filepaths], processes)
 	
-	print("Done. " + str(filecounter) + " files treated.")
+	print("Done. " + str(len(filepaths)) + " files treated.")
 	
 		
 
 
-def prepare(mode, infolder, outfolder):
+def prepare(mode, infolder, outfolder, processes=None):
 	"""
 	Preparations for linguistically annotated versions of a collection of TEI files.
 	There are two phases:
@@ -465,19 +602,20 @@ def prepare(mode, infolder, outfolder):
 	mode(string): possible values are "split" (chapterwise), "split-1" (the whole text at once), "split-p" (split by paragraphs) or "merge"
 	infolder (string): in split-mode: path to the input folder (which should contain the input TEI files); in merge-mode: path to the annotation output folder (with subfolder "temp" and "annotated_temp")
 	outfolder (string): in split-mode: path to the output folder for annotation working files; in merge-mode: path to the output folder for annotated TEI result files. The folders are created if they do not exist.
+	processes (int): number of worker processes, default: number of cpus
 	"""
 	if mode == "split":
-		prepare_anno(infolder, outfolder, mode="split")
+		prepare_anno(infolder, outfolder, mode="split", processes=processes)
 	elif mode == "split-1":
-		prepare_anno(infolder, outfolder, mode="split-1")
+		prepare_anno(infolder, outfolder, mode="split-1", processes=processes)
 	elif mode == "split-p":
-		prepare_anno(infolder, outfolder, mode="split-p")
+		prepare_anno(infolder, outfolder, mode="split-p", processes=processes)
 	elif mode == "merge":
-		postpare_anno(infolder, outfolder, mode="fl")
+		postpare_anno(infolder, outfolder, mode="fl", processes=processes)
 	elif mode == "merge-p":
-		postpare_anno(infolder, outfolder, mode="fl-p")
+		postpare_anno(infolder, outfolder, mode="fl-p", processes=processes)
 	elif mode == "merge-hdt":
-		postpare_anno(infolder, outfolder, mode="ht")
+		postpare_anno(infolder, outfolder, mode="ht", processes=processes)
 	else:
 		raise ValueError("Please indicate one of the following as the value for the first argument: 'split', 'merge'")
 
@@ -15,6 +15,192 @@ import plotly.graph_objects as go
 import re
 from lxml import etree
 import csv
+import time
+from multiprocessing import Pool
+
+
+# regex to get the word of a line with a token (<w ...>word</w>)
+w_regex = re.compile(r"<w.*>([\w_]+)</w>")
+
+tei_ns = "{http://www.tei-c.org/ns/1.0}"
+cligs_ns = "{https://cligs.hypotheses.org/ns/cligs}"
+
+# attributes of the FreeLing analysis of a token (local names), which are not kept when a token is split
+analysis_attributes = {"form", "lemma", "pos", "tag", "ctag", "type", "mood", "num", "person", "tense", "gen", "possessornum", "possessorpers", 
+"nec", "neclass", "case", "punctenclose", "degree", "polite", "wnsyn", "wnlex"}
+
+
+
+def load_enclitics_resources(wdir, patterns, exceptions, accents=None):
+	"""
+	Load the patterns, exceptions and accent patterns for the detection and correction of verb forms with enclitic pronouns
+	and prepare them for matching (see get_enclitics_engine).
+	
+	Arguments:
+	wdir (str): path to the working directory
+	patterns (str): relative path to the file with regex patterns for enclitics
+	exceptions (str): relative path to a list of exception words that are not verb forms with enclitic pronouns
+	accents (str): optional, relative path to a list containing accent patterns
+	"""
+	# load patterns as a list
+	patterns = pd.read_csv(join(wdir, patterns), header=None)
+	patterns = patterns.iloc[:,0].tolist()
+	# load exceptions
+	exceptions = pd.read_csv(join(wdir, exceptions), header=None)
+	exceptions = exceptions.iloc[:,0].tolist()
+	# load accent patterns into a dictionary
+	if accents is not None:
+		with open(join(wdir, accents), mode='r', encoding="UTF-8") as infile:
+			reader = csv.reader(infile)
+			accents = {rows[0]:rows[1] for rows in reader}
+	else:
+		accents = {}
+	
+	return get_enclitics_engine(patterns, exceptions, accents)
+
+
+def get_enclitics_engine(patterns, exceptions, accents):
+	"""
+	Prepare the patterns, exceptions and accent patterns for matching. Returns a dictionary with:
+	- "patterns": the list of patterns
+	- "pattern": the patterns joined into one (matches if any of the patterns matches)
+	- "regex": one compiled regex with a named group for each pattern ("p0", "p1", ...), which matches with the first matching pattern
+	- "groups": for each pattern, the number of its first group in the compiled regex and the number of its groups
+	- "exceptions": the set of exception words
+	- "accents": the accent replacements (ending -> replacement), in the order of the list, with a compiled regex for each ending
+	and the lengths of the endings
+	
+	Arguments:
+	patterns (list): regex patterns for verb forms with enclitic pronouns (the first group is the verb form, the others are the pronouns)
+	exceptions (list): exception words that are not verb forms with enclitic pronouns
+	accents (dict): accent patterns, ending -> replacement
+	"""
+	engine = {"patterns": patterns, "pattern": "|".join(patterns), "exceptions": frozenset(exceptions)}
+	
+	# patterns with backreferences by number can not be combined into one regex
+	if any(re.search(r"\\[1-9]|\(\?P=", p) is not None for p in patterns):
+		engine["regex"] = None
+	else:
+		engine["regex"] = re.compile("|".join("(?P<p" + str(idx) + ">" + p + ")" for idx,p in enumerate(patterns)))
+		groups = []
+		group = 1
+		for p in patterns:
+			num_groups = re.compile(p).groups
+			groups.append((group + 1, num_groups))
+			group += num_groups + 1
+		engine["groups"] = groups
+	
+	engine["accents"] = accents
+	engine["accent_regexes"] = {ending: re.compile(ending) for ending in accents}
+	engine["accent_order"] = {ending: idx for idx,ending in enumerate(accents)}
+	engine["accent_lengths"] = sorted(set(len(ending) for ending in accents))
+	
+	return engine
+
+
+def get_cligs_form(line):
+	"""
+	Get the word of a token line (<w ...>word</w>), in lower case.
+	
+	Arguments:
+	line (str): the line
+	"""
+	return w_regex.sub(r"\1", line).lower().strip()
+
+
+def match_enclitics(cligs_form, engine):
+	"""
+	Check whether a word is a verb form with enclitic pronouns: it matches one of the patterns and is not an exception.
+	Returns the groups of the first matching pattern (the verb form and the pronouns), or None.
+	
+	Arguments:
+	cligs_form (str): the word
+	engine (dict): the prepared patterns (see get_enclitics_engine)
+	"""
+	if engine["regex"] is None:
+		if re.match(engine["pattern"], cligs_form) is None or cligs_form in engine["exceptions"]:
+			return None
+		for p in engine["patterns"]:
+			m = re.match(p, cligs_form)
+			if m is not None:
+				return m.groups()
+		return None
+	
+	m = engine["regex"].match(cligs_form)
+	if m is None or cligs_form in engine["exceptions"]:
+		return None
+	first_group, num_groups = engine["groups"][int(m.lastgroup[1:])]
+	return m.groups()[first_group - 1:first_group - 1 + num_groups]
+
+
+def correct_accent(verb_form, engine):
+	"""
+	Apply the first accent pattern (in the order of the list) whose ending matches the verb form.
+	
+	Arguments:
+	verb_form (str): the verb form without the enclitic pronouns
+	engine (dict): the prepared patterns (see get_enclitics_engine)
+	"""
+	endings = []
+	for length in engine["accent_lengths"]:
+		if length <= len(verb_form):
+			ending = verb_form[len(verb_form) - length:]
+			if ending in engine["accents"]:
+				endings.append(ending)
+	if len(endings) == 0:
+		return verb_form
+	ending = min(endings, key=lambda e: engine["accent_order"][e])
+	return engine["accent_regexes"][ending].sub(engine["accents"][ending], verb_form)
+
+
+def split_enclitics(groups, engine):
+	"""
+	Split a verb form with enclitic pronouns into the new tokens: the verb form (with corrected accent) and the pronouns.
+	Returns a list of tuples (form, pos).
+	
+	Arguments:
+	groups (tuple): the groups of the matching pattern (see match_enclitics)
+	engine (dict): the prepared patterns (see get_enclitics_engine)
+	"""
+	tokens = []
+	for idx,m in enumerate(groups):
+		if idx == 0:
+			tokens.append((correct_accent(m, engine), "verb"))
+		else:
+			tokens.append((m, "pronoun"))
+	return tokens
+
+
+def run_novels(function, args, processes=None):
+	"""
+	Run a function for each novel, in a pool of worker processes (or in this process if processes is 1).
+	Returns the results in the order of the arguments.
+	
+	Arguments:
+	function (function): the function
+	args (list): the arguments for each novel, as tuples
+	processes (int): number of worker processes, default: number of cpus
+	"""
+	if processes == 1:
+		return [function(*a) for a in args]
+	with Pool(processes) as pool:
+		return pool.starmap(function, args)
+
+
+def collect_enclitics_file(filepath, engine):
+	"""
+	Get the token lines of a file which match the patterns of verb forms with enclitic pronouns (see collect_enclitics_freeling).
+	
+	Arguments:
+	filepath (str): path to the file
+	engine (dict): the prepared patterns (see get_enclitics_engine)
+	"""
+	lines = []
+	with open(filepath, "r", encoding="UTF-8") as infile:
+		for line in infile:
+			if line[0:2] == "<w" and match_enclitics(get_cligs_form(line), engine) is not None:
+				lines.append(line)
+	return lines
 
 
 def collect_enclitics_freeling(wdir, inpath, patterns, exceptions, outfile):
@@ -32,38 +218,26 @@ def collect_enclitics_freeling(wdir, inpath, patterns, exceptions, outfile):
 	"""
 	print("count enclitics freeling...")
 	
-	# read regex patterns
-	patterns = pd.read_csv(join(wdir, patterns), header=None)
-	patterns = patterns.iloc[:,0].tolist()
-	pattern = "|".join(patterns)
+	# read regex patterns and exception word list
+	engine = load_enclitics_resources(wdir, patterns, exceptions)
 	
-	# read exception word list
-	exceptions = pd.read_csv(join(wdir, exceptions), header=None)
-	exceptions = exceptions.iloc[:,0].tolist()
+	filepaths = glob.glob(join(wdir, inpath, "*.xml"))
 	
+	# look for words that match the enclitic verb form patterns (in parallel for the novels)
+	matches = run_novels(collect_enclitics_file, [(filepath, engine) for filepath in filepaths])
 	
 	with open(join(wdir,outfile), "w", encoding="UTF-8") as outf:
 		outf.write('<?xml version="1.0" encoding="UTF-8"?>')
 		outf.write('<div xmlns="http://www.tei-c.org/ns/1.0" xmlns:cligs="https://cligs.hypotheses.org/ns/cligs">')
 	
-		# go through the TEI files
-		for filepath in glob.glob(join(wdir, inpath, "*.xml")):
+		# write the matches of each novel to the output file
+		for filepath, lines in zip(filepaths, matches):
 			filename = filepath[-10:]
 			print("doing " + filename + "...")
 			idno = filename[:-4]
 			outf.write('<ab xml:id="' + idno + '">\n')
-			
-			# look for words that match the enclitic verb form patterns and write them to the output file
-			with open(filepath, "r", encoding="UTF-8") as infile:
-				for line in infile.readlines():
-					
-					cligs_form = re.sub(r"<w.*>([\w_]+)</w>", r"\1", line).lower().strip()
-					
-					if line[0:2] == "<w" and re.match(pattern, cligs_form) is not None:
-						# check for exceptions
-						if cligs_form not in exceptions:
-							outf.write(line)
-			
+			for line in lines:
+				outf.write(line)
 			outf.write('</ab>\n')
 			
 		outf.write('</div>')
@@ -238,35 +412,22 @@ def count_enclitics(wdir, inpath, patterns, out_csv, md, exceptions):
 	# get metadata
 	md = pd.read_csv(join(wdir, md), index_col=0)
 
-	# load patterns as a list
-	patterns = pd.read_csv(join(wdir, patterns), header=None)
-	patterns = patterns.iloc[:,0].tolist()
-	# load exceptions
-	exceptions = pd.read_csv(join(wdir, exceptions), header=None)
-	exceptions = exceptions.iloc[:,0].tolist()
+	# load patterns and exceptions
+	engine = load_enclitics_resources(wdir, patterns, exceptions)
 
 	# create data frame for results
 	df = pd.DataFrame(columns=["enclitics_abs","enclitics_rel"])
 
-	# read text files and check for verbs with enclitic pronouns
-	for filepath in glob.glob(join(wdir, inpath, "*.txt")):
+	# read text files and check for verbs with enclitic pronouns (in parallel for the novels)
+	filepaths = glob.glob(join(wdir, inpath, "*.txt"))
+	counts = run_novels(count_enclitics_file, [(filepath, engine) for filepath in filepaths])
+	
+	for filepath, num_enclitics in zip(filepaths, counts):
 		filename = filepath[-10:]
 		
 		print("doing " + filename + "...")
 		
 		idno = filename[:-4]
-		num_enclitics = 0
-		
-		with open(filepath, "r", encoding="UTF-8") as infile:
-			text = infile.read()
-			for pat in patterns:
-				results = re.findall(pat, text)
-				# join tuples of resulting groups
-				results = ["".join(i) for i in results]
-				results = [i.lower() for i in results]
-				results = [i for i in results if i not in exceptions]
-				num_enclitics += len(results)
-				
 			
 		# get number relative to text length
 		text_length = md.loc[idno,"tokens"]
@@ -282,6 +443,29 @@ def count_enclitics(wdir, inpath, patterns, out_csv, md, exceptions):
 	df.to_csv(join(wdir, out_csv))
 
 	print("done")
+	
+	
+def count_enclitics_file(filepath, engine):
+	"""
+	count the number of verb forms with enclitic pronouns in a full text file (see count_enclitics)
+	each pattern is searched in the whole text, so a form that matches several patterns is counted for each of them
+	
+	Arguments:
+	filepath (str): path to the text file
+	engine (dict): the prepared patterns (see get_enclitics_engine)
+	"""
+	num_enclitics = 0
+	exceptions = engine["exceptions"]
+	
+	with open(filepath, "r", encoding="UTF-8") as infile:
+		text = infile.read()
+		for pat in engine["patterns"]:
+			results = re.findall(pat, text)
+			# join tuples of resulting groups
+			results = ["".join(i).lower() for i in results]
+			num_enclitics += sum(1 for i in results if i not in exceptions)
+	
+	return num_enclitics
 		
 	
 	
@@ -323,9 +507,10 @@ def plot_enclitics(wdir, data, outfile):
 	print("done")
 	
 	
-def correct_enclitics_freeling(wdir, inpath, patterns, exceptions, accents, outpath):
+def correct_enclitics_freeling(wdir, inpath, patterns, exceptions, accents, outpath, processes=None):
 	""" 
 	Correct the POS annotation of verb forms with enclitic pronouns that remained in the FreeLing output
+	(the files are rewritten as XML, see correct_enclitics_file, and treated in parallel)
 	
 	Example:
 	<w cligs:form="descubríase" lemma="descubríase" cligs:tag="NCFS000" cligs:ctag="NC" pos="noun" type="common" cligs:gen="feminine" cligs:num="singular" cligs:wnsyn="xxx" cligs:wnlex="xxx">descubríase</w>
@@ -340,74 +525,199 @@ def correct_enclitics_freeling(wdir, inpath, patterns, exceptions, accents, outp
 	exceptions (str): relative path to a list of exception words that are not verb forms with enclitic pronouns
 	accents (str): relative path to a list containing accent patterns (for accent replacements after splitting the enclitic verb forms) 
 	outpath (str): relative path for the corrected output files
+	processes (int): number of worker processes, default: number of cpus
 	"""
 	print("correcting enclitics...")
 	
-	# load patterns as a list
-	patterns = pd.read_csv(join(wdir, patterns), header=None)
-	patterns = patterns.iloc[:,0].tolist()
-	pattern = "|".join(patterns)
-	# load exceptions
-	exceptions = pd.read_csv(join(wdir, exceptions), header=None)
-	exceptions = exceptions.iloc[:,0].tolist()
-	# load accent patterns into a dictionary
-	with open(join(wdir, accents), mode='r', encoding="UTF-8") as infile:
-		reader = csv.reader(infile)
-		accents = {rows[0]:rows[1] for rows in reader}
-        
+	engine = load_enclitics_resources(wdir, patterns, exceptions, accents)
 	
-	for filepath in glob.glob(join(wdir, inpath, "*.xml")):
-		filename = filepath[-10:]
-		idno = filename[:-4]
-		outfile_path = join(wdir, outpath, filename)
-		print("doing " + filename + "...")
+	filepaths = glob.glob(join(wdir, inpath, "*.xml"))
+	
+	# correct the novels in parallel
+	run_novels(correct_enclitics_file, [(filepath, join(wdir, outpath, filepath[-10:]), engine) for filepath in filepaths], processes)
+	
+	for filepath in filepaths:
+		print("done " + filepath[-10:])
 		
-		# read the lines and look for matches
-		# look for words that match the enclitic verb form patterns
-		with open(filepath, "r", encoding="UTF-8") as infile:
-			with open(outfile_path, "w", encoding="UTF-8") as outfile:
-			
-				for line in infile.readlines():
-					
-					cligs_form = re.sub(r"<w.*>([\w_]+)</w>", r"\1", line).lower().strip()
-					
-					if line[0:2] == "<w" and re.match(pattern, cligs_form) is not None:
-						# check for exceptions
-						if cligs_form not in exceptions:
-							# here we have a match that needs to be corrected
-							# check which pattern applies (use only the first matching patterns), split the form and create new word entries
-							for p in patterns:
-								if re.match(p, cligs_form) is not None:
-									
-									# go through the matching groups
-									# the first one is always the verb form, the rest are enclitic pronouns
-									# copy the new lines to the output file
-									for idx,m in enumerate(re.match(p, cligs_form).groups()):
-										if idx == 0:
-											# check the first group for the accent pattern
-											for i in accents:
-												
-												if m.endswith(i):
-													m = re.sub(i, accents[i], m)
-													break
-													
-											new_line = '<w cligs:form="' + m + '" lemma="' + m + '" pos="verb">' + m + '</w>\n'
-											outfile.write(new_line)
-										else:
-											new_line = '<w cligs:form="' + m + '" lemma="' + m + '" pos="pronoun">' + m + '</w>\n'
-											outfile.write(new_line)
-									break
-									
-								
-								
-						# if it is an exception, copy the line as is
-						else:
-							outfile.write(line)
-					# if the word does not match a pattern, copy the line as is
-					else:
-						outfile.write(line)
+	print("done")
+
+
+def write_element(xf, elem):
+	"""
+	Write an element with its content (but without its tail) to an xmlfile, in the namespace context of the xmlfile.
+	
+	Arguments:
+	xf (xmlfile): the output
+	elem (Element): the element
+	"""
+	if not isinstance(elem.tag, str):
+		xf.write(elem, with_tail=False)
+		return
+	with xf.element(elem.tag, elem.attrib):
+		if elem.text:
+			xf.write(elem.text)
+		for child in elem:
+			write_element(xf, child)
+			if child.tail:
+				xf.write(child.tail)
+
+
+def write_enclitics(xf, w, groups, engine):
+	"""
+	Write the new tokens for a verb form with enclitic pronouns to an xmlfile: a tei:w element for the verb form and one for each pronoun,
+	with cligs:form, lemma and pos. The attributes of the original token which are not part of the FreeLing analysis (e.g. xml:id) 
+	are kept on the verb token.
+	
+	Arguments:
+	xf (xmlfile): the output
+	w (Element): the original token
+	groups (tuple): the groups of the matching pattern (see match_enclitics)
+	engine (dict): the prepared patterns (see get_enclitics_engine)
+	"""
+	other_attributes = [(name, value) for name, value in w.attrib.items() if etree.QName(name).localname not in analysis_attributes]
+	
+	for idx, (form, pos) in enumerate(split_enclitics(groups, engine)):
+		if idx > 0:
+			xf.write("\n")
+		attributes = [(cligs_ns + "form", form), ("lemma", form), ("pos", pos)]
+		if idx == 0:
+			attributes.extend(other_attributes)
+		with xf.element(tei_ns + "w", dict(attributes)):
+			xf.write(form)
+
+
+def correct_enclitics_file(filepath, outfile_path, engine):
+	"""
+	Correct the POS annotation of verb forms with enclitic pronouns in one file (see correct_enclitics_freeling).
+	The file is parsed and written incrementally (in constant memory): the tei:w elements are checked one by one, 
+	the other elements, text, comments and processing instructions are copied as they are.
+	
+	Arguments:
+	filepath (str): path to the input file (TEI with FreeLing annotation)
+	outfile_path (str): path to the corrected output file
+	engine (dict): the prepared patterns, exceptions and accent patterns (see load_enclitics_resources)
+	"""
+	with etree.xmlfile(outfile_path, encoding="UTF-8") as xf:
+		xf.write_declaration()
 		
+		# open elements (contexts of the xmlfile) and their namespaces
+		elements = []
+		namespaces = [{"xml": "http://www.w3.org/XML/1998/namespace"}]
+		# text which has not been written yet: the text of the last opened element or the tail of the last closed one
+		pending = None
+		# depth inside a token (its content is written with the token)
+		w_depth = 0
 		
+		for event, elem in etree.iterparse(filepath, events=("start", "end", "comment", "pi"), remove_blank_text=False):
+			if w_depth > 0:
+				if event == "start":
+					w_depth += 1
+				elif event == "end":
+					w_depth -= 1
+				if w_depth > 0 or event != "end":
+					continue
+			
+			if pending is not None:
+				text = getattr(pending[0], pending[1])
+				if text and len(elements) > 0:
+					xf.write(text)
+				pending = None
+			
+			if event == "start":
+				if elem.tag == tei_ns + "w":
+					w_depth = 1
+					continue
+				nsmap = {prefix: uri for prefix, uri in elem.nsmap.items() if namespaces[-1].get(prefix) != uri}
+				if len(elements) == 0:
+					nsmap["xml"] = namespaces[0]["xml"]
+				element = xf.element(elem.tag, elem.attrib, nsmap=nsmap)
+				element.__enter__()
+				elements.append(element)
+				namespaces.append({**namespaces[-1], **nsmap})
+				pending = (elem, "text")
+			
+			elif event == "end":
+				if elem.tag == tei_ns + "w":
+					groups = match_enclitics((elem.text or "").lower().strip(), engine)
+					if groups is not None:
+						# here we have a match that needs to be corrected: 
+						# split the form and create new tokens (the first group is always the verb form, the rest are enclitic pronouns)
+						write_enclitics(xf, elem, groups, engine)
+					else:
+						# if the word does not match a pattern or is an exception, copy the token as is
+						write_element(xf, elem)
+				else:
+					elements.pop().__exit__(None, None, None)
+					namespaces.pop()
+				pending = (elem, "tail")
+				
+				# remove the treated elements from the tree (the tail of this element is written with the next event)
+				elem.clear(keep_tail=True)
+				if elem.getparent() is not None:
+					while elem.getprevious() is not None:
+						del elem.getparent()[0]
+			
+			else:
+				# comments and processing instructions
+				xf.write(elem, with_tail=False)
+				pending = (elem, "tail")
+	
+	return filepath
+
+
+def benchmark_enclitics(wdir, inpath, patterns, exceptions, accents, processes=None):
+	"""
+	Benchmark the detection of verb forms with enclitic pronouns on the annotated corpus: 
+	match the token lines of all the files with each pattern in turn (as before the patterns were combined)
+	and with the combined patterns, check that the results are the same, and time the correction of the files
+	with one and with several processes (the corrected files are written to a temporary folder).
+	
+	Arguments:
+	wdir (str): path to the working directory
+	inpath (str): relative path to the input files (TEI with FreeLing annotation)
+	patterns (str): relative path to the file with regex patterns for enclitics
+	exceptions (str): relative path to a list of exception words that are not verb forms with enclitic pronouns
+	accents (str): relative path to a list containing accent patterns
+	processes (int): number of worker processes, default: number of cpus
+	"""
+	import tempfile
+	
+	print("benchmark enclitics...")
+	
+	engine = load_enclitics_resources(wdir, patterns, exceptions, accents)
+	exception_list = list(engine["exceptions"])
+	filepaths = glob.glob(join(wdir, inpath, "*.xml"))
+	
+	forms = []
+	for filepath in filepaths:
+		with open(filepath, "r", encoding="UTF-8") as infile:
+			forms.extend(get_cligs_form(line) for line in infile if line[0:2] == "<w")
+	print(str(len(forms)) + " tokens in " + str(len(filepaths)) + " files")
+	
+	start = time.time()
+	results_patterns = []
+	for cligs_form in forms:
+		groups = None
+		if re.match(engine["pattern"], cligs_form) is not None and cligs_form not in exception_list:
+			for p in engine["patterns"]:
+				if re.match(p, cligs_form) is not None:
+					groups = re.match(p, cligs_form).groups()
+					break
+		results_patterns.append(groups)
+	print("patterns one by one: " + str(round(time.time() - start, 2)) + " seconds")
+	
+	start = time.time()
+	results_engine = [match_enclitics(cligs_form, engine) for cligs_form in forms]
+	print("combined patterns: " + str(round(time.time() - start, 2)) + " seconds")
+	
+	print("same results: " + str(results_patterns == results_engine) + " (" + str(sum(1 for r in results_engine if r is not None)) + " matches)")
+	
+	with tempfile.TemporaryDirectory() as outfolder:
+		for num_processes in [1, processes]:
+			start = time.time()
+			run_novels(correct_enclitics_file, [(filepath, join(outfolder, filepath[-10:]), engine) for filepath in filepaths], num_processes)
+			print("correction with " + str(num_processes if num_processes is not None else "all") + " processes: " + str(round(time.time() - start, 2)) + " seconds")
+	
 	print("done")
 
 
@@ -421,8 +731,11 @@ def correct_enclitics_freeling(wdir, inpath, patterns, exceptions, accents, outp
 
 #analyze_enclitics_freeling("/home/ulrike/Git", "conha19/metadata.csv", "data-nh/corpus/derivative-formats/verbs-enclitics-freeling-matches.xml", "data-nh/corpus/derivative-formats/verbs-enclitics-freeling.csv")
 
-visualize_enclitics_freeling("/home/ulrike/Git", "conha19/metadata_all.csv", "data-nh/corpus/derivative-formats/verbs-enclitics-freeling.csv", "data-nh/corpus/derivative-formats/plot-verbs-enclitics-freeling")
+if __name__ == "__main__":
+	visualize_enclitics_freeling("/home/ulrike/Git", "conha19/metadata_all.csv", "data-nh/corpus/derivative-formats/verbs-enclitics-freeling.csv", "data-nh/corpus/derivative-formats/plot-verbs-enclitics-freeling")
 
 #correct_enclitics_freeling("/home/ulrike/Git", "conha19/annotated/", "data-nh/corpus/derivative-formats/verb-form-patterns-es-detail.txt", "data-nh/corpus/derivative-formats/verbs-enclitics-exceptions.txt", "data-nh/corpus/derivative-formats/verb-form-endings-accents.txt", "conha19/annotated_corr")
 
+#benchmark_enclitics("/home/ulrike/Git", "conha19/annotated/", "data-nh/corpus/derivative-formats/verb-form-patterns-es-detail.txt", "data-nh/corpus/derivative-formats/verbs-enclitics-exceptions.txt", "data-nh/corpus/derivative-formats/verb-form-endings-accents.txt")
+
 
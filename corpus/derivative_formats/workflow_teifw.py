@@ -39,6 +39,9 @@ lang = "es"
 
 server = True
 
+# number of Freeling server workers and parallel client connections
+workers = 4
+
 print(infolder)
 import sys
 import os
@@ -49,8 +52,12 @@ start_time = time.time()
 # by default, it should be enough to change the options above and leave this as is
 
 #prepare_tei.prepare("split-p", infolder, outfolder)
-#annotate_fw.annotate_fw(os.path.join(outfolder, "txt/*.txt"), os.path.join(outfolder, "fl/"), os.path.join(outfolder, "annotated_temp/"), lang, server)
+#annotate_fw.annotate_fw(os.path.join(outfolder, "txt/*.txt"), os.path.join(outfolder, "fl/"), os.path.join(outfolder, "annotated_temp/"), lang, server, workers)
 #prepare_tei.prepare("merge-p", outfolder, os.path.join(outfolder, "annotated"))
 
+# alternatively: incremental build, only the novels whose TEI files (or the scripts) have changed since the last run are treated again
+#import build_graph
+#build_graph.build_corpus(infolder, outfolder, lang, mode="split-p", workers=workers)
+
 print("--- %s seconds ---" % (time.time() - start_time))
 
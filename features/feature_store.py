@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Filename: feature_store.py
+
+"""
+@author: Ulrike Henny-Krahmer
+
+Serves to store feature matrices (e.g. bow_mfw*.csv, avgtopicscores_by-idno*.csv) in a binary format
+and to read them faster than from the csv files. Files that are read repeatedly in the same run
+(e.g. in the classification loops) can be kept in an in-process LRU cache.
+
+For each csv file, the store consists of a .npy file with the values (which can be memory-mapped)
+and a sidecar .json file with the index (idnos) and the column names, in the same directory,
+e.g. bow_mfw100_tfidf.npy and bow_mfw100_tfidf.json for bow_mfw100_tfidf.csv.
+"""
+
+from os.path import join
+from os.path import isfile
+from os.path import getmtime
+from os.path import realpath
+from collections import OrderedDict
+import glob
+import json
+import numpy as np
+import pandas as pd
+
+
+# in-process cache of parsed files: key (kind, resolved path, modification times) -> frame, least recently used first
+frame_cache = OrderedDict()
+cache_state = {"max_bytes": 2 * 1024 ** 3, "bytes": 0, "hits": 0, "misses": 0}
+
+
+
+def get_store_paths(csv_path):
+	"""
+	get the paths of the binary store files for a feature csv file
+	returns a tuple (path of the .npy file, path of the .json file)
+
+	Arguments:
+	csv_path (str): path to the feature csv file
+	"""
+	base_path = csv_path[:-4] if csv_path.endswith(".csv") else csv_path
+	return base_path + ".npy", base_path + ".json"
+
+
+def has_store(csv_path):
+	"""
+	check if there is an up-to-date binary store for a feature csv file
+	(the store is not used if the csv file has been changed after the store was written)
+
+	Arguments:
+	csv_path (str): path to the feature csv file
+	"""
+	npy_path, json_path = get_store_paths(csv_path)
+
+	if not (isfile(npy_path) and isfile(json_path)):
+		return False
+	if isfile(csv_path) and getmtime(csv_path) > getmtime(npy_path):
+		return False
+	return True
+
+
+def write_features(frame, csv_path):
+	"""
+	store a feature matrix in the binary format
+
+	Arguments:
+	frame (DataFrame): the feature matrix, with idnos as index and feature names as columns, all values numeric
+	csv_path (str): path to the corresponding feature csv file (the csv file itself is not written)
+	"""
+	non_numeric = [col for col, dtype in frame.dtypes.items() if not np.issubdtype(dtype, np.number)]
+	if len(non_numeric) > 0:
+		raise ValueError("feature matrix with non-numeric columns can not be stored: " + str(non_numeric[:5]))
+
+	npy_path, json_path = get_store_paths(csv_path)
+
+	np.save(npy_path, frame.to_numpy())
+
+	labels = {"index": frame.index.tolist(), "index_name": frame.index.name, "columns": [str(c) for c in frame.columns]}
+	with open(json_path, "w", encoding="UTF-8") as outfile:
+		json.dump(labels, outfile, ensure_ascii=False, default=str)
+
+
+def read_features(csv_path, **kwargs):
+	"""
+	read a feature matrix, from the binary store if there is an up-to-date one, otherwise from the csv file
+	returns a DataFrame like pd.read_csv(csv_path, index_col=0)
+
+	Arguments, positional:
+	csv_path (str): path to the feature csv file
+
+	Arguments, keywords:
+	mmap (bool): whether to memory-map the values instead of reading them into memory (read-only). Default: False
+	"""
+	mmap = kwargs.get("mmap", False)
+
+	if not has_store(csv_path):
+		return pd.read_csv(csv_path, index_col=0)
+
+	npy_path, json_path = get_store_paths(csv_path)
+
+	data = np.load(npy_path, mmap_mode="r" if mmap else None)
+	with open(json_path, "r", encoding="UTF-8") as infile:
+		labels = json.load(infile)
+
+	index = pd.Index(labels["index"], name=labels["index_name"])
+	frame = pd.DataFrame(data, index=index, columns=labels["columns"])
+
+	return frame
+
+
+def convert_feature_dir(wdir, feature_dir, **kwargs):
+	"""
+	convert all the feature csv files in a directory tree to the binary format (one-off)
+	csv files that are not numeric feature matrices (e.g. vocabulary files) are skipped
+
+	Arguments, positional:
+	wdir (str): path to the working directory
+	feature_dir (str): relative path to the feature directory, e.g. "data-nh/analysis/features"
+
+	Arguments, keywords:
+	overwrite (bool): whether to convert files that already have an up-to-date store. Default: False
+	"""
+	print("converting feature files in " + feature_dir + "...")
+
+	overwrite = kwargs.get("overwrite", False)
+
+	num_converted = 0
+	for csv_path in sorted(glob.glob(join(wdir, feature_dir, "**", "*.csv"), recursive=True)):
+		if has_store(csv_path) and not overwrite:
+			continue
+
+		try:
+			frame = pd.read_csv(csv_path, index_col=0)
+			write_features(frame, csv_path)
+			num_converted += 1
+		except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+			print("skipping " + csv_path + ": " + str(e))
+
+	print("done: converted " + str(num_converted) + " files")
+
+
+
+def set_cache_budget(max_bytes):
+	"""
+	set the memory budget of the in-process cache, evicting the least recently used frames if needed
+
+	Arguments:
+	max_bytes (int): maximum number of bytes for the cached frames, e.g. 4 * 1024 ** 3 for 4 GB
+	"""
+	cache_state["max_bytes"] = max_bytes
+	evict_frames()
+
+
+def clear_cache():
+	"""
+	empty the in-process cache
+	"""
+	frame_cache.clear()
+	cache_state.update({"bytes": 0, "hits": 0, "misses": 0})
+
+
+def evict_frames():
+	"""
+	remove the least recently used frames from the cache until it fits into the memory budget
+	"""
+	while cache_state["bytes"] > cache_state["max_bytes"] and len(frame_cache) > 0:
+		key, (frame, num_bytes) = frame_cache.popitem(last=False)
+		cache_state["bytes"] -= num_bytes
+
+
+def get_cached(kind, path, load):
+	"""
+	get a parsed file from the in-process cache, or load it and add it to the cache
+	the key is the resolved path together with the modification times of the file (and its binary store),
+	so changed files are parsed again
+
+	Arguments:
+	kind (str): kind of file, to keep different parsings of the same file apart, e.g. "features" or "csv"
+	path (str): path to the file
+	load (function): function to parse the file, called with the path
+	"""
+	mtimes = tuple(getmtime(p) for p in (path,) + get_store_paths(path) if isfile(p))
+	key = (kind, realpath(path), mtimes)
+
+	if key in frame_cache:
+		frame_cache.move_to_end(key)
+		cache_state["hits"] += 1
+		return frame_cache[key][0]
+
+	cache_state["misses"] += 1
+	frame = load(path)
+	num_bytes = int(frame.memory_usage(index=True, deep=True).sum())
+
+	frame_cache[key] = (frame, num_bytes)
+	cache_state["bytes"] += num_bytes
+	evict_frames()
+
+	return frame
+
+
+def read_features_cached(csv_path):
+	"""
+	read a feature matrix (see read_features) at most once per run, using the in-process cache
+	the returned frame is shared between the callers and should not be modified
+
+	Arguments:
+	csv_path (str): path to the feature csv file
+	"""
+	return get_cached("features", csv_path, read_features)
+
+
+def read_csv_cached(csv_path):
+	"""
+	read a csv file with an index column (e.g. a metadata file) at most once per run, using the in-process cache
+	the returned frame is shared between the callers and should not be modified
+
+	Arguments:
+	csv_path (str): path to the csv file
+	"""
+	return get_cached("csv", csv_path, lambda p: pd.read_csv(p, index_col=0))
+
+
+
+#### call functions ####
+
+#convert_feature_dir("/home/ulrike/Git/", "data-nh/analysis/features")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Filename: figure_renderer.py
+
+"""
+@author: Ulrike Henny-Krahmer
+
+Serves to export plotly figures (png, svg, etc. via kaleido, and html) for the analysis scripts.
+
+Instead of fig.write_image(path) and fig.write_html(path), the scripts call write_image(fig, path) and write_html(fig, path).
+- If a pool of renderers has been started (start_renderers), the static images are queued and rendered by the worker processes,
+each of which keeps its kaleido process running for all the figures it renders. Otherwise they are rendered directly.
+- The html files refer to a shared copy of plotly.js (the CDN by default, or a local file) instead of embedding the whole library.
+- A figure is not rendered again if the file exists and the figure has not changed since it was last written: a hash of the
+figure specification and the export options is kept for each output file in a .figure_hashes.json file in the output directory.
+
+Example:
+figure_renderer.start_renderers(4)
+for ...:
+	figure_renderer.write_image(fig, "plot.png", scale=2)
+	figure_renderer.write_html(fig, "plot.html")
+figure_renderer.wait_renderers()
+"""
+
+from os.path import join
+from os.path import isfile
+from os.path import dirname
+from os.path import basename
+from os.path import abspath
+from os.path import relpath
+from os import replace
+from multiprocessing import Pool
+import hashlib
+import json
+import plotly.io as pio
+import plotly.graph_objects as go
+
+
+# path to the local copy of plotly.js in this repository
+local_plotlyjs = abspath(join(dirname(__file__), "..", "plotly", "plotly-latest.min.js"))
+
+# settings and state of the renderers
+render_state = {"include_plotlyjs": "cdn", "skip_unchanged": True, "pool": None, "pending": [], "rendered": 0, "skipped": 0}
+
+# hashes of the figures written: output directory -> {file name: hash}
+figure_hashes = {}
+
+
+
+def warm_up_renderer():
+	"""
+	start the kaleido process of a renderer by rendering an empty figure
+	(the process is kept running and reused for all the following figures)
+	"""
+	try:
+		import kaleido
+		# kaleido >= 1.0 starts a browser for each rendering unless a server is started
+		if hasattr(kaleido, "start_sync_server"):
+			kaleido.start_sync_server(silence_warnings=True)
+	except ImportError:
+		pass
+	pio.to_image(go.Figure(), format="png", width=10, height=10)
+
+
+def render_image(fig_json, path, options):
+	"""
+	render a figure to a static image file (in a worker process or directly)
+	the file is written under a temporary name first, so that an interrupted rendering does not leave a partial file
+
+	Arguments:
+	fig_json (str): the figure, as json
+	path (str): path to the output file (the format is taken from the extension)
+	options (dict): further arguments for plotly.io.write_image, e.g. {"scale": 2}
+	"""
+	fig = pio.from_json(fig_json)
+	image_format = path.rsplit(".", 1)[-1]
+	pio.write_image(fig, path + ".tmp", format=image_format, **options)
+	replace(path + ".tmp", path)
+	return path
+
+
+def start_renderers(processes=None, **kwargs):
+	"""
+	start a pool of worker processes to render the static images
+
+	Arguments, positional:
+	processes (int): number of worker processes, default: number of cpus
+
+	Arguments, keywords:
+	include_plotlyjs (str): how the html files refer to plotly.js: "cdn", "local" (the copy in this repository, referenced by
+	a relative path), "directory" (a plotly.min.js file in the output directory) or a path or url to a plotly.js file. Default: "cdn"
+	skip_unchanged (bool): whether to skip figures that have not changed since they were last written. Default: True
+	"""
+	set_options(**kwargs)
+	if render_state["pool"] is None:
+		render_state["pool"] = Pool(processes, initializer=warm_up_renderer)
+
+
+def set_options(**kwargs):
+	"""
+	set the options of the renderers (see start_renderers)
+	"""
+	for option in ["include_plotlyjs", "skip_unchanged"]:
+		if option in kwargs:
+			render_state[option] = kwargs[option]
+
+
+def wait_renderers():
+	"""
+	wait until all the queued images are rendered and store the hashes of the figures
+	"""
+	pending = render_state["pending"]
+	render_state["pending"] = []
+
+	for result, path, fig_hash in pending:
+		result.get()
+		set_figure_hash(path, fig_hash)
+
+	save_figure_hashes()
+
+
+def stop_renderers():
+	"""
+	wait for the queued images and stop the pool of renderers
+	"""
+	wait_renderers()
+	if render_state["pool"] is not None:
+		render_state["pool"].close()
+		render_state["pool"].join()
+		render_state["pool"] = None
+	print("figures rendered: " + str(render_state["rendered"]) + ", unchanged and skipped: " + str(render_state["skipped"]))
+
+
+def get_hash_file(path):
+	"""
+	get the path of the file containing the figure hashes of the directory of an output file
+
+	Arguments:
+	path (str): path to the output file
+	"""
+	return join(dirname(abspath(path)), ".figure_hashes.json")
+
+
+def get_figure_hashes(path):
+	"""
+	get the figure hashes of the directory of an output file (loaded once per directory)
+
+	Arguments:
+	path (str): path to the output file
+	"""
+	hash_file = get_hash_file(path)
+	if hash_file not in figure_hashes:
+		if isfile(hash_file):
+			with open(hash_file, "r", encoding="UTF-8") as infile:
+				figure_hashes[hash_file] = json.load(infile)
+		else:
+			figure_hashes[hash_file] = {}
+	return figure_hashes[hash_file]
+
+
+def set_figure_hash(path, fig_hash):
+	"""
+	record the hash of the figure that was written to an output file
+
+	Arguments:
+	path (str): path to the output file
+	fig_hash (str): hash of the figure and export options
+	"""
+	get_figure_hashes(path)[basename(path)] = fig_hash
+
+
+def save_figure_hashes(path=None):
+	"""
+	write the figure hashes to the .figure_hashes.json files of the output directories
+
+	Arguments:
+	path (str): optional, path to an output file, to write only the hashes of its directory. Default: all directories
+	"""
+	hash_files = list(figure_hashes.keys()) if path is None else [get_hash_file(path)]
+	for hash_file in hash_files:
+		hashes = figure_hashes[hash_file]
+		with open(hash_file + ".tmp", "w", encoding="UTF-8") as outfile:
+			json.dump(hashes, outfile, ensure_ascii=False, indent=0, sort_keys=True)
+		replace(hash_file + ".tmp", hash_file)
+
+
+def get_figure_hash(fig_json, path, options):
+	"""
+	get the hash of a figure specification together with the output format and export options
+
+	Arguments:
+	fig_json (str): the figure, as json
+	path (str): path to the output file
+	options (dict): export options
+	"""
+	spec = fig_json + "\n" + path.rsplit(".", 1)[-1] + "\n" + json.dumps(options, sort_keys=True, default=str)
+	return hashlib.sha1(spec.encode("utf-8")).hexdigest()
+
+
+def is_unchanged(path, fig_hash):
+	"""
+	check whether an output file exists and was written from the same figure and export options
+
+	Arguments:
+	path (str): path to the output file
+	fig_hash (str): hash of the figure and export options
+	"""
+	if not render_state["skip_unchanged"] or not isfile(path):
+		return False
+	return get_figure_hashes(path).get(basename(path)) == fig_hash
+
+
+def write_image(fig, path, **kwargs):
+	"""
+	write a figure to a static image file (png, svg, pdf, etc.), like fig.write_image(path, **kwargs)
+	if a pool of renderers has been started, the image is queued (see wait_renderers)
+
+	Arguments, positional:
+	fig (Figure): the plotly figure
+	path (str): path to the output file
+
+	Arguments, keywords:
+	further arguments for plotly.io.write_image, e.g. scale=2
+	"""
+	fig_json = fig.to_json()
+	fig_hash = get_figure_hash(fig_json, path, kwargs)
+
+	if is_unchanged(path, fig_hash):
+		render_state["skipped"] += 1
+		return
+
+	render_state["rendered"] += 1
+	if render_state["pool"] is not None:
+		result = render_state["pool"].apply_async(render_image, (fig_json, path, kwargs))
+		render_state["pending"].append((result, path, fig_hash))
+	else:
+		render_image(fig_json, path, kwargs)
+		set_figure_hash(path, fig_hash)
+		save_figure_hashes(path)
+
+
+def write_html(fig, path, **kwargs):
+	"""
+	write a figure to an html file, like fig.write_html(path, **kwargs), referring to a shared plotly.js (see start_renderers)
+
+	Arguments, positional:
+	fig (Figure): the plotly figure
+	path (str): path to the output file
+
+	Arguments, keywords:
+	further arguments for plotly.io.write_html
+	"""
+	include_plotlyjs = kwargs.pop("include_plotlyjs", render_state["include_plotlyjs"])
+	if include_plotlyjs == "local":
+		include_plotlyjs = relpath(local_plotlyjs, dirname(abspath(path)))
+
+	fig_json = fig.to_json()
+	fig_hash = get_figure_hash(fig_json, path, dict(kwargs, include_plotlyjs=include_plotlyjs))
+
+	if is_unchanged(path, fig_hash):
+		render_state["skipped"] += 1
+		return
+
+	render_state["rendered"] += 1
+	pio.write_html(fig, path, include_plotlyjs=include_plotlyjs, **kwargs)
+	set_figure_hash(path, fig_hash)
+	if render_state["pool"] is None:
+		save_figure_hashes(path)
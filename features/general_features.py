@@ -15,10 +15,85 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import re
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+from scipy import sparse
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.feature_extraction.text import TfidfTransformer
 import csv
+import hashlib
 
+import feature_store
+import figure_renderer
+
+
+
+# stopword filters, by hash of the stopword file
+stopword_filters = {}
+
+
+def get_stopword_filter(stopwords_file):
+	"""
+	read a stopword file and prepare the stopwords for remove_stopwords
+	
+	For each stopword, the regular expression r"\b" + stopword + r"\b" is compiled once.
+	Stopwords that are plain words or phrases (without regex syntax, starting and ending with a word character)
+	also get the set of their words, so that they can be skipped for texts which do not contain all of them.
+	The filters are cached by the hash of the stopword file.
+	
+	Arguments:
+	stopwords_file (str): path to a file with a list of stopwords
+	
+	Returns a list of tuples (compiled regex, set of words or None).
+	"""
+	with open(stopwords_file, "rb") as infile:
+		file_hash = hashlib.sha1(infile.read()).hexdigest()
+	
+	if file_hash not in stopword_filters:
+		stopwords = pd.read_csv(stopwords_file, header=None)
+		stopwords = stopwords.iloc[:,0].tolist()
+		
+		stopword_filter = []
+		for st in stopwords:
+			st = str(st)
+			st_regex = re.compile(r"\b" + st + r"\b")
+			st_words = None
+			if re.fullmatch(r"\w([^.^$*+?{}\[\]\\|()]*\w)?", st) is not None:
+				st_words = frozenset(re.findall(r"\w+", st))
+			stopword_filter.append((st_regex, st_words))
+			
+		stopword_filters[file_hash] = stopword_filter
+	
+	return stopword_filters[file_hash]
+
+
+def remove_stopwords(text, stopword_filter, replacement):
+	"""
+	remove stopwords from a text
+	
+	The result is the same as applying re.sub(r"\b" + stopword + r"\b", replacement, text) for each stopword in turn,
+	but plain stopwords are only applied if all of their words occur in the text.
+	
+	Arguments:
+	text (str): the text
+	stopword_filter (list): the result of get_stopword_filter
+	replacement (str): replacement string for the stopwords, e.g. "" or " "
+	
+	Returns the text without stopwords.
+	"""
+	text_words = set(re.findall(r"\w+", text))
+	
+	for st_regex, st_words in stopword_filter:
+		if st_words is None:
+			text, num_subs = st_regex.subn(replacement, text)
+			# other stopwords may match now (e.g. after removing a hyphen between two words)
+			if num_subs > 0:
+				text_words = set(re.findall(r"\w+", text))
+		elif st_words <= text_words:
+			text = st_regex.sub(replacement, text)
+			
+	return text
 
 
 def create_ngram_feature_set(wdir, ngram, ngram_types, mfw, outfile):
@@ -61,10 +136,67 @@ def create_ngram_feature_set(wdir, ngram, ngram_types, mfw, outfile):
 	print("done")
 
 
+def get_vocab_index(vocab):
+	"""
+	prepare a vocabulary for counting with get_item_counts:
+	collect the lengths of the items and the items that can overlap with themselves (e.g. "aaa" or "a a")
+	
+	Arguments:
+	vocab (list): list of vocabulary items (strings)
+	
+	Returns a tuple (lengths, self_overlapping) with a set of item lengths and a set of self-overlapping items.
+	"""
+	lengths = set()
+	self_overlapping = set()
+	
+	for w in vocab:
+		lengths.add(len(w))
+		# a proper prefix that is also a suffix, or the empty string
+		if len(w) == 0 or any(w[:i] == w[-i:] for i in range(1, len(w))):
+			self_overlapping.add(w)
+			
+	return lengths, self_overlapping
+	
+
+def get_item_counts(text, vocab, vocab_index):
+	"""
+	count how often each item of a vocabulary occurs in a text, scanning the text once per item length
+	
+	The counts are the same as with re.findall(re.escape(w), text), that is, non-overlapping occurrences.
+	Items that can overlap with themselves are counted with str.count, which has the same semantics.
+	
+	Arguments:
+	text (str): the text
+	vocab (list): list of vocabulary items (strings)
+	vocab_index (tuple): the result of get_vocab_index for the vocabulary
+	
+	Returns a list of counts in the order of the vocabulary.
+	"""
+	lengths, self_overlapping = vocab_index
+	
+	# all (overlapping) substrings of the relevant lengths
+	ngram_counts = {}
+	for n in lengths:
+		if n > 0:
+			ngram_counts[n] = Counter(text[i:i+n] for i in range(len(text) - n + 1))
+	
+	counts = []
+	for w in vocab:
+		if w in self_overlapping:
+			counts.append(text.count(w))
+		else:
+			counts.append(ngram_counts[len(w)].get(w, 0))
+			
+	return counts
+
+
 def count_vocab(wdir, inpath, stopwords, vocab, outfile):
 	"""
 	use a predefined vocabulary and count how often each token occurs in a collection of texts
 	
+	Each text is scanned once for all the vocabulary items, the counts are kept in a sparse matrix
+	and the output file is written once at the end.
+	
 	Arguments:
 	wdir (str): path to the working directory
 	inpath (str): relative path to the input directory
@@ -75,101 +207,179 @@ def count_vocab(wdir, inpath, stopwords, vocab, outfile):
 	print("counting vocabulary...")
 	
 	# get stopwords
-	stopwords = pd.read_csv(join(wdir, stopwords), header=None)
-	stopwords = stopwords.iloc[:,0].tolist()
+	stopword_filter = get_stopword_filter(join(wdir, stopwords))
 	
 	# get vocabulary
 	vocab = pd.read_csv(join(wdir, vocab), header=None)
 	vocab = vocab.iloc[:,0].tolist()
+	vocab_items = [str(w) for w in vocab]
+	vocab_index = get_vocab_index(vocab_items)
+	print(len(vocab))
 	
-
-	
-	# create data frame for results
 	# get idnos
-	idnos = [f[-10:-4] for f in glob.glob(join(wdir, inpath, "*.txt"))]
-	idnos = sorted(idnos)
-	bow = pd.DataFrame(index=idnos,columns=vocab)
-	bow.to_csv(join(wdir, outfile))
-	
+	filepaths = sorted(glob.glob(join(wdir, inpath, "*.txt")), key=lambda f: f[-10:-4])
+	idnos = [f[-10:-4] for f in filepaths]
 	
+	# collect the counts as a sparse matrix (documents x vocabulary)
+	rows = []
+	cols = []
+	data = []
 	
 	# read the documents
-	for filepath in glob.glob(join(wdir, inpath, "*.txt")):
+	for row, filepath in enumerate(filepaths):
 		filename = filepath[-10:]
-		idno = filename[:-4]
 		print("doing " + filename + "...")
 		
-		# read data frame for results
-		bow = pd.read_csv(join(wdir, outfile), index_col=0)
-		
 		with open(filepath, "r", encoding="UTF-8") as infile:
 			text = infile.read()
 			# convert to lower case
 			text = text.lower()
 			
 			# remove stopwords
-			for st in stopwords:
-				text = re.sub(r"\b" + st + r"\b", "", text)
+			text = remove_stopwords(text, stopword_filter, "")
 				
 			# count: how often does each item from the vocabulary occur in the text?
-			print(len(vocab))
-			for w in vocab:
-				w_esc = re.escape(str(w))
-				results = re.findall(w_esc, text)
-				num_w = len(results)
-				
-				# store result in frame
-				bow.loc[idno,w] = num_w
+			counts = get_item_counts(text, vocab_items, vocab_index)
+			for col, num_w in enumerate(counts):
+				if num_w > 0:
+					rows.append(row)
+					cols.append(col)
+					data.append(num_w)
 	
-		# store bow file
-		bow.to_csv(join(wdir, outfile),columns=vocab)
-		
+	bow = sparse.csr_matrix((data, (rows, cols)), shape=(len(idnos), len(vocab)), dtype=np.int64)
+	
+	# store bow file
+	bow = pd.DataFrame(bow.toarray(), index=idnos, columns=vocab)
+	bow.to_csv(join(wdir, outfile), columns=vocab)
 	
 	print("done")
 
 
-def create_vocabulary(wdir, inpath, stopwords, outfile):
+def get_words(filepath, stopwords):
+	"""
+	get the set of words of a full text file, without stopwords
+	
+	Arguments:
+	filepath (str): path to the full text file
+	stopwords (list): list of stopwords
+	
+	Returns a set of words.
+	"""
+	with open(filepath, "r", encoding="UTF-8") as infile:
+		text = infile.read()
+		# convert to lower case
+		text = text.lower()
+		
+		# get set of words and remove stopwords
+		words = set(re.findall(r"\b\w+\b", text))
+		words = words - set(stopwords)
+		
+	return words
+
+
+def create_vocabulary(wdir, inpath, stopwords, outfile, **kwargs):
 	"""
 	create the vocabulary of the entire text corpus
 	store it in a csv file, as an ordered set of words
 	
-	Arguments:
+	The documents are processed in parallel and the vocabularies of the documents are merged at the end.
+	
+	Arguments, positional:
 	wdir (str): path to the working directory
 	inpath (str): relative path to the input directory
+	stopwords (str): relative path to a file with a list of stopwords
 	outfile (str): relative path to the output file for the vocabulary
+	
+	Arguments, keywords:
+	processes (int): number of worker processes, defaults to the number of cores
 	"""
 	print("creating vocabulary...")
 	
-	all_words = []
+	processes = kwargs.get("processes", None)
 	
 	# get stopwords
 	stopwords = pd.read_csv(join(wdir, stopwords), header=None)
 	stopwords = stopwords.iloc[:,0].tolist()
 	
 	# check the tokens of each document
-	for filepath in glob.glob(join(wdir, inpath, "*.txt")):
-		filename = filepath[-10:]
-		
-		with open(filepath, "r", encoding="UTF-8") as infile:
-			text = infile.read()
-			# convert to lower case
-			text = text.lower()
-			
-			# get set of words and remove stopwords
-			words = re.findall(r"\b\w+\b", text)
-			words = set(words) - set(stopwords)
-			
-			# append to overall word list
-			for w in words:
-				if w not in all_words:
-					all_words.append(w)
-			
-	all_words = pd.DataFrame(all_words).sort_values(by=0)
+	filepaths = sorted(glob.glob(join(wdir, inpath, "*.txt")))
+	with Pool(processes) as pool:
+		doc_words = pool.map(partial(get_words, stopwords=stopwords), filepaths)
+	
+	all_words = set().union(*doc_words)
+	
+	all_words = pd.DataFrame(sorted(all_words))
 	all_words.to_csv(join(wdir, outfile), header=False, index=False)
 	
 	print("done")
 
 
+def get_ngram_regex(ngram, ngram_type):
+	"""
+	get the regular expressions for multi-word and end-punct character ngrams
+	
+	The first expression finds all the start positions of matching ngram windows of the full length in one pass.
+	The second one checks the shorter windows at the end of a text.
+	
+	Arguments:
+	ngram (int): type of ngram, e.g. "2" for 2-grams
+	ngram_type (str): type of ngram, "multi-word" or "end-punct"
+	
+	Returns a tuple of two compiled regular expressions.
+	"""
+	# windows of exactly ngram characters, optionally ending in the newline accepted by "$"
+	if ngram_type == "multi-word":
+		window_regex = r"^\w+\b\s\b\w+$"
+		alternatives = [r"\w{%d}\s\w{%d}" % (i, ngram - 1 - i) for i in range(1, ngram - 1)]
+		alternatives += [r"\w{%d}\s\w{%d}\n" % (i, ngram - 2 - i) for i in range(1, ngram - 2)]
+	elif ngram_type == "end-punct":
+		window_regex = r"^\w+[,.!?:;»”]$"
+		alternatives = [r"\w{%d}[,.!?:;»”]" % (ngram - 1)] if ngram > 1 else []
+		alternatives += [r"\w{%d}[,.!?:;»”]\n" % (ngram - 2)] if ngram > 2 else []
+	
+	# the ngram is too short for the type: never match
+	if len(alternatives) == 0:
+		alternatives = [r"(?!)"]
+	
+	ngram_regex = re.compile(r"(?=(?:" + "|".join(alternatives) + r"))")
+	
+	return ngram_regex, re.compile(window_regex)
+	
+
+def get_text_ngrams(filepath, ngram, ngram_type, stopword_filter):
+	"""
+	get the set of multi-word or end-punct character ngrams of a full text file
+	
+	Arguments:
+	filepath (str): path to the full text file
+	ngram (int): type of ngram, e.g. "2" for 2-grams
+	ngram_type (str): type of ngram, "multi-word" or "end-punct"
+	stopword_filter (list): stopwords to remove from the full text before processing it further, see get_stopword_filter
+	
+	Returns a set of ngrams.
+	"""
+	ngram_regex, window_regex = get_ngram_regex(ngram, ngram_type)
+	
+	with open(filepath, "r", encoding="UTF-8") as infile:
+		text = infile.read()
+		# convert to lower case
+		text = text.lower()
+		
+		# remove stopwords
+		text = remove_stopwords(text, stopword_filter, "")
+		
+		# go through the text and create ngrams
+		ngrams = {text[m.start():m.start() + ngram] for m in ngram_regex.finditer(text)}
+		
+		# the last windows of the text are shorter than ngram
+		for i in range(max(len(text) - ngram + 1, 0), len(text)):
+			ngram_cand = text[i:]
+			if window_regex.match(ngram_cand) is not None:
+				ngrams.add(ngram_cand)
+				
+	return ngrams
+
+
 def create_ngram_vocab(wdir, ngram, ngram_type, outfile, **kwargs):
 	"""
 	create a vocabulary of character ngrams
@@ -196,6 +406,7 @@ def create_ngram_vocab(wdir, ngram, ngram_type, outfile, **kwargs):
 	inpath (str): relative path to the input directory containing the full text files
 	stopwords (str): relative path to a file with a list of stopwords to remove from the full texts before processing them further
 	vocab (str): relative path to the vocabulary used for the creation of word-based ngrams
+	processes (int): number of worker processes for multi-word and end-punct ngrams, defaults to the number of cores
 	"""
 	
 	print("creating n-ngram vocabulary...")
@@ -203,13 +414,12 @@ def create_ngram_vocab(wdir, ngram, ngram_type, outfile, **kwargs):
 	inpath = kwargs.get("inpath", None)
 	stopwords = kwargs.get("stopwords", None)
 	vocab = kwargs.get("vocab", None)
+	processes = kwargs.get("processes", None)
 	
-	all_ngrams = []
+	all_ngrams = set()
 	
 	# create word-based ngram types
 	min_length = 0
-	w_range = 0
-	start_pos = 0
 	
 	if ngram_type == "mid-word" or ngram_type == "prefix":
 
@@ -231,10 +441,7 @@ def create_ngram_vocab(wdir, ngram, ngram_type, outfile, **kwargs):
 			
 			# prefix: just on ngram per word
 			if ngram_type == "prefix":
-				ngram_token = w[:ngram]
-				
-				if ngram_token not in all_ngrams:
-					all_ngrams.append(ngram_token)
+				all_ngrams.add(w[:ngram])
 				
 			elif ngram_type == "mid-word":
 				# part of the word that can be used:
@@ -246,10 +453,7 @@ def create_ngram_vocab(wdir, ngram, ngram_type, outfile, **kwargs):
 				for i in range(ngram_range):
 					start_pos = i + 1
 					end_pos = start_pos + ngram
-					ngram_token = w[start_pos:end_pos]
-					
-					if ngram_token not in all_ngrams:
-						all_ngrams.append(ngram_token)
+					all_ngrams.add(w[start_pos:end_pos])
 
 		
 	# create multi-word and end-punct ngrams
@@ -259,40 +463,18 @@ def create_ngram_vocab(wdir, ngram, ngram_type, outfile, **kwargs):
 		print(ngram_type + "...")
 		
 		# get stopwords
-		stopwords = pd.read_csv(join(wdir, stopwords), header=None)
-		stopwords = stopwords.iloc[:,0].tolist()
+		stopword_filter = get_stopword_filter(join(wdir, stopwords))
 		
 		# check the tokens of each document
-		for filepath in glob.glob(join(wdir, inpath, "*.txt")):
-			filename = filepath[-10:]
-		
-			with open(filepath, "r", encoding="UTF-8") as infile:
-				text = infile.read()
-				# convert to lower case
-				text = text.lower()
-				
-				# remove stopwords
-				for st in stopwords:
-					text = re.sub(r"\b" + st + r"\b", "", text)
-				
-				# go through the text and create ngrams
-				for i in range(len(text)):
-					ngram_cand = text[i:i+ngram]
-				
-					if ngram_type == "multi-word":
-						ngram_regex = r"^\w+\b\s\b\w+$"
-					elif ngram_type == "end-punct":
-						ngram_regex = r"^\w+[,.!?:;»”]$"
-						
-					if re.match(ngram_regex, ngram_cand) is not None:
-						ngram_token = ngram_cand
-					
-						if ngram_token not in all_ngrams:
-							all_ngrams.append(ngram_token)
+		filepaths = sorted(glob.glob(join(wdir, inpath, "*.txt")))
+		with Pool(processes) as pool:
+			doc_ngrams = pool.map(partial(get_text_ngrams, ngram=ngram, ngram_type=ngram_type, stopword_filter=stopword_filter), filepaths)
+			
+		all_ngrams = all_ngrams.union(*doc_ngrams)
 					
 	
 	# save resulting ngram vocabulary
-	all_ngrams = pd.DataFrame(all_ngrams).sort_values(by=0)
+	all_ngrams = pd.DataFrame(sorted(all_ngrams))
 	all_ngrams.to_csv(join(wdir, outfile), header=False, index=False)
 	
 	print("done")
@@ -317,32 +499,42 @@ def prepare_fulltexts(wdir, inpath, outpath, **kwargs):
 	print("cleaning annotated full text files...")
 	
 	stopwords_file = kwargs.get("stopwords_file", None)
-	stopwords = None
+	stopword_filter = None
 	if stopwords_file is not None:
-		stopwords = pd.read_csv(join(wdir, stopwords_file), header=None)
-		stopwords = stopwords.iloc[:,0].tolist()
+		stopword_filter = get_stopword_filter(join(wdir, stopwords_file))
 	
-	# remove spaces between words and punctuation marks
 	for filepath in glob.glob(join(wdir, inpath, "*.txt")):
 		filename = filepath[-10:]
 		print("doing " + filename + "...")
-		with open(filepath, "r", encoding="UTF-8") as infile:
-			text = infile.read()
-			text = re.sub(r"\s+([,\.!?:;»”])", r"\1", text)
-			text = re.sub(r"([¿¡«“])\s+", r"\1", text)
-			text = re.sub(r"_", r" ", text)
-			# convert to lower case
-			text = text.lower()
-			# remove stop words if requested
-			if stopwords is not None:
-				for st in stopwords:
-					text = re.sub(r"\b" + st + r"\b", " ", text)
-			with open(join(wdir, outpath, filename), "w", encoding="UTF-8") as outfile:
-				outfile.write(text)
+		prepare_fulltext(filepath, join(wdir, outpath, filename), stopword_filter)
 	
 	print("done")
 
 
+def prepare_fulltext(filepath, outfile_path, stopword_filter=None):
+	"""
+	prepare one annotated full text file (see prepare_fulltexts)
+	
+	Arguments:
+	filepath (str): path to the input file
+	outfile_path (str): path to the output file
+	stopword_filter (list): stopwords to remove (the result of get_stopword_filter), or None
+	"""
+	# remove spaces between words and punctuation marks
+	with open(filepath, "r", encoding="UTF-8") as infile:
+		text = infile.read()
+		text = re.sub(r"\s+([,\.!?:;»”])", r"\1", text)
+		text = re.sub(r"([¿¡«“])\s+", r"\1", text)
+		text = re.sub(r"_", r" ", text)
+		# convert to lower case
+		text = text.lower()
+		# remove stop words if requested
+		if stopword_filter is not None:
+			text = remove_stopwords(text, stopword_filter, " ")
+		with open(outfile_path, "w", encoding="UTF-8") as outfile:
+			outfile.write(text)
+
+
 def get_mfw(wdir, features, token_start, token_range):
 	"""
 	get the most frequent tokens of a certain type
@@ -357,7 +549,7 @@ def get_mfw(wdir, features, token_start, token_range):
 	print("get mfw" + str(token_start) + "-" + str(token_start + token_range - 1) + "...")
 	
 	
-	features = pd.read_csv(join(wdir, features), index_col=0)
+	features = feature_store.read_features(join(wdir, features))
 	# sum the counts for each feature
 	sums = features.sum().sort_values(ascending=False)
 	# get requested token range
@@ -379,7 +571,7 @@ def plot_variances(wdir, features, outfile):
 	"""
 	print("plot variances...")
 	
-	features = pd.read_csv(join(wdir, features), index_col=0)
+	features = feature_store.read_features(join(wdir, features))
 	
 	# get the variance for each feature
 	stds = features.std(axis=0) #.apply(np.log)
@@ -389,12 +581,13 @@ def plot_variances(wdir, features, outfile):
 	
 	fig.update_layout(autosize=False, width=800, height=500, title="Variances in feature set", xaxis_title="variance", yaxis_title="number of features")
 
-	fig.write_image(join(wdir, outfile + "_hist.png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outfile + "_hist.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outfile + "_hist.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outfile + "_hist.html"))
 	
 	
 	#fig.show()
 	
+	figure_renderer.wait_renderers()
 	print("done: plot variances")
 
 
@@ -427,7 +620,7 @@ def plot_zero_values_bar(wdir, feature_dir, mfws, token_unit, outfile):
 	
 	# collect zero and non-zero values for all mfws
 	for mfw in mfws:
-		features = pd.read_csv(join(wdir, feature_dir, "bow_mfw" + str(mfw) + token_unit + ".csv"), index_col=0)
+		features = feature_store.read_features(join(wdir, feature_dir, "bow_mfw" + str(mfw) + token_unit + ".csv"))
 	
 		# get number of zero values for each column
 		x = []
@@ -462,8 +655,8 @@ def plot_zero_values_bar(wdir, feature_dir, mfws, token_unit, outfile):
 	fig.update_xaxes(type='category', title="mfw")
 	fig.update_yaxes(title="value counts (relative)")
 	
-	fig.write_image(join(wdir, outfile + "_abs_bar.png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outfile + "_abs_bar.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outfile + "_abs_bar.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outfile + "_abs_bar.html"))
 	
 	print("plot with relative values...")
 	# relative to value counts
@@ -475,11 +668,12 @@ def plot_zero_values_bar(wdir, feature_dir, mfws, token_unit, outfile):
 	fig2.update_xaxes(type='category', title="mfw")
 	fig2.update_yaxes(title="value counts (relative)")
 	
-	fig2.write_image(join(wdir, outfile + "_rel_bar.png")) # scale=2 (increase physical resolution)
-	fig2.write_html(join(wdir, outfile + "_rel_bar.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig2, join(wdir, outfile + "_rel_bar.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig2, join(wdir, outfile + "_rel_bar.html"))
 	
 	#fig2.show()
 
+	figure_renderer.wait_renderers()
 	print("done: plot zero values")
 	
 
@@ -495,7 +689,7 @@ def plot_zero_values(wdir, features, outfile):
 	"""
 	print("plot zero values ...")
 	
-	features = pd.read_csv(join(wdir, features), index_col=0)
+	features = feature_store.read_features(join(wdir, features))
 	
 	# get number of zero values for each column
 	x = []
@@ -516,17 +710,18 @@ def plot_zero_values(wdir, features, outfile):
 	
 	fig.update_layout(autosize=False, width=800, height=500, title="Zero values in feature set", xaxis_title="number of times a feature is zero", yaxis_title="number of features")
 
-	fig.write_image(join(wdir, outfile + "_hist.png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outfile + "_hist.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outfile + "_hist.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outfile + "_hist.html"))
 	
 	fig2 = go.Figure(data=[go.Pie(labels=["zero","non-zero"], values=[zero_count,value_count - zero_count], hole=0.4, direction="clockwise")])
 	fig2.update_layout(autosize=False, width=500, height=400, title="Zero values in feature set")
 	
-	fig2.write_image(join(wdir, outfile + "_pie.png")) # scale=2 (increase physical resolution)
-	fig2.write_html(join(wdir, outfile + "_pie.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig2, join(wdir, outfile + "_pie.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig2, join(wdir, outfile + "_pie.html"))
 	
 	#fig.show()
 	
+	figure_renderer.wait_renderers()
 	print("done: plot zero values")
 	
 
@@ -541,7 +736,7 @@ def store_vocabulary(wdir, features, outfile):
 	outfile (str): relative path to the output file for the vocabulary
 	"""
 	
-	features = pd.read_csv(join(wdir, features), index_col=0)
+	features = feature_store.read_features(join(wdir, features))
 	vocab = list(features.columns)
 	vocab_fr = pd.DataFrame(data=vocab)
 	vocab_fr.to_csv(join(wdir, outfile), encoding="UTF-8", header=False, index=False)
@@ -629,15 +824,130 @@ def normalize_bow_model(wdir, bow_file, mode):
 
 
 
-def create_bow_model(wdir, corpusdir, outfile, **kwargs):
+def get_normalizations(counts, modes):
 	"""
-	Creates a bow model (a matrix of absolute token counts) from a collection of full text files.
+	Normalize a matrix of absolute counts in several ways at once, with float32 precision.
+	
+	The normalizations are the same as in normalize_bow_model.
+	
+	Arguments:
+	
+	counts (array): matrix of absolute counts (documents x features)
+	modes (list): how to normalize. Possible values: tf, tfidf, zscore
+	
+	Returns a dictionary with the normalized matrices, by mode.
+	"""
+	counts = np.asarray(counts, dtype=np.float32)
+	results = {}
+	
+	with np.errstate(divide="ignore", invalid="ignore"):
+		# tf: divide the counts of each document by its maximum count
+		rel_counts = counts / counts.max(axis=1, keepdims=True)
+		
+		if "tf" in modes:
+			results["tf"] = rel_counts
+		
+		# tf-idf: smoothed idf and l2 normalization of the documents, as in the TfidfTransformer
+		if "tfidf" in modes:
+			num_docs = counts.shape[0]
+			doc_freqs = np.count_nonzero(counts, axis=0)
+			idf = np.log((1 + num_docs) / (1 + doc_freqs)).astype(np.float32) + 1
+			tfidf = counts * idf
+			norms = np.sqrt((tfidf ** 2).sum(axis=1, keepdims=True))
+			norms[norms == 0] = 1
+			results["tfidf"] = tfidf / norms
+		
+		# zscore: (relative score - population mean) / population std
+		# (documents without any counts have no relative scores and are left out of the mean and std, as in pandas)
+		if "zscore" in modes:
+			means = np.nanmean(rel_counts, axis=0)
+			stds = np.nanstd(rel_counts, axis=0, ddof=1)
+			results["zscore"] = (rel_counts - means) / stds
+	
+	return results
+
+
+def get_minmax_scaling(data):
+	"""
+	Scale the features to [0,1], as the MinMaxScaler does (features with a range of 0 become 0).
+	
+	Arguments:
+	
+	data (array): feature matrix (documents x features)
+	
+	Returns the scaled matrix.
+	"""
+	data_min = np.nanmin(data, axis=0)
+	data_range = np.nanmax(data, axis=0) - data_min
+	data_range[data_range == 0] = 1
+	
+	return (data - data_min) / data_range
+
+
+def normalize_bow_file(wdir, bow_file, modes, minmax):
+	"""
+	Normalize the absolute counts of one bow file in several ways, see normalize_bow_models.
+	
+	Arguments:
+	
+	wdir (str): path to the working directory
+	bow_file (str): relative path to the bow file
+	modes (list): how to normalize. Possible values: tf, tfidf, zscore
+	minmax (bool): whether to store the normalized feature sets scaled to [0,1], too
+	"""
+	print("normalizing " + bow_file + "...")
+	
+	bow = pd.read_csv(join(wdir, bow_file), index_col=0)
+	
+	for mode, new_counts in get_normalizations(bow.to_numpy(), modes).items():
+		new_file = bow_file[:-4] + "_" + mode + ".csv"
+		new_frame = pd.DataFrame(new_counts, columns=bow.columns, index=bow.index)
+		new_frame.to_csv(join(wdir, new_file), sep=",", encoding="utf-8")
+		feature_store.write_features(new_frame, join(wdir, new_file))
+		
+		if minmax:
+			scaled_file = new_file[:-4] + "_MinMax.csv"
+			scaled_frame = pd.DataFrame(get_minmax_scaling(new_counts), columns=bow.columns, index=bow.index)
+			scaled_frame.to_csv(join(wdir, scaled_file))
+			feature_store.write_features(scaled_frame, join(wdir, scaled_file))
+
+
+def normalize_bow_models(wdir, bow_files, modes, **kwargs):
+	"""
+	Normalize the absolute counts of several bow models.
+	
+	Each bow file is read once and all the normalizations are computed from it (with float32 precision).
+	Optionally, the feature sets scaled to [0,1] for the SVM ("_MinMax", see scale_feature_sets in analysis/classification.py)
+	are stored as well. The files are processed in parallel.
+	
+	Arguments:
+	
+	wdir (str): path to the working directory
+	bow_files (list): relative paths to the bow files
+	modes (list): how to normalize. Possible values: tf, tfidf, zscore
+	
+	optional:
+	minmax (bool): whether to store the normalized feature sets scaled to [0,1], too. Default: True
+	processes (int): number of worker processes, defaults to the number of cores
+	"""
+	print("normalizing bow models...")
+	
+	minmax = kwargs.get("minmax", True)
+	processes = kwargs.get("processes", None)
+	
+	with Pool(processes) as pool:
+		pool.map(partial(normalize_bow_file, wdir, modes=modes, minmax=minmax), bow_files)
+	
+	print("done")
+
+
+def get_bow_vectorizer(wdir, **kwargs):
+	"""
+	Set up the CountVectorizer for a bow model.
 	
 	Arguments:
 	
 	wdir (str): path to the working directory
-	corpusdir (str): relative path to the input directory (the collection of text files)
-	outfile (str): relative path to the output file (the bow matrix)
 	
 	optional:
 	mfw (int): how many of the most frequent terms to use, if this is 0, all the terms are used
@@ -645,14 +955,11 @@ def create_bow_model(wdir, corpusdir, outfile, **kwargs):
 	ngram (int): type of ngram, e.g. "2" for 2-grams
 	ngram_unit (str): unit of ngrams, "w" (words) or "c" (characters)
 	"""
-	
 	mfw = kwargs.get("mfw", None)
 	stopword_file = kwargs.get("stopword_file")
 	ngram = kwargs.get("ngram")
 	ngram_unit = kwargs.get("ngram_unit")
 	
-	print("creating bow model for MFW" + str(mfw) + "...")
-	
 	# default parameter values (that can be overwritten):
 	stopwords = None
 	analyzer = "word"
@@ -669,8 +976,33 @@ def create_bow_model(wdir, corpusdir, outfile, **kwargs):
 	if ngram:
 		ngramrange = (ngram,ngram)
 	
-		
 	vectorizer = CountVectorizer(input='filename', stop_words=stopwords, max_features=mfw, analyzer=analyzer, ngram_range=ngramrange, token_pattern=tokenpattern)
+	
+	return vectorizer
+
+
+def create_bow_model(wdir, corpusdir, outfile, **kwargs):
+	"""
+	Creates a bow model (a matrix of absolute token counts) from a collection of full text files.
+	
+	Arguments:
+	
+	wdir (str): path to the working directory
+	corpusdir (str): relative path to the input directory (the collection of text files)
+	outfile (str): relative path to the output file (the bow matrix)
+	
+	optional:
+	mfw (int): how many of the most frequent terms to use, if this is 0, all the terms are used
+	stopword_file (str): relative path to a file containing a list of stop words
+	ngram (int): type of ngram, e.g. "2" for 2-grams
+	ngram_unit (str): unit of ngrams, "w" (words) or "c" (characters)
+	"""
+	
+	mfw = kwargs.get("mfw", None)
+	
+	print("creating bow model for MFW" + str(mfw) + "...")
+	
+	vectorizer = get_bow_vectorizer(wdir, **kwargs)
 
 	filenames = sorted(glob.glob(join(wdir, corpusdir,"*.txt")))
 	
@@ -694,6 +1026,57 @@ def create_bow_model(wdir, corpusdir, outfile, **kwargs):
 	print("Done! Number of documents and vocabulary: ", bow.shape)
 	print("Number of tokens: ", bow.sum())
 	
+
+def create_bow_models(wdir, corpusdir, outfile, mfws, **kwargs):
+	"""
+	Creates bow models (matrices of absolute token counts) for several numbers of mfw from a collection of full text files.
+	
+	The corpus is vectorized only once with the whole vocabulary. The bow model for each number of mfw
+	is a column slice of the full sparse matrix, chosen by the frequency ranking of the terms in the corpus.
+	The results are the same as with create_bow_model(..., mfw=m) for each m.
+	
+	Arguments:
+	
+	wdir (str): path to the working directory
+	corpusdir (str): relative path to the input directory (the collection of text files)
+	outfile (str): relative path to the output files (the bow matrices), with "{mfw}" as a placeholder for the number of mfw,
+	e.g. "data-nh/analysis/features/mfw/bow_mfw{mfw}_2gram_words.csv"
+	mfws (list): list with the different mfw numbers
+	
+	optional:
+	stopword_file (str): relative path to a file containing a list of stop words
+	ngram (int): type of ngram, e.g. "2" for 2-grams
+	ngram_unit (str): unit of ngrams, "w" (words) or "c" (characters)
+	"""
+	print("creating bow models for MFW " + str(mfws) + "...")
+	
+	vectorizer = get_bow_vectorizer(wdir, **dict(kwargs, mfw=None))
+	
+	filenames = sorted(glob.glob(join(wdir, corpusdir,"*.txt")))
+	idnos = [re.split(r"\.", re.split(r"/", f)[-1])[0] for f in filenames]
+	
+	# bow: sparse representation of the whole vocabulary (sorted alphabetically)
+	bow = vectorizer.fit_transform(filenames).tocsc()
+	vocab = np.array(vectorizer.get_feature_names(), dtype=object)
+	
+	# rank the terms by their frequency in the corpus, in the same way as the CountVectorizer does for max_features
+	tfs = np.asarray(bow.sum(axis=0)).ravel()
+	ranking = (-tfs).argsort()
+	
+	print("Number of documents and vocabulary: ", bow.shape)
+	
+	for mfw in mfws:
+		# keep the alphabetical order of the selected terms
+		columns = np.sort(ranking[:mfw])
+		bow_mfw = bow[:,columns].toarray()
+		
+		bow_frame = pd.DataFrame(columns=list(vocab[columns]), index=idnos, data=bow_mfw)
+		bow_frame.to_csv(join(wdir, outfile.replace("{mfw}", str(mfw))), sep=",", encoding="utf-8")
+		feature_store.write_features(bow_frame, join(wdir, outfile.replace("{mfw}", str(mfw))))
+		
+		print("Done MFW" + str(mfw) + "! Number of tokens: ", bow_mfw.sum())
+	
+	
 	
 	
 
@@ -738,17 +1121,15 @@ create_stopword_list("/home/ulrike/Git/", "data-nh/corpus/text-treatment/excepti
 
 # create bow models with absolute counts:
 '''
-for m in mfws:
-	
-	# tokens
-	create_bow_model("/home/ulrike/Git/", "conha19/txt_annotated", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + ".csv", mfw=m, stopword_file="data-nh/analysis/features/stopwords/mfw_stopwords.txt")
-	# word ngrams
-	for ngw in ngram_words:
-		create_bow_model("/home/ulrike/Git/", "conha19/txt_annotated", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngw) + "gram_words.csv", mfw=m, ngram=ngw, ngram_unit="w", stopword_file="data-nh/analysis/features/stopwords/mfw_stopwords.txt")
-	
-	# character ngrams ("all" = classical approach)
-	for ngc in ngram_chars:
-		create_bow_model("/home/ulrike/Git/", "conha19/txt_annotated_stop", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngc) + "gram_chars.csv", mfw=m, ngram=ngc, ngram_unit="c")
+# tokens
+create_bow_models("/home/ulrike/Git/", "conha19/txt_annotated", "data-nh/analysis/features/mfw/bow_mfw{mfw}.csv", mfws, stopword_file="data-nh/analysis/features/stopwords/mfw_stopwords.txt")
+# word ngrams
+for ngw in ngram_words:
+	create_bow_models("/home/ulrike/Git/", "conha19/txt_annotated", "data-nh/analysis/features/mfw/bow_mfw{mfw}_" + str(ngw) + "gram_words.csv", mfws, ngram=ngw, ngram_unit="w", stopword_file="data-nh/analysis/features/stopwords/mfw_stopwords.txt")
+
+# character ngrams ("all" = classical approach)
+for ngc in ngram_chars:
+	create_bow_models("/home/ulrike/Git/", "conha19/txt_annotated_stop", "data-nh/analysis/features/mfw/bow_mfw{mfw}_" + str(ngc) + "gram_chars.csv", mfws, ngram=ngc, ngram_unit="c")
 '''
 
 ######## NGRAM SUBTYPES ########
@@ -818,29 +1199,22 @@ store_vocabulary("/home/ulrike/Git/", "data-nh/analysis/features/mfw/bow_mfw5000
 
 
 '''
-# normalize bow models:
-
+# normalize bow models (and scale them to [0,1] for the SVM):
+bow_files = []
 for m in mfws:
-	for n in norm_mode:
-	
-		# tokens
-		normalize_bow_model("/home/ulrike/Git/", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + ".csv", n)
-		# word ngrams
-		for ngw in ngram_words:
-			normalize_bow_model("/home/ulrike/Git/", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngw) + "gram_words.csv", n)
-		
-		# character ngrams
-		for ngc in ngram_chars:
-			normalize_bow_model("/home/ulrike/Git/", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngc) + "gram_chars.csv", n)
-'''
+	# tokens
+	bow_files.append("data-nh/analysis/features/mfw/bow_mfw" + str(m) + ".csv")
+	# word ngrams
+	for ngw in ngram_words:
+		bow_files.append("data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngw) + "gram_words.csv")
+	# character ngrams
+	for ngc in ngram_chars:
+		bow_files.append("data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngc) + "gram_chars.csv")
+		# character ngram subtypes
+		for ngt in ngram_chars_type:
+			bow_files.append("data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngc) + "gram_chars_" + ngt + ".csv")
 
-'''
-# normalize ngram subtype models:
-for m in mfws:
-	for n in norm_mode:
-		for ngc in ngram_chars:
-			for ngt in ngram_chars_type:
-				normalize_bow_model("/home/ulrike/Git/", "data-nh/analysis/features/mfw/bow_mfw" + str(m) + "_" + str(ngc) + "gram_chars_" + ngt + ".csv", n)
+normalize_bow_models("/home/ulrike/Git/", bow_files, norm_mode)
 '''
 
 
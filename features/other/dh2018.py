@@ -20,6 +20,9 @@ import glob
 from lxml import etree
 import pandas as pd
 import subprocess
+import threading
+import unicodedata
+from multiprocessing import Pool
 import numpy as np
 import pygal
 import freeling
@@ -106,10 +109,38 @@ def get_metadata(wdir, corpus_folder, md_file):
     print("Metadata extracted. Number of documents and metadata columns:", metadata.shape)
     
  
+def get_paragraphs(file):
+    """
+    Get the paragraphs of the body of a TEI file, with their text (whitespace normalized) 
+    and the information if the paragraph contains direct speech or not.
+    Returns a list of (p_num, p_text, p_speech) tuples.
+    
+    Arguments:
+    file (str): path to the TEI file
+    """
+    xml = etree.parse(file)
+    
+    namespaces = {'tei':'http://www.tei-c.org/ns/1.0'}
+    paras = xml.xpath("//tei:body//tei:p", namespaces=namespaces)
+    
+    paragraphs = []
+    for idx,p in enumerate(paras):
+        p_text = p.xpath(".//text()", namespaces=namespaces)
+        p_text = " ".join(p_text)
+        p_text = re.sub(r"[\s\n]+", r" ", p_text)
+        
+        p_speech = p.xpath("boolean(.//tei:said)", namespaces=namespaces)
+        
+        paragraphs.append((idx, p_text, p_speech))
+    
+    return paragraphs
+    
+    
 def annotate_paragraphs(wdir, corpus_folder):
     """
     Annotate TEI paragraphs of input files with Freeling. Store an output file for each paragraph. 
     Keep information if the paragraph contains direct speech or not.
+    (see annotate_sentences for a faster alternative which runs one Freeling process for the whole corpus)
     
     Arguments:
     wdir (str): working directory
@@ -117,17 +148,10 @@ def annotate_paragraphs(wdir, corpus_folder):
     """
     
     for file in glob.glob(os.path.join(wdir, corpus_folder, "*.xml")):
-        xml = etree.parse(file)
         idno_file = os.path.basename(file)[0:6]
         print("doing " + idno_file + "...")
         
-        namespaces = {'tei':'http://www.tei-c.org/ns/1.0'}
-        paras = xml.xpath("//tei:body//tei:p", namespaces=namespaces)
-        
-        for idx,p in enumerate(paras):
-            p_text = p.xpath(".//text()", namespaces=namespaces)
-            p_text = " ".join(p_text)
-            p_text = re.sub(r"[\s\n]+", r" ", p_text)
+        for idx, p_text, p_speech in get_paragraphs(file):
             
             textfile_name = idno_file + "_p_" + str(idx) + ".txt"
             textfile_path = os.path.join(wdir, "p_txt", textfile_name)
@@ -135,8 +159,6 @@ def annotate_paragraphs(wdir, corpus_folder):
             with open(textfile_path, "w", encoding="utf-8") as textfile:
                 textfile.write(p_text)
             
-            p_speech = p.xpath("boolean(.//tei:said)", namespaces=namespaces)
-            
             outfile_name = idno_file + "_p_" + str(idx) + "_sp_" + str(p_speech) + ".xml"
             outfile_path = os.path.join(wdir, "fl_anno", outfile_name)
             
@@ -145,6 +167,195 @@ def annotate_paragraphs(wdir, corpus_folder):
     print("Done!")
 
 
+# line that is sent to Freeling after each paragraph, to find the paragraph boundaries in the annotated sentences
+paragraph_marker = "ZZZPARAGRAPHBREAKZZZ"
+
+# columns of the sentence files written by annotate_sentences
+sentence_columns = ["idno", "p_num", "s_num", "speech", "forms", "lemmata", "tags", "wn"]
+
+
+def write_paragraphs(stream, paragraphs):
+    """
+    Write paragraphs to the input of the Freeling process, one per line, each followed by a line with the paragraph marker.
+    The input is closed at the end, so that Freeling finishes.
+    
+    Arguments:
+    stream (file): the standard input of the Freeling process
+    paragraphs (list): list of (idno, p_num, p_text, p_speech) tuples
+    """
+    try:
+        for idno, p_num, p_text, p_speech in paragraphs:
+            stream.write((p_text + "\n" + paragraph_marker + "\n").encode("utf-8"))
+        stream.close()
+    except BrokenPipeError:
+        # the Freeling process was stopped (see annotate_sentences)
+        pass
+    
+
+def get_word_start(text, length=3):
+    """
+    Get the start of the first word of a text for comparisons between the paragraphs and the Freeling tokens:
+    the first letters and digits, in lower case and without accents (Freeling changes the forms of verbs with clitics, 
+    e.g. "Acercándose" > "acercando" "se", "Dámelo" > "da" "me" "lo").
+    
+    Arguments:
+    text (str): the text
+    length (int): how many letters and digits to keep
+    """
+    text = unicodedata.normalize("NFD", text.lower())
+    text = "".join([char for char in text if not unicodedata.combining(char) and char.isalnum()])
+    return text[0:length]
+    
+
+def find_paragraph_marker(forms):
+    """
+    Find the paragraph marker at the end of an annotated sentence. Freeling usually returns the marker as a sentence of its own,
+    but it may also split it into several tokens or attach it to a sentence without final punctuation.
+    Returns the number of tokens before the marker, or None if the sentence does not end with the marker.
+    Raises a ValueError if (a part of) the marker is found anywhere else in the sentence, because the following sentences 
+    could then not be assigned to their paragraphs anymore.
+    
+    Arguments:
+    forms (list): the forms of the tokens of the sentence
+    """
+    text = ""
+    for idx in range(len(forms) - 1, -1, -1):
+        text = forms[idx] + text
+        if text == paragraph_marker:
+            return idx
+        if not paragraph_marker.endswith(text):
+            break
+    
+    if paragraph_marker[0:3] in "".join(forms):
+        raise ValueError("paragraph marker found inside a sentence: " + " ".join(forms))
+    return None
+    
+
+def read_sentences(stream):
+    """
+    Read the annotated sentences from the xml output of the Freeling process as soon as they are complete.
+    Yields the tokens of each sentence as a list of dicts (the attributes of the token elements).
+    
+    Arguments:
+    stream (file): the standard output of the Freeling process
+    """
+    parser = etree.XMLPullParser(events=("end",), tag="sentence")
+    # the sentences are wrapped in a root element, in case the output has none
+    parser.feed(b"<freeling>")
+    first_chunk = True
+    
+    while True:
+        chunk = stream.read1(65536)
+        if not chunk:
+            break
+        if first_chunk:
+            chunk = re.sub(rb"^\s*<\?xml[^>]*\?>", b"", chunk)
+            first_chunk = False
+        parser.feed(chunk)
+        
+        for event, sentence in parser.read_events():
+            yield [dict(token.attrib) for token in sentence.iter("token")]
+            sentence.clear()
+    
+
+def write_sentence_file(wdir, out_folder, idno, records):
+    """
+    Write the sentence records of a novel to its sentence file ([idno].csv).
+    
+    Arguments:
+    wdir (str): working directory
+    out_folder (str): name of the output folder in the wdir
+    idno (str): idno of the novel
+    records (list): the sentence records, in the order of sentence_columns
+    """
+    fr = pd.DataFrame(records, columns=sentence_columns)
+    fr.to_csv(os.path.join(wdir, out_folder, idno + ".csv"), sep=",", encoding="utf-8", index=False)
+    print("written " + idno + " (" + str(len(records)) + " sentences)")
+    
+
+def annotate_sentences(wdir, corpus_folder, out_folder):
+    """
+    Annotate the TEI paragraphs of the input files with Freeling and store the annotated sentences of each novel in a single file,
+    with one row per sentence: the idno, the paragraph number, the sentence number within the paragraph, 
+    the information if the paragraph contains direct speech or not, and the forms, lemmata, tags and WordNet senses of the tokens
+    (separated by spaces, wn only for the tokens that have a sense).
+    All the paragraphs are streamed through one Freeling process. A novel's file is written as soon as its last paragraph is annotated.
+    Paragraphs without any sentence get one empty record (s_num 0), like the empty sentence file of split_paragraphs.
+    The annotation stops with a ValueError as soon as the sentences can not be assigned to the paragraphs
+    (a misplaced paragraph marker, see find_paragraph_marker, or a different number of paragraphs).
+    A warning is printed for paragraphs whose first sentence does not seem to start like the paragraph (see get_word_start).
+    The sentence files replace the paragraph and sentence files of annotate_paragraphs and split_paragraphs
+    (see analyze_sentiments_sentence_files).
+    
+    Arguments:
+    wdir (str): working directory
+    corpus_folder (str): name of the corpus folder in the wdir
+    out_folder (str): name of the output folder for the sentence files in the wdir
+    """
+    paragraphs = []
+    for file in sorted(glob.glob(os.path.join(wdir, corpus_folder, "*.xml"))):
+        idno_file = os.path.basename(file)[0:6]
+        for idx, p_text, p_speech in get_paragraphs(file):
+            paragraphs.append((idno_file, idx, p_text, p_speech))
+    print("annotating " + str(len(paragraphs)) + " paragraphs...")
+    
+    # --flush: each line is analyzed completely when it is read, so each paragraph ends a sentence
+    Command = ["analyze", "-f", "es.cfg", "--outlv", "dep", "--sense", "ukb", "--output", "xml", "--flush"]
+    process = subprocess.Popen(Command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    writer = threading.Thread(target=write_paragraphs, args=(process.stdin, paragraphs))
+    writer.start()
+    
+    p_idx = 0
+    s_num = 0
+    records = []
+    try:
+        for tokens in read_sentences(process.stdout):
+            forms = [token.get("form", "") for token in tokens]
+            marker_idx = find_paragraph_marker(forms)
+            
+            if p_idx == len(paragraphs):
+                raise ValueError("Freeling returned more paragraphs than were sent (" + str(len(paragraphs)) + "): " + " ".join(forms))
+            idno, p_num, p_text, p_speech = paragraphs[p_idx]
+            
+            # the tokens of the sentence (without the marker, if it was attached to the sentence)
+            if marker_idx is not None:
+                tokens = tokens[0:marker_idx]
+                forms = forms[0:marker_idx]
+            # the first sentence of a paragraph should start like the paragraph (the forms can be shorter than the words,
+            # e.g. contractions and verbs with clitics are split, "del" > "de" "el")
+            if len(tokens) > 0 and s_num == 0:
+                form_start = get_word_start(forms[0])
+                if form_start != get_word_start(p_text, len(form_start)):
+                    print("Warning: the first sentence of paragraph " + str(p_num) + " of " + idno + " does not start like the paragraph: " + " ".join(forms[0:10]))
+            if len(tokens) > 0:
+                lemmata = [token.get("lemma", "") for token in tokens]
+                tags = [token.get("tag", "") for token in tokens]
+                wn = [token["wn"] for token in tokens if "wn" in token]
+                records.append([idno, p_num, s_num, str(p_speech), " ".join(forms), " ".join(lemmata), " ".join(tags), " ".join(wn)])
+                s_num += 1
+            
+            # end of a paragraph: write the novel's file if it was the novel's last paragraph
+            if marker_idx is not None:
+                if s_num == 0:
+                    records.append([idno, p_num, 0, str(p_speech), "", "", "", ""])
+                p_idx += 1
+                s_num = 0
+                if p_idx == len(paragraphs) or paragraphs[p_idx][0] != idno:
+                    write_sentence_file(wdir, out_folder, idno, records)
+                    records = []
+        
+        if p_idx != len(paragraphs):
+            raise ValueError("only " + str(p_idx) + " of " + str(len(paragraphs)) + " paragraphs were annotated")
+    except Exception:
+        process.kill()
+        raise
+    finally:
+        writer.join()
+        process.wait()
+    
+    print("Done!")
+    
+
     
 def split_paragraphs(wdir, corpus_folder):
     """
@@ -272,181 +483,209 @@ def spellcheck_nrc_lex(wdir):
 ########################################################
 
 
-def analyze_sentiments(wdir, corpus_folder):
+# NRC columns that are summed for each sentence, in the order of the result columns
+nrc_score_columns = ["Positive", "Negative", "Anger", "Anticipation", "Disgust", "Fear", "Joy", "Sadness", "Surprise", "Trust"]
+
+
+def load_sentiment_lexicons(wdir):
     """
-    Analyze the annotated sentences. Are they neutral or emotional?
-    If they are emotional, positive or negative?
-    Using NRC, and SentiWordNet.
+    Load SentiWordNet and the NRC Emotion Lexicon once and index them for the sentence scoring:
+    SentiWordNet by (synset offset, POS), NRC by Spanish lemma (the first entry of a synset or lemma is used,
+    as in a lookup of the first matching row). The scores are kept in NumPy arrays, the indexes map keys to rows.
+    Returns a dict with the keys "wn_index", "wn_scores" (PosScore, NegScore), "nrc_index" and "nrc_scores" (see nrc_score_columns).
     
     Arguments:
-	wdir (str): working directory
-	corpus_folder (str): name of the corpus folder in the wdir
+    wdir (str): working directory
     """
-    
     sentiWN = pd.read_csv(os.path.join(wdir, "sentiments", "SentiWordNet_3.0.0_20130122.txt"), sep="\t")
     nrc = pd.read_csv(os.path.join(wdir, "sentiments", "NRC-Emotion-Lexicon-v0.92-EN-ES.csv"), sep=",")
     
+    sentiWN = sentiWN.dropna(subset=["ID", "POS"])
+    wn_index = {}
+    for row, key in enumerate(zip(sentiWN.ID.astype(int), sentiWN.POS)):
+        wn_index.setdefault(key, row)
     
-    file_list = [os.path.basename(f) for f in glob.glob(os.path.join(wdir, corpus_folder, "*.xml"))]
+    nrc = nrc.dropna(subset=["Spanish"])
+    nrc_index = {}
+    for row, lemma in enumerate(nrc.Spanish):
+        nrc_index.setdefault(lemma, row)
     
-    fr = pd.DataFrame(index=file_list, columns=["text_idno", "p_num", "s_num", "speech", "WN_emotional", "WN_positive", "WN_negative", "WN_emotion_sum", 
-    "NRC_emotional", "NRC_positive", "NRC_negative", "NRC_emotion_sum", "NRC_Anger", "NRC_Anticipation", "NRC_Disgust", "NRC_Fear", "NRC_Joy", "NRC_Sadness", "NRC_Surprise", "NRC_Trust",
-    "WN_synsets_identified", "NRC_lemmata_identified"])
+    return {"wn_index": wn_index, "wn_scores": sentiWN[["PosScore", "NegScore"]].to_numpy(), 
+    "nrc_index": nrc_index, "nrc_scores": nrc[nrc_score_columns].to_numpy()}
     
-    idnos = []
-    p_nums = []
-    s_nums = []
-    speech = []
-    WN_emotional = []
-    WN_positive = []
-    WN_negative = []
-    WN_emotion_sum = []
-    NRC_emotional = []
-    NRC_positive = []
-    NRC_negative = []
-    NRC_emotion_sum = []
-    NRC_Anger = []
-    NRC_Anticipation = []
-    NRC_Disgust = []
-    NRC_Fear = []
-    NRC_Joy = []
-    NRC_Sadness = []
-    NRC_Surprise = []
-    NRC_Trust = []
+
+def score_sentences(sentences, lexicons):
+    """
+    Score sentences with SentiWordNet and NRC.
+    Returns a tuple (WN scores, NRC scores, identified synsets, identified lemmata): an array with the summed PosScore and NegScore
+    of the synsets of each sentence, an array with the summed NRC values of the lemmata of each sentence (see nrc_score_columns),
+    and for each sentence the synsets and lemmata that were found in the lexicons (comma-separated).
+    
+    Arguments:
+    sentences (list): list of (wn_tokens, lemmata) tuples, wn_tokens being the wn attributes of the tokens of a sentence
+    (e.g. "01234567-n") and lemmata the lemmata of the tokens
+    lexicons (dict): the indexed lexicons, see load_sentiment_lexicons
+    """
+    wn_index = lexicons["wn_index"]
+    wn_scores = lexicons["wn_scores"]
+    nrc_index = lexicons["nrc_index"]
+    nrc_scores = lexicons["nrc_scores"]
+    
+    WN_results = np.zeros((len(sentences), wn_scores.shape[1]), dtype=wn_scores.dtype)
+    NRC_results = np.zeros((len(sentences), nrc_scores.shape[1]), dtype=nrc_scores.dtype)
     WN_synsets_identified = []
     NRC_lemmata_identified = []
     
-    
-    for file in glob.glob(os.path.join(wdir, corpus_folder, "*.xml")):
-        # file name pattern: nh0001_p_0_sp_False_s1.xml
-        
-        file_name = os.path.basename(file)
-        print("doing " + file_name + "...")
-        idno = file_name[0:6]
-        p_num = re.sub(r"^.*p_(\d+)_.*$", r"\1", file_name)
-        s_num = re.sub(r"^.*_s(\d+)\.xml", r"\1", file_name)
-        sp = re.sub(r"^.*sp_(True|False)_.*$", r"\1", file_name)
-        
-        idnos.append(idno)
-        p_nums.append(p_num)
-        s_nums.append(s_num)
-        speech.append(sp)
-        
-        xml = etree.parse(file)
-        wn_tokens = xml.xpath("//token[@wn]/@wn")
-        lemmata = xml.xpath("//token/@lemma")
-        
+    for idx, (wn_tokens, lemmata) in enumerate(sentences):
         # SentiWordNet
-        WN_pos_score = 0
-        WN_neg_score = 0
+        WN_rows = []
         WN_synsets_identified_sentence = []
-        
         for wn_t in wn_tokens:
             wn_num = int(wn_t[0:8])
             wn_pos = wn_t[9]
-            
-            WN_pos = sentiWN.loc[sentiWN.ID == wn_num][sentiWN.POS == wn_pos]["PosScore"]
-            WN_neg = sentiWN.loc[sentiWN.ID == wn_num][sentiWN.POS == wn_pos]["NegScore"]
-            
-            if not(WN_pos.empty):
-                WN_pos_score += WN_pos.iloc[0]
-            else:
+            row = wn_index.get((wn_num, wn_pos))
+            if row is None:
                 print("Error: WN ID " + str(wn_num) + " not found!")
-                
-            if not(WN_neg.empty):
-                WN_neg_score += WN_neg.iloc[0]
             else:
-                print("Error: WN ID " + str(wn_num) + " not found!")
-                
-            if not(WN_pos.empty) or not(WN_neg.empty):
+                WN_rows.append(row)
                 WN_synsets_identified_sentence.append(wn_t)
-                
-            
-        if WN_pos_score > 1 or WN_neg_score > 1: # Schwelle für Emotionalität
-            WN_emotional.append(1)
-        else:
-            WN_emotional.append(0) 
-        WN_emotion_sum.append(WN_pos_score - WN_neg_score)
-        
-        WN_synsets_identified.append(",".join(WN_synsets_identified_sentence))
-            
-        WN_positive.append(WN_pos_score)
-        WN_negative.append(WN_neg_score)
         
         # NRC Emotion Lexicon
-        NRC_pos_score = 0
-        NRC_neg_score = 0
-        NRC_Anger_score = 0
-        NRC_Anticipation_score = 0
-        NRC_Disgust_score = 0
-        NRC_Fear_score = 0
-        NRC_Joy_score = 0
-        NRC_Sadness_score = 0
-        NRC_Surprise_score = 0
-        NRC_Trust_score = 0
+        NRC_rows = []
         NRC_lemmata_identified_sentence = []
-        
         for l in lemmata:
-            NRC_l = nrc.loc[nrc.Spanish == l]
-            
-            if not(NRC_l.empty):
-                NRC_pos_score += NRC_l["Positive"].iloc[0]
-                NRC_neg_score += NRC_l["Negative"].iloc[0]
-            
-                NRC_Anger_score += NRC_l["Anger"].iloc[0]
-                NRC_Anticipation_score += NRC_l["Anticipation"].iloc[0]
-                NRC_Disgust_score += NRC_l["Disgust"].iloc[0]
-                NRC_Fear_score += NRC_l["Fear"].iloc[0]
-                NRC_Joy_score += NRC_l["Joy"].iloc[0]
-                NRC_Sadness_score += NRC_l["Sadness"].iloc[0]
-                NRC_Surprise_score += NRC_l["Surprise"].iloc[0]
-                NRC_Trust_score += NRC_l["Trust"].iloc[0]
-                
+            row = nrc_index.get(l)
+            if row is not None:
+                NRC_rows.append(row)
                 NRC_lemmata_identified_sentence.append(l)
-            
-               
-        if NRC_pos_score > 1 or NRC_neg_score > 1: # Schwelle für Emotionalität
-            NRC_emotional.append(1)
-        else:
-            NRC_emotional.append(0)
-        NRC_emotion_sum.append(NRC_pos_score - NRC_neg_score)
         
-        NRC_lemmata_identified.append(",".join(NRC_lemmata_identified_sentence))
+        # the rows are added up one after the other (in the order of the tokens)
+        if len(WN_rows) > 0:
+            WN_results[idx] = wn_scores[WN_rows].sum(axis=0)
+        if len(NRC_rows) > 0:
+            NRC_results[idx] = nrc_scores[NRC_rows].sum(axis=0)
         
-        NRC_positive.append(NRC_pos_score)
-        NRC_negative.append(NRC_neg_score)
-        NRC_Anger.append(NRC_Anger_score)
-        NRC_Anticipation.append(NRC_Anticipation_score)
-        NRC_Disgust.append(NRC_Disgust_score)
-        NRC_Fear.append(NRC_Fear_score)
-        NRC_Joy.append(NRC_Joy_score)
-        NRC_Sadness.append(NRC_Sadness_score)
-        NRC_Surprise.append(NRC_Surprise_score)
-        NRC_Trust.append(NRC_Trust_score)
+        WN_synsets_identified.append(",".join(WN_synsets_identified_sentence))
+        NRC_lemmata_identified.append(",".join(NRC_lemmata_identified_sentence))
+    
+    return WN_results, NRC_results, WN_synsets_identified, NRC_lemmata_identified
+    
+
+def get_sentiment_frame(index, idnos, p_nums, s_nums, speech, sentences, lexicons):
+    """
+    Create the data frame of sentiment scores for sentences (the columns of sentiments.csv).
+    
+    Arguments:
+    index (list): index of the frame (e.g. the names of the sentence files)
+    idnos (list): idnos of the novels the sentences belong to
+    p_nums (list): paragraph numbers of the sentences
+    s_nums (list): sentence numbers of the sentences
+    speech (list): whether the sentences are in paragraphs with direct speech ("True", "False")
+    sentences (list): list of (wn_tokens, lemmata) tuples, see score_sentences
+    lexicons (dict): the indexed lexicons, see load_sentiment_lexicons
+    """
+    WN_results, NRC_results, WN_synsets_identified, NRC_lemmata_identified = score_sentences(sentences, lexicons)
+    
+    fr = pd.DataFrame(index=index, columns=["text_idno", "p_num", "s_num", "speech", "WN_emotional", "WN_positive", "WN_negative", "WN_emotion_sum", 
+    "NRC_emotional", "NRC_positive", "NRC_negative", "NRC_emotion_sum", "NRC_Anger", "NRC_Anticipation", "NRC_Disgust", "NRC_Fear", "NRC_Joy", "NRC_Sadness", "NRC_Surprise", "NRC_Trust",
+    "WN_synsets_identified", "NRC_lemmata_identified"])
     
     fr["text_idno"] = idnos
     fr["p_num"] = p_nums
     fr["s_num"] = s_nums
     fr["speech"] = speech
-    fr["WN_positive"] = WN_positive
-    fr["WN_negative"] = WN_negative
-    fr["WN_emotional"] = WN_emotional
-    fr["WN_emotion_sum"] = WN_emotion_sum
-    fr["NRC_positive"] = NRC_positive
-    fr["NRC_negative"] = NRC_negative
-    fr["NRC_emotional"] = NRC_emotional
-    fr["NRC_emotion_sum"] = NRC_emotion_sum
-    fr["NRC_Anger"] = NRC_Anger
-    fr["NRC_Anticipation"] = NRC_Anticipation
-    fr["NRC_Disgust"] = NRC_Disgust
-    fr["NRC_Fear"] = NRC_Fear
-    fr["NRC_Joy"] = NRC_Joy
-    fr["NRC_Sadness"] = NRC_Sadness
-    fr["NRC_Surprise"] = NRC_Surprise
-    fr["NRC_Trust"] = NRC_Trust
+    
+    WN_pos_score = WN_results[:,0]
+    WN_neg_score = WN_results[:,1]
+    fr["WN_positive"] = WN_pos_score
+    fr["WN_negative"] = WN_neg_score
+    fr["WN_emotional"] = ((WN_pos_score > 1) | (WN_neg_score > 1)).astype(int) # Schwelle für Emotionalität
+    fr["WN_emotion_sum"] = WN_pos_score - WN_neg_score
+    
+    NRC_pos_score = NRC_results[:,0]
+    NRC_neg_score = NRC_results[:,1]
+    fr["NRC_positive"] = NRC_pos_score
+    fr["NRC_negative"] = NRC_neg_score
+    fr["NRC_emotional"] = ((NRC_pos_score > 1) | (NRC_neg_score > 1)).astype(int) # Schwelle für Emotionalität
+    fr["NRC_emotion_sum"] = NRC_pos_score - NRC_neg_score
+    for col_idx, emotion in enumerate(nrc_score_columns[2:]):
+        fr["NRC_" + emotion] = NRC_results[:,col_idx + 2]
+    
     fr["WN_synsets_identified"] = WN_synsets_identified
     fr["NRC_lemmata_identified"] = NRC_lemmata_identified
     
+    return fr
+    
+
+def analyze_sentiments(wdir, corpus_folder):
+    """
+    Analyze the annotated sentences. Are they neutral or emotional?
+    If they are emotional, positive or negative?
+    Using NRC, and SentiWordNet.
+    
+    Arguments:
+	wdir (str): working directory
+	corpus_folder (str): name of the corpus folder in the wdir
+    """
+    
+    lexicons = load_sentiment_lexicons(wdir)
+    
+    file_list = []
+    idnos = []
+    p_nums = []
+    s_nums = []
+    speech = []
+    sentences = []
+    
+    for file in glob.glob(os.path.join(wdir, corpus_folder, "*.xml")):
+        # file name pattern: nh0001_p_0_sp_False_s1.xml
+        
+        file_name = os.path.basename(file)
+        print("doing " + file_name + "...")
+        
+        file_list.append(file_name)
+        idnos.append(file_name[0:6])
+        p_nums.append(re.sub(r"^.*p_(\d+)_.*$", r"\1", file_name))
+        s_nums.append(re.sub(r"^.*_s(\d+)\.xml", r"\1", file_name))
+        speech.append(re.sub(r"^.*sp_(True|False)_.*$", r"\1", file_name))
+        
+        xml = etree.parse(file)
+        wn_tokens = xml.xpath("//token[@wn]/@wn")
+        lemmata = xml.xpath("//token/@lemma")
+        sentences.append((wn_tokens, lemmata))
+    
+    fr = get_sentiment_frame(file_list, idnos, p_nums, s_nums, speech, sentences, lexicons)
+    
+    fr.to_csv(os.path.join(wdir, "sentiments_gt1.csv"), sep=",", encoding="utf-8")  
+    
+    print("Done!")
+
+
+def analyze_sentiments_sentence_files(wdir, sentence_folder):
+    """
+    Analyze the annotated sentences in the sentence files of the novels (see annotate_sentences), 
+    like analyze_sentiments for the files of the single sentences.
+    The sentences are named like the files of the single sentences (e.g. nh0001_p_0_sp_False_s1.xml), 
+    so the results can be used in the same way.
+    
+    Arguments:
+    wdir (str): working directory
+    sentence_folder (str): name of the folder with the sentence files in the wdir
+    """
+    
+    lexicons = load_sentiment_lexicons(wdir)
+    
+    frames = []
+    for file in sorted(glob.glob(os.path.join(wdir, sentence_folder, "*.csv"))):
+        print("doing " + os.path.basename(file) + "...")
+        frames.append(pd.read_csv(file, sep=",", encoding="utf-8", dtype=str, keep_default_na=False))
+    records = pd.concat(frames, ignore_index=True)
+    
+    file_list = (records.idno + "_p_" + records.p_num + "_sp_" + records.speech + "_s" + records.s_num + ".xml").tolist()
+    sentences = [(wn.split(), lemmata.split()) for wn, lemmata in zip(records.wn, records.lemmata)]
+    
+    fr = get_sentiment_frame(file_list, records.idno.tolist(), records.p_num.tolist(), records.s_num.tolist(), records.speech.tolist(), sentences, lexicons)
+    
     fr.to_csv(os.path.join(wdir, "sentiments_gt1.csv"), sep=",", encoding="utf-8")  
     
     print("Done!")
@@ -2182,52 +2421,139 @@ def my_maco_options(lang,lpath) :
     return opt;
     
 
+## -----------------------------------------------
+## FREELING: Session with the analyzers, loaded once per process
+## -----------------------------------------------
+class FreelingSession:
+    """
+    Freeling analyzers (tokenizer, splitter, morphological analyzer and tagger), 
+    loaded once and reused for all the texts that are analyzed in the process.
+    
+    Arguments:
+    lang (str): language code, e.g. "es"
+    ipath (str): installation path of Freeling, e.g. "/usr"
+    """
+    
+    def __init__(self, lang="es", ipath="/usr"):
+        freeling.util_init_locale("default");
+        lpath = ipath + "/share/freeling/" + lang + "/"
+        
+        # create analyzers
+        self.tk = freeling.tokenizer(lpath+"tokenizer.dat");
+        self.sp = freeling.splitter(lpath+"splitter.dat");
+        
+        # create the analyzer with the required set of maco_options  
+        self.morfo = freeling.maco(my_maco_options(lang,lpath));
+        
+        self.morfo.set_active_options (False,  # UserMap 
+                              True,  # NumbersDetection,  
+                              True,  # PunctuationDetection,   
+                              True,  # DatesDetection,    
+                              True,  # DictionarySearch,  
+                              True,  # AffixAnalysis,  
+                              False, # CompoundAnalysis, 
+                              True,  # RetokContractions,
+                              True,  # MultiwordsDetection,  
+                              True,  # NERecognition,     
+                              False, # QuantitiesDetection,  
+                              True); # ProbabilityAssignment
+        
+        # create tagger
+        self.tagger = freeling.hmm_tagger(lpath+"tagger.dat",True,2)
+        
+    
+    def analyze(self, texts):
+        """
+        Analyze a batch of texts: each text is tokenized and split into sentences, 
+        then the sentences of all the texts are analyzed and tagged together.
+        Returns a list with the analyzed sentences of each text.
+        
+        Arguments:
+        texts (list): list of texts (str)
+        """
+        sentences = freeling.ListSentence()
+        num_sentences = []
+        for text in texts:
+            # tokenize input line into a list of words and split it into sentences
+            ls = self.sp.split(self.tk.tokenize(text))
+            num_sentences.append(len(ls))
+            for s in ls:
+                sentences.push_back(s)
+        
+        # perform morphosyntactic analysis and disambiguation
+        sentences = list(self.tagger.analyze(self.morfo.analyze(sentences)))
+        
+        results = []
+        start = 0
+        for num in num_sentences:
+            results.append(sentences[start:start + num])
+            start += num
+        return results
+
+
+# the Freeling session of this process: (lang, ipath) -> FreelingSession
+freeling_sessions = {}
+
+
+def get_freeling_session(lang="es", ipath="/usr"):
+    """
+    Get the Freeling session of this process, loading the analyzers at the first call.
+    
+    Arguments:
+    lang (str): language code, e.g. "es"
+    ipath (str): installation path of Freeling, e.g. "/usr"
+    """
+    if (lang, ipath) not in freeling_sessions:
+        freeling_sessions[(lang, ipath)] = FreelingSession(lang, ipath)
+    return freeling_sessions[(lang, ipath)]
+    
+
 def fl_process_sentence(text):
     """
     Process a sentence with Freeling.
     Arguments:
     text (str): sentence text
     """
+    return get_freeling_session().analyze([text])[0]
     
-    freeling.util_init_locale("default");
-    lang = "es"
-    ipath = "/usr"
-    lpath = ipath + "/share/freeling/" + lang + "/"
 
-    # create analyzers
-    tk=freeling.tokenizer(lpath+"tokenizer.dat");
-    sp=freeling.splitter(lpath+"splitter.dat");
-    
-    # create the analyzer with the required set of maco_options  
-    morfo=freeling.maco(my_maco_options(lang,lpath));
-    
-    morfo.set_active_options (False,  # UserMap 
-                          True,  # NumbersDetection,  
-                          True,  # PunctuationDetection,   
-                          True,  # DatesDetection,    
-                          True,  # DictionarySearch,  
-                          True,  # AffixAnalysis,  
-                          False, # CompoundAnalysis, 
-                          True,  # RetokContractions,
-                          True,  # MultiwordsDetection,  
-                          True,  # NERecognition,     
-                          False, # QuantitiesDetection,  
-                          True); # ProbabilityAssignment
+def fl_analyze_texts(texts, lang="es", ipath="/usr"):
+    """
+    Analyze a batch of texts with the Freeling session of this process (e.g. in a worker process of fl_analyze_corpus).
+    Returns for each text a list of sentences, each a list of (form, lemma, tag) tuples.
     
-    # create tagger
-    tagger = freeling.hmm_tagger(lpath+"tagger.dat",True,2)
+    Arguments:
+    texts (list): list of texts (str)
+    lang (str): language code, e.g. "es"
+    ipath (str): installation path of Freeling, e.g. "/usr"
+    """
+    results = []
+    for ls in get_freeling_session(lang, ipath).analyze(texts):
+        results.append([[(w.get_form(), w.get_lemma(), w.get_tag()) for w in s] for s in ls])
+    return results
     
+
+def fl_analyze_corpus(texts, processes=None, batch_size=200, lang="es", ipath="/usr"):
+    """
+    Analyze texts (e.g. the sentences or paragraphs of the whole corpus) with a pool of worker processes, 
+    each of which loads the Freeling analyzers once. The texts are sent to the workers in batches.
+    Returns for each text a list of sentences, each a list of (form, lemma, tag) tuples, in the order of the texts.
     
-    # tokenize input line into a list of words
-    lw = tk.tokenize(text)
-    # split list of words in sentences, return list of sentences
-    ls = sp.split(lw)
+    Arguments:
+    texts (list): list of texts (str)
+    processes (int): number of worker processes, default: number of cpus
+    batch_size (int): number of texts per batch
+    lang (str): language code, e.g. "es"
+    ipath (str): installation path of Freeling, e.g. "/usr"
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    print("analyzing " + str(len(texts)) + " texts in " + str(len(batches)) + " batches...")
     
-    # perform morphosyntactic analysis and disambiguation
-    ls = morfo.analyze(ls)
-    ls = tagger.analyze(ls)
+    with Pool(processes, initializer=get_freeling_session, initargs=(lang, ipath)) as pool:
+        results = pool.starmap(fl_analyze_texts, [(batch, lang, ipath) for batch in batches])
     
-    return ls
+    print("Done!")
+    return [r for batch in results for r in batch]
     
     
 ## -----------------------------------------------
@@ -2269,8 +2595,12 @@ wdir = "/home/ulrike/Dokumente/Konferenzen/DH/2018"
 
 #split_paragraphs(wdir, "annotated_paragraphs")
 
+# alternative to annotate_paragraphs and split_paragraphs: one Freeling process, one sentence file per novel
+#annotate_sentences(wdir, "corpus_tei", "sentences")
+
 
 #analyze_sentiments(wdir, "annotated_sentences")
+#analyze_sentiments_sentence_files(wdir, "sentences")
 
 
 #create_sections(wdir, "sentiments_gt1.csv")
@@ -2323,6 +2653,8 @@ wdir = "/home/ulrike/Dokumente/Konferenzen/DH/2018"
 #r = fl_process_sentence("Hola.")
 #ProcessSentences(r)
 
+#analyzed = fl_analyze_corpus(["Hola.", "¿Qué tal?"], processes=4)
+
 ############ Learning #############
 
 #generate_features(wdir, "metadata.csv", "sentiments_gt0_sections.csv", "features_gt0.csv", ["subgenre-interp-group", "subgenre-sentimental-interp"])
@@ -19,6 +19,7 @@ from tmw import prepare
 from tmw import model
 from tmw import postprocess
 from tmw import visualize
+import figure_renderer
 
 
 ########## FUNCTIONS ##########
@@ -128,8 +129,8 @@ def plot_zero_values_bar(wdir, feature_dir, num_topics, optimization_intervals,
 	fig.update_xaxes(type='category', title="number of topics_optimize interval")
 	fig.update_yaxes(title="value counts (relative)")
 	
-	fig.write_image(join(wdir, outfile + "_abs_bar.png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outfile + "_abs_bar.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outfile + "_abs_bar.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outfile + "_abs_bar.html"))
 	
 	print("plot with relative values...")
 	# relative to value counts
@@ -141,11 +142,12 @@ def plot_zero_values_bar(wdir, feature_dir, num_topics, optimization_intervals,
 	fig2.update_xaxes(type='category', title="number of topics_optimize interval")
 	fig2.update_yaxes(title="value counts (relative)")
 	
-	fig2.write_image(join(wdir, outfile + "_rel_bar.png")) # scale=2 (increase physical resolution)
-	fig2.write_html(join(wdir, outfile + "_rel_bar.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig2, join(wdir, outfile + "_rel_bar.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig2, join(wdir, outfile + "_rel_bar.html"))
 	
 	#fig2.show()
 
+	figure_renderer.wait_renderers()
 	print("done: plot zero values")
 	
 	
@@ -200,11 +202,12 @@ def plot_topic_coherence_scatter(wdir, diagnostics_dir, num_topics, optimization
 	fig.update_xaxes(type='category', title="parameters")
 	fig.update_yaxes(title="coherence (mean)")
 	
-	fig.write_image(join(wdir, outfile + "_scatter.png")) # scale=2 (increase physical resolution)
-	fig.write_html(join(wdir, outfile + "_scatter.html")) # include_plotlyjs="cdn" (don't include whole plotly library)
+	figure_renderer.write_image(fig, join(wdir, outfile + "_scatter.png")) # scale=2 (increase physical resolution)
+	figure_renderer.write_html(fig, join(wdir, outfile + "_scatter.html"))
 	
 	#fig.show()
 
+	figure_renderer.wait_renderers()
 	print("done: plot topic coherences")
 	
 